@@ -0,0 +1,119 @@
+"""
+Micro-benchmark for AltoGenerator.calculate_positions on a synthetic dense newspaper page.
+
+Compares the current implementation (Id index + bulk pixel conversion) against the previous
+linear word lookup, and checks that both produce identical ALTO output.
+
+Usage:
+    python benchmarks/alto_positions.py [number of lines] [words per line]
+"""
+import os
+import sys
+import math
+import time
+import uuid
+import random
+from xml.etree.ElementTree import Element, SubElement, tostring
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils import alto
+from utils.alto import AltoGenerator
+
+
+def synthetic_page(line_total: int, words_per_line: int) -> dict:
+    """Builds a Textract-style response with line_total LINE blocks of words_per_line WORD blocks each."""
+    random.seed(1)
+    blocks = [{"BlockType": "PAGE", "Id": str(uuid.uuid4())}]
+    words = []
+    for line_index in range(line_total):
+        top = line_index / line_total
+        word_ids = []
+        for word_index in range(words_per_line):
+            word_id = str(uuid.uuid4())
+            word_ids.append(word_id)
+            words.append({
+                "BlockType": "WORD", "Id": word_id, "Text": f"word{word_index}",
+                "Confidence": random.uniform(50, 100),
+                "Geometry": {"BoundingBox": {"Left": word_index / words_per_line + 0.001, "Top": top,
+                                             "Width": 0.8 / words_per_line, "Height": 0.8 / line_total}},
+            })
+        blocks.append({
+            "BlockType": "LINE", "Id": str(uuid.uuid4()), "Text": "line", "Confidence": 99.0,
+            "Geometry": {"BoundingBox": {"Left": 0.001, "Top": top, "Width": 0.99, "Height": 0.8 / line_total}},
+            "Relationships": [{"Type": "CHILD", "Ids": word_ids}],
+        })
+    # Textract lists the WORD blocks after the LINE blocks
+    return {"Blocks": blocks + words}
+
+
+def legacy_calculate_positions(data, image_width, image_height, print_space, line_count, string_count, cblock_count):
+    """The previous implementation, which scans the page for every word."""
+    for block in data['Blocks']:
+        if block['BlockType'] == 'LINE':
+            box = block['Geometry']['BoundingBox']
+            attrib = {
+                'HPOS': str(math.ceil(box['Left'] * image_width)),
+                'VPOS': str(math.ceil(box['Top'] * image_height)),
+                'WIDTH': str(math.ceil(box['Width'] * image_width)),
+                'HEIGHT': str(math.ceil(box['Height'] * image_height))
+            }
+            composed_block = SubElement(print_space, "ComposedBlock", attrib={'ID': f"cblock_{cblock_count}", **attrib})
+            cblock_count += 1
+            text_block = SubElement(composed_block, "TextBlock", attrib={'ID': f"block_{line_count}", **attrib})
+            text_line = SubElement(text_block, "TextLine", attrib={'ID': f"line_{line_count}", **attrib})
+            line_count += 1
+
+            for index, word_id in enumerate(block['Relationships'][0]['Ids']):
+                word = next((word for word in data['Blocks'] if word['Id'] == word_id), None)
+                if word:
+                    string_count += 1
+                    SubElement(text_line, "String", attrib={
+                        'ID': f"string_{string_count}",
+                        'HPOS': str(math.ceil(word['Geometry']['BoundingBox']['Left'] * image_width)),
+                        'VPOS': str(math.ceil(word['Geometry']['BoundingBox']['Top'] * image_height)),
+                        'WIDTH': str(math.ceil(word['Geometry']['BoundingBox']['Width'] * image_width)),
+                        'HEIGHT': str(math.ceil(word['Geometry']['BoundingBox']['Height'] * image_height)),
+                        'CONTENT': word['Text'],
+                        'WC': str(round(word['Confidence'] / 100, 2))
+                    })
+                    if index < len(block['Relationships'][0]['Ids']) - 1:
+                        next_word = next((word for word in data['Blocks'] if word['Id'] == block['Relationships'][0]['Ids'][index + 1]), None)
+                        if next_word:
+                            sp_width = next_word['Geometry']['BoundingBox']['Left'] - (
+                                    word['Geometry']['BoundingBox']['Left'] + word['Geometry']['BoundingBox']['Width'])
+                            SubElement(text_line, "SP", attrib={
+                                'WIDTH': str(math.ceil(sp_width * image_width)),
+                                'VPOS': str(math.ceil(word['Geometry']['BoundingBox']['Top'] * image_height)),
+                                'HPOS': str(math.ceil(word['Geometry']['BoundingBox']['Left'] + word['Geometry']['BoundingBox']['Width'] * image_width))
+                            })
+
+
+def run(function, data, repeat: int) -> tuple:
+    best, output = float("inf"), None
+    for _ in range(repeat):
+        print_space = Element("PrintSpace")
+        start = time.perf_counter()
+        function(data, 7000, 9000, print_space, 0, -1, 0)
+        best = min(best, time.perf_counter() - start)
+        output = tostring(print_space)
+    return best, output
+
+
+if __name__ == "__main__":
+    line_total = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+    words_per_line = int(sys.argv[2]) if len(sys.argv) > 2 else 9
+    data = synthetic_page(line_total, words_per_line)
+
+    # calculate_positions does not use the folders set up by __init__
+    generator = AltoGenerator.__new__(AltoGenerator)
+
+    legacy_time, legacy_output = run(legacy_calculate_positions, data, 1)
+    indexed_time, indexed_output = run(generator.calculate_positions, data, 5)
+
+    print(f"Page with {len(data['Blocks'])} blocks, NumPy {'enabled' if alto.np is not None else 'not installed'}")
+    print(f"  linear lookup : {legacy_time * 1000:10.1f} ms")
+    print(f"  Id index      : {indexed_time * 1000:10.1f} ms")
+    print(f"  speedup       : {legacy_time / indexed_time:10.1f}x")
+    print(f"  identical     : {legacy_output == indexed_output}")
+    sys.exit(0 if legacy_output == indexed_output else 1)
@@ -7,83 +7,49 @@ This script performs the following steps:
 3. Initialises the `SortOCR` class for organising the processed OCR output files.
 4. Selects images from the input folder for OCR processing.
 5. Executes the main sorting logic to organise the OCR results.
+6. Generates the ALTO XML of every sorted folder and returns the results to LibNas.
+
+Run with --resume after the pipeline was stopped part way, the working folders are reconciled
+with the processing manifest first and each page continues from its last completed stage.
 
 Classes:
     TextractOCR: Handles OCR operations using AWS Textract.
     CoreConfig: Manages configuration settings and folder paths.
     SortOCR: Organises the output files into appropriate directories.
+    PipelineRecovery: Reconciles the working folders after an interrupted run.
+    PipelineScheduler: Runs the stages in order and generates the ALTO XML of every ready folder.
+    StreamingPipeline: Runs the stages at the same time, folder by folder, with --stream.
+    PipelineDaemon: Watches LibNas input and streams each new folder through the pipeline, with --daemon.
 
 Usage:
     Run this script to perform OCR processing on images and sort the results into folders.
 """
-import time
-from datetime import datetime
-from utils.sort import SortOCR
+import argparse
 from utils.config import CoreConfig
-from utils.client import TextractOCR
-from utils.log import LogActivities
-from utils.alto import AltoGenerator
-from utils.libnas import LibNas
-from utils.check import CheckEmptyFolder
+from utils.recovery import PipelineRecovery
+from utils.scheduler import PipelineScheduler
+from utils.stream import StreamingPipeline
+from utils.daemon import PipelineDaemon
 
 # Instantiate and verify all required folders
 core_config = CoreConfig()
 core_config.verifyFolders()
 
-parameters = core_config.requiredValues()
-folders = core_config.requiredFolders()
-logs_folder = folders["logs_folder"]
-input_folder =folders["input_folder"]
-
-retry_count = 0
-max_retries = parameters['max_retries']  # Maximum number of retries
-retry_delay = parameters['retry_delay']  # Delay in seconds before retrying
-
 if __name__ == '__main__':
-    # Instantiate required classes
-    libnas = LibNas()
-    sort_ocr = SortOCR()
-    check = CheckEmptyFolder()
-    textract_ocr = TextractOCR()
-    log_activity = LogActivities(logs_folder)
-
-    # Get required folders and files from libnas
-    libnas.copy_from_libnas()
-    
-    # Define the parent input folder
-    textract_ocr.select_image(input_folder)
-
-    sort_ocr.start_sorting()
-    
-
-    while retry_count < max_retries:
-        try:
-            while check.is_json_folder_empty() and check.is_images_folder_empty():
-                current_datetime = datetime.now()
-                print(f'Grab a cup of coffee, I am still running ... {current_datetime} ') 
-                log_activity.processing(f'Grab a cup of coffee, I am still running ... {current_datetime} ')
-                
-                # Begin ALTO XML generation
-                AltoGenerator()  
-            
-                time.sleep(3)
-            else:
-                current_datetime = datetime.now()
-                log_activity.error(f'The Pipeline failed to run, because the JSON / Images folder is empty ... {current_datetime} ')
-                break  # Exit the retry loop if successful
-        except (ValueError, FileNotFoundError) as e:
-            log_activity.error(f"Error encountered: {e}")
-            retry_count += 1
-            if retry_count < max_retries:
-                log_activity.error(f"Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
+    parser = argparse.ArgumentParser(description="OCR pipeline: LibNas images to ALTO XML.")
+    parser.add_argument("--resume", action="store_true", help="Continue a run that was stopped part way.")
+    parser.add_argument("--stream", action="store_true", help="OCR, sort, generate ALTO XML and deliver each folder while LibNas is still being copied.")
+    parser.add_argument("--daemon", action="store_true", help="Keep running and process each new LibNas input folder once it stops changing.")
+    args = parser.parse_args()
+
+    # Finish what the interrupted run left half done before anything else touches the folders
+    if args.resume:
+        PipelineRecovery().resume()
+
+    if args.daemon:
+        PipelineDaemon().run()
+    elif args.stream:
+        StreamingPipeline().run()
     else:
-        log_activity.error(f"Failed to run after {max_retries} retries. Exiting.")
-
-    # Return processed files to libNas
-    libnas.send_to_libnas()
-    
-    # Clean up core folders & input folder and output folder along with their respective empty sub directories
-    check.is_core_folder_empty()
-    check.is_input_folder_empty()
-    check.is_output_folder_structured()
\ No newline at end of file
+        # Run every stage once, a folder that fails ALTO generation does not hold up the others
+        PipelineScheduler().run()
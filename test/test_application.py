@@ -1,9 +1,15 @@
+import io
 import os
+import re
 import json
 import shutil
+import tarfile
 import tempfile
+import threading
+import time
 import pytest
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from PIL import Image
 
 # Import the modules from your application
@@ -14,6 +20,21 @@ from utils.log import LogActivities
 from utils.client import TextractOCR
 from utils.alto import AltoGenerator
 from utils.libnas import LibNas
+from utils.sort import SortOCR
+from utils.cache import OCRCache
+from utils.rate_limit import AdaptiveRateLimiter, ThrottledError
+from utils.preprocess import ImagePreprocessor
+from utils.tiling import PageTiler
+from utils.imagesize import ImageSizeProbe
+from utils.compact import CompactPage
+from utils.manifest import ProcessingManifest
+from utils.recovery import PipelineRecovery
+from utils.reference import ImageReference
+from utils.scheduler import PipelineScheduler
+from utils.stream import StreamingPipeline
+from utils.watch import InputWatcher
+from utils.daemon import PipelineDaemon
+from utils.archive import PackedArchive, main as archive_main
 
 # A fixture that sets up temporary directories and overrides the config values.
 @pytest.fixture
@@ -23,6 +44,7 @@ def temp_config(tmp_path, monkeypatch):
         "processed_folder": str(tmp_path / "processed"),
         "core_folders": str(tmp_path / "core_folders"),
         "logs_folder": str(tmp_path / "logs"),
+        "ocr_cache_folder": str(tmp_path / "ocr_cache"),
         "json_log_path": str(tmp_path / "json_log"),
         "text_folder": str(tmp_path / "text"),
         "json_folder": str(tmp_path / "json"),
@@ -45,15 +67,66 @@ def temp_config(tmp_path, monkeypatch):
         "rename_failed_text": "txt",
         "output_extension_json": ".json",
         "output_extension_text": ".txt",
+        "output_extension_alto": ".alto",
+        "output_extension_compact": ".ocr",
         "overwrite_files": True,
         "image_extensions": ('.TIF', '.png', '.jpg', '.jpeg'),
+        "ocr_max_workers": 1,
+        "copy_max_workers": 2,
+        "copy_buffer_size": 4,
+        "copy_retries": 2,
+        "copy_retry_delay": 0,
+        "copy_timeout": 60,
+        "copy_checksum": True,
+        "delta_sync": True,
+        "delta_sync_hash": True,
+        "direct_read": False,
+        "direct_read_copy_masters": True,
+        "delivery_max_workers": 2,
+        "delivery_retries": 2,
+        "delivery_retry_delay": 0,
+        "packed_output": False,
+        "packed_output_compression": "none",
+        "packed_output_zstd_level": 3,
+        "stream_queue_size": 2,
+        "watch_mode": "scan",
+        "watch_settle_seconds": 0,
+        "watch_scan_interval": 0.05,
+        "textract_max_tps": 1000,
+        "textract_min_tps": 100,
+        "throttle_max_requeues": 3,
+        "ocr_cache_enabled": False,
+        "ocr_cache_max_bytes": 1024 * 1024,
+        "textract_max_bytes": 10 * 1024 ** 2,
+        "textract_max_side": 10000,
+        "preprocess_max_pixels": 40_000_000,
+        "preprocess_format": "JPEG",
+        "preprocess_jpeg_quality": 90,
+        "source_max_pixels": 1_000_000_000,
+        "ocr_tiling_enabled": False,
+        "tile_size": 4000,
+        "tile_overlap": 200,
+        "alto_pretty_print": True,
+        "alto_max_workers": 1,
+        "fused_alto": False,
+        "compact_ocr_output": False,
+        "compact_ocr_gzip": True,
+        "raw_json_output": True,
+        "pretty_json": False,
+        "manifest_enabled": False,
+        "manifest_file_name": "manifest.sqlite3",
+        "log_buffer_size": 64 * 1024,
+        "log_flush_interval": 1,
         "low_confidence_error_message": "Low confidence error",
         "exception_save_error_message": "Save error",
-        "ocr_processing_error_message": "OCR error"
+        "ocr_processing_error_message": "OCR error",
+        "alto_page_error_message": "ALTO page error"
     }
     # Override CoreConfig methods to return our temporary paths and values.
     monkeypatch.setattr(CoreConfig, "requiredFolders", staticmethod(lambda: folders))
     monkeypatch.setattr(CoreConfig, "requiredValues", staticmethod(lambda: values))
+    # Every test gets its own process-wide rate limiter
+    monkeypatch.setattr(AdaptiveRateLimiter, "_shared", None)
     # Create all directories.
     for path in folders.values():
         os.makedirs(path, exist_ok=True)
@@ -109,6 +182,7 @@ def test_log_activities(temp_config):
     log_activities = LogActivities(logs_folder)
     # Write a confidence log.
     log_activities.confidence("test_file.jpg", 95.0)
+    log_activities.flush()
     confidence_log = os.path.join(logs_folder, "avg_confidence_score.log")
     assert os.path.exists(confidence_log)
     with open(confidence_log, "r") as f:
@@ -116,12 +190,37 @@ def test_log_activities(temp_config):
     assert "test_file.jpg" in content
     # Write an error log.
     log_activities.error("Test error message")
+    log_activities.flush()
     error_log = os.path.join(logs_folder, "errors.log")
     assert os.path.exists(error_log)
     with open(error_log, "r") as f:
         content = f.read()
     assert "Test error message" in content
 
+def log_from_worker(logs_folder, index):
+    LogActivities(logs_folder).processing(f"process line {index}")
+    return index
+
+
+def test_log_writer_batches_lines_from_threads_and_processes(temp_config):
+    folders, _ = temp_config
+    logs_folder = folders["logs_folder"]
+    log_activities = LogActivities(logs_folder)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda index: log_activities.processing(f"thread line {index}"), range(400)))
+    # Worker processes write their lines when they exit
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        assert list(executor.map(log_from_worker, [logs_folder] * 20, range(20))) == list(range(20))
+    log_activities.flush()
+
+    with open(os.path.join(logs_folder, "processing.log"), encoding="UTF-8") as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 420
+    assert all(re.fullmatch(r"\d{4}-\d\d-\d\d [\d:.]+ - (thread|process) line \d+ ", line) for line in lines)
+    assert sorted(line.split(" - ")[1] for line in lines) == sorted([f"thread line {i} " for i in range(400)] + [f"process line {i} " for i in range(20)])
+
+
 def test_textract_ocr_select_image(temp_config, monkeypatch):
     folders, values = temp_config
     # Create a dummy image file in the input folder.
@@ -150,7 +249,7 @@ def test_textract_ocr_select_image(temp_config, monkeypatch):
             return dummy_response
     
     # Monkeypatch boto3.client so that TextractOCR uses our dummy client.
-    monkeypatch.setattr("boto3.client", lambda service: DummyTextractClient())
+    monkeypatch.setattr("boto3.client", lambda service, **kwargs: DummyTextractClient())
     
     ocr = TextractOCR()
     # Patch delete_empty_folder to bypass the error in the test environment.
@@ -167,6 +266,986 @@ def test_textract_ocr_select_image(temp_config, monkeypatch):
     assert os.path.exists(expected_text)
 
 
+def test_textract_ocr_select_image_concurrent(temp_config, monkeypatch):
+    folders, values = temp_config
+    values["ocr_max_workers"] = 4
+    subfolder = os.path.join(folders["input_folder"], "subdir")
+    os.makedirs(subfolder, exist_ok=True)
+    for index in range(8):
+        Image.new("RGB", (50, 50), color="white").save(os.path.join(subfolder, f"page_{index}.jpg"))
+
+    dummy_response = {
+        "Blocks": [
+            {
+                "BlockType": "LINE",
+                "Text": "Test OCR",
+                "Confidence": 90,
+                "Geometry": {"BoundingBox": {"Left": 0.1, "Top": 0.1, "Width": 0.3, "Height": 0.1}},
+                "Relationships": [{"Ids": []}]
+            }
+        ]
+    }
+    bad_image = open(os.path.join(subfolder, "page_3.jpg"), "rb").read() + b"corrupt"
+    with open(os.path.join(subfolder, "page_3.jpg"), "wb") as f:
+        f.write(bad_image)
+
+    class DummyTextractClient:
+        def detect_document_text(self, Document):
+            if Document["Bytes"] == bad_image:
+                raise Exception("UnsupportedDocumentException")
+            return dummy_response
+
+    monkeypatch.setattr("boto3.client", lambda service, **kwargs: DummyTextractClient())
+    ocr = TextractOCR()
+    ocr.select_image(folders["input_folder"])
+
+    for index in range(8):
+        expected_json = os.path.join(folders["json_sorter"], "subdir", f"page_{index}.json")
+        assert os.path.exists(expected_json) == (index != 3)
+    assert len(os.listdir(os.path.join(folders["images_sorter"], "subdir"))) == 7
+    assert os.listdir(folders["failed_ocr_folder"]) == ["page_3.jpg"]
+    assert not os.path.exists(subfolder)
+
+
+def test_rate_limiter_aimd():
+    limiter = AdaptiveRateLimiter(max_rate=10, min_rate=1, increase_step=0.5, decrease_factor=0.5)
+    limiter.record_throttle()
+    assert limiter.rate == 5
+    limiter.record_throttle()
+    limiter.record_throttle()
+    limiter.record_throttle()
+    assert limiter.rate == 1
+    limiter.record_success()
+    assert limiter.rate == 1.5
+    for _ in range(100):
+        limiter.record_success()
+    stats = limiter.stats()
+    assert stats["rate"] == 10
+    assert stats["throttles"] == 4
+    assert stats["successes"] == 101
+
+
+def test_textract_throttled_pages_are_requeued(temp_config, monkeypatch):
+    from botocore.exceptions import ClientError
+    folders, values = temp_config
+    values["ocr_max_workers"] = 2
+    subfolder = os.path.join(folders["input_folder"], "subdir")
+    os.makedirs(subfolder, exist_ok=True)
+    for index in range(3):
+        Image.new("RGB", (50, 50), color="white").save(os.path.join(subfolder, f"page_{index}.jpg"))
+
+    dummy_response = {"Blocks": [{"BlockType": "LINE", "Text": "Test", "Confidence": 90}]}
+    calls = {"count": 0}
+
+    class DummyTextractClient:
+        def detect_document_text(self, Document):
+            calls["count"] += 1
+            # Throttle the first two calls
+            if calls["count"] <= 2:
+                raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}}, "DetectDocumentText")
+            return dummy_response
+
+    monkeypatch.setattr("boto3.client", lambda service, **kwargs: DummyTextractClient())
+    ocr = TextractOCR()
+    ocr.select_image(folders["input_folder"])
+
+    assert not os.listdir(folders["failed_ocr_folder"])
+    assert len(os.listdir(os.path.join(folders["json_sorter"], "subdir"))) == 3
+    stats = ocr.rate_limiter.stats()
+    assert stats["throttles"] == 2
+    assert stats["requeues"] == 2
+
+
+def test_textract_client_leaves_throttles_to_the_rate_limiter(temp_config, monkeypatch):
+    from botocore.awsrequest import AWSResponse
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    monkeypatch.setenv("AWS_REGION", "eu-west-1")
+    ocr = TextractOCR()
+    sent = []
+
+    class Body:
+        def stream(self, **kwargs):
+            yield b'{"__type": "ThrottlingException", "message": "Rate exceeded"}'
+
+    def throttle(request, **kwargs):
+        sent.append(request)
+        return AWSResponse(request.url, 400, {"x-amzn-ErrorType": "ThrottlingException"}, Body())
+
+    ocr.client.meta.events.register("before-send.textract.DetectDocumentText", throttle)
+    with pytest.raises(ThrottledError):
+        ocr.detect_document_text(b"image")
+
+    # botocore sent the request once, the throttle reached the rate limiter straight away
+    assert len(sent) == 1
+    assert ocr.rate_limiter.stats()["throttles"] == 1
+
+
+def test_ocr_cache_skips_textract_on_rerun(temp_config, monkeypatch):
+    folders, values = temp_config
+    values["ocr_cache_enabled"] = True
+    subfolder = os.path.join(folders["input_folder"], "subdir")
+    os.makedirs(subfolder, exist_ok=True)
+    image_path = os.path.join(subfolder, "page.jpg")
+    Image.new("RGB", (50, 50), color="white").save(image_path)
+    image_bytes = open(image_path, "rb").read()
+
+    dummy_response = {"Blocks": [{"BlockType": "LINE", "Text": "Cached", "Confidence": 90}]}
+    calls = {"count": 0}
+
+    class DummyTextractClient:
+        def detect_document_text(self, Document):
+            calls["count"] += 1
+            return dummy_response
+
+    monkeypatch.setattr("boto3.client", lambda service, **kwargs: DummyTextractClient())
+    TextractOCR().select_image(folders["input_folder"])
+
+    # Re-drop the same image, the second run is served from the cache
+    os.makedirs(subfolder, exist_ok=True)
+    with open(image_path, "wb") as f:
+        f.write(image_bytes)
+    ocr = TextractOCR()
+    ocr.select_image(folders["input_folder"])
+
+    assert calls["count"] == 1
+    assert ocr.ocr_cache.stats()["hits"] == 1
+    with open(os.path.join(folders["text_sorter"], "subdir", "page.txt")) as f:
+        assert f.read() == "Cached"
+
+
+def test_image_is_hashed_once_for_the_manifest_and_the_cache(temp_config, monkeypatch):
+    folders, values = temp_config
+    values["ocr_cache_enabled"] = True
+    values["manifest_enabled"] = True
+    subfolder = os.path.join(folders["input_folder"], "subdir")
+    os.makedirs(subfolder, exist_ok=True)
+    image_path = os.path.join(subfolder, "page.jpg")
+    Image.new("RGB", (50, 50), color="white").save(image_path)
+
+    class DummyTextractClient:
+        def detect_document_text(self, Document):
+            return {"Blocks": [{"BlockType": "LINE", "Text": "Cached", "Confidence": 90}]}
+
+    monkeypatch.setattr("boto3.client", lambda service, **kwargs: DummyTextractClient())
+    hashed = []
+    file_hash = ProcessingManifest.file_hash
+    monkeypatch.setattr(ProcessingManifest, "file_hash", classmethod(lambda cls, path: hashed.append(path) or file_hash(path)))
+    monkeypatch.setattr(OCRCache, "key_for", staticmethod(lambda image_bytes: hashed.append("cache") or "unused"))
+
+    ocr = TextractOCR()
+    ocr.select_image(folders["input_folder"])
+
+    assert hashed == [image_path]
+    assert ocr.ocr_cache.get(file_hash(os.path.join(folders["images_sorter"], "subdir", "page.jpg"))) is not None
+
+
+def test_ocr_cache_lru_eviction(tmp_path):
+    cache = OCRCache(str(tmp_path), max_bytes=250)
+    response = {"Blocks": [{"Text": "x" * 80}]}
+    cache.put("a" * 64, response)
+    cache.put("b" * 64, response)
+    # Touch "a" so "b" becomes the least recently used entry
+    assert cache.get("a" * 64) == response
+    cache.put("c" * 64, response)
+    assert cache.get("b" * 64) is None
+    assert cache.get("a" * 64) == response
+    assert cache.stats()["entries"] == 2
+    # The index is rebuilt from disk
+    assert OCRCache(str(tmp_path), max_bytes=250).stats()["entries"] == 2
+
+
+def test_image_preprocessor_transcodes_and_downscales():
+    buffer = io.BytesIO()
+    Image.new("L", (400, 300), color=255).save(buffer, format="TIFF")
+    tiff_bytes = buffer.getvalue()
+
+    preprocessor = ImagePreprocessor(max_bytes=10 * 1024 ** 2, max_pixels=30_000, max_side=10000)
+    prepared = preprocessor.prepare(tiff_bytes)
+    assert prepared.upload_format == "JPEG"
+    assert Image.open(io.BytesIO(prepared.data)).format == "JPEG"
+    assert (prepared.width, prepared.height) == (400, 300)
+    assert prepared.upload_width * prepared.upload_height <= 30_000
+    assert prepared.metadata()["ScaleFactor"] == pytest.approx(0.5, abs=0.01)
+
+    # JPEG within the limits is uploaded untouched
+    buffer = io.BytesIO()
+    Image.new("RGB", (100, 100), color="white").save(buffer, format="JPEG")
+    prepared = preprocessor.prepare(buffer.getvalue())
+    assert prepared.data == buffer.getvalue()
+    assert prepared.scale == 1.0
+
+
+def test_image_preprocessor_scales_16_bit_greyscale_to_8_bit():
+    buffer = io.BytesIO()
+    Image.new("I;16", (100, 80), color=30000).save(buffer, format="TIFF")
+
+    prepared = ImagePreprocessor(max_bytes=10 * 1024 ** 2, max_pixels=40_000, max_side=10000).prepare(buffer.getvalue())
+
+    with Image.open(io.BytesIO(prepared.data)) as uploaded:
+        assert uploaded.mode == "L"
+        # 30000 of 65535 is mid-grey, not clipped to white
+        low, high = uploaded.getextrema()
+        assert 110 <= low <= high <= 124
+
+
+def test_image_preprocessor_raises_the_pixel_limit_only_to_the_configured_bound(monkeypatch):
+    # Importing the preprocessor leaves Pillow's decompression bomb guard on
+    assert Image.MAX_IMAGE_PIXELS is not None
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 5_000)
+    buffer = io.BytesIO()
+    Image.new("L", (200, 100), color=255).save(buffer, format="TIFF")
+    with pytest.raises(Image.DecompressionBombError):
+        Image.open(io.BytesIO(buffer.getvalue()))
+
+    preprocessor = ImagePreprocessor(max_bytes=10 * 1024 ** 2, max_pixels=40_000, max_side=10000, max_source_pixels=20_000)
+    assert Image.MAX_IMAGE_PIXELS == 20_000
+    assert preprocessor.prepare(buffer.getvalue()).width == 200
+
+    # A smaller bound never lowers the limit
+    ImagePreprocessor(max_bytes=10 * 1024 ** 2, max_pixels=40_000, max_side=10000, max_source_pixels=1_000)
+    assert Image.MAX_IMAGE_PIXELS == 20_000
+
+
+def test_textract_records_original_size_for_alto(temp_config, monkeypatch):
+    folders, values = temp_config
+    values["preprocess_max_pixels"] = 10_000
+    subfolder = os.path.join(folders["input_folder"], "subdir")
+    os.makedirs(subfolder, exist_ok=True)
+    Image.new("L", (400, 200), color=255).save(os.path.join(subfolder, "page.TIF"))
+    uploads = []
+
+    class DummyTextractClient:
+        def detect_document_text(self, Document):
+            uploads.append(Image.open(io.BytesIO(Document["Bytes"])).size)
+            return {"Blocks": [{"BlockType": "LINE", "Text": "Test", "Confidence": 90}]}
+
+    monkeypatch.setattr("boto3.client", lambda service, **kwargs: DummyTextractClient())
+    TextractOCR().select_image(folders["input_folder"])
+
+    assert uploads[0][0] * uploads[0][1] <= 10_000
+    with open(os.path.join(folders["json_sorter"], "subdir", "page.json")) as f:
+        metadata = json.load(f)["PipelineMetadata"]
+    assert (metadata["OriginalWidth"], metadata["OriginalHeight"]) == (400, 200)
+    assert metadata["ScaleFactor"] < 1
+
+
+def test_page_tiler_merges_overlapping_tiles():
+    tiler = PageTiler(tile_size=600, overlap=100)
+    tiles = tiler.plan(1000, 400)
+    assert [tile["box"] for tile in tiles] == [(0, 0, 600, 400), (400, 0, 1000, 400)]
+
+    def tile_response(tile, line_words):
+        # line_words: list of (text, left, right) in page pixels, all words on one line at y 100..120
+        left, top, right, bottom = tile["box"]
+        width, height = right - left, bottom - top
+
+        def box(x0, x1):
+            x0, x1 = max(x0, left), min(x1, right)
+            return {"BoundingBox": {"Left": (x0 - left) / width, "Top": 100 / height,
+                                    "Width": (x1 - x0) / width, "Height": 20 / height}}
+
+        words = [{"BlockType": "WORD", "Id": f"w{i}", "Text": text, "Confidence": 99, "Geometry": box(x0, x1)}
+                 for i, (text, x0, x1) in enumerate(line_words)]
+        line = {"BlockType": "LINE", "Id": "l0", "Text": " ".join(w["Text"] for w in words), "Confidence": 99,
+                "Geometry": box(line_words[0][1], line_words[-1][2]),
+                "Relationships": [{"Type": "CHILD", "Ids": [w["Id"] for w in words]}]}
+        return {"Blocks": [line] + words}
+
+    # A line cut by the tile edge is read by both tiles
+    responses = [
+        tile_response(tiles[0], [("a", 300, 350), ("b", 450, 500), ("c", 560, 600)]),
+        tile_response(tiles[1], [("b", 450, 500), ("c", 560, 600), ("d", 650, 700)]),
+    ]
+    merged = tiler.merge(tiles, responses, 1000, 400)
+
+    words = [block for block in merged["Blocks"] if block["BlockType"] == "WORD"]
+    assert [word["Text"] for word in words] == ["a", "b", "c", "d"]
+    assert words[3]["Geometry"]["BoundingBox"]["Left"] == pytest.approx(0.65)
+    assert words[3]["Geometry"]["BoundingBox"]["Width"] == pytest.approx(0.05)
+    assert merged["Blocks"][0]["BlockType"] == "PAGE"
+    word_ids = {word["Id"] for word in words}
+    for line in (block for block in merged["Blocks"] if block["BlockType"] == "LINE"):
+        assert set(line["Relationships"][0]["Ids"]) <= word_ids
+
+
+def test_page_tiler_keeps_reading_order_of_a_column():
+    tiler = PageTiler(tile_size=600, overlap=100)
+    tiles = tiler.plan(1000, 400)
+
+    # One column 40px apart with different indents, line3 reaches into the second tile
+    page_lines = [("line0", 100, 500, 40), ("line1", 120, 500, 80), ("line2", 60, 500, 120),
+                  ("line3", 620, 900, 160), ("line4", 80, 500, 200)]
+
+    def tile_response(tile):
+        left, top, right, bottom = tile["box"]
+        width, height = right - left, bottom - top
+        blocks = []
+        for text, x0, x1, y in page_lines:
+            if x0 < left or x1 > right:
+                continue
+            geometry = {"BoundingBox": {"Left": (x0 - left) / width, "Top": (y - top) / height,
+                                        "Width": (x1 - x0) / width, "Height": 20 / height}}
+            blocks.append({"BlockType": "LINE", "Id": f"l-{text}", "Text": text, "Confidence": 99, "Geometry": geometry,
+                           "Relationships": [{"Type": "CHILD", "Ids": [f"w-{text}"]}]})
+            blocks.append({"BlockType": "WORD", "Id": f"w-{text}", "Text": text, "Confidence": 99, "Geometry": geometry})
+        return {"Blocks": blocks}
+
+    merged = tiler.merge(tiles, [tile_response(tile) for tile in tiles], 1000, 400)
+    assert [block["Text"] for block in merged["Blocks"] if block["BlockType"] == "LINE"] == ["line0", "line1", "line2", "line3", "line4"]
+
+
+def test_textract_tiles_oversized_pages(temp_config, monkeypatch):
+    folders, values = temp_config
+    values.update({"ocr_tiling_enabled": True, "preprocess_max_pixels": 50_000, "tile_size": 200, "tile_overlap": 40})
+    subfolder = os.path.join(folders["input_folder"], "subdir")
+    os.makedirs(subfolder, exist_ok=True)
+    Image.new("L", (500, 300), color=255).save(os.path.join(subfolder, "map.png"))
+    tile_sizes = []
+
+    class DummyTextractClient:
+        def detect_document_text(self, Document):
+            tile_sizes.append(Image.open(io.BytesIO(Document["Bytes"])).size)
+            return {"Blocks": [
+                {"BlockType": "LINE", "Id": "l", "Text": "x", "Confidence": 90,
+                 "Geometry": {"BoundingBox": {"Left": 0.45, "Top": 0.45, "Width": 0.1, "Height": 0.1}},
+                 "Relationships": [{"Type": "CHILD", "Ids": ["w"]}]},
+                {"BlockType": "WORD", "Id": "w", "Text": "x", "Confidence": 90,
+                 "Geometry": {"BoundingBox": {"Left": 0.45, "Top": 0.45, "Width": 0.1, "Height": 0.1}}},
+            ]}
+
+    monkeypatch.setattr("boto3.client", lambda service, **kwargs: DummyTextractClient())
+    TextractOCR().select_image(folders["input_folder"])
+
+    assert len(tile_sizes) == 6
+    assert all(size == (200, 200) for size in tile_sizes)
+    with open(os.path.join(folders["json_sorter"], "subdir", "map.json")) as f:
+        response = json.load(f)
+    assert response["PipelineMetadata"]["Tiles"] == 6
+    assert len([block for block in response["Blocks"] if block["BlockType"] == "LINE"]) == 6
+
+
+def test_multipage_tiff_pages_flow_to_alto(temp_config, monkeypatch):
+    folders, values = temp_config
+    values["ocr_max_workers"] = 2
+    subfolder = os.path.join(folders["input_folder"], "batch")
+    os.makedirs(subfolder, exist_ok=True)
+    frames = [Image.new("L", (100 + index * 10, 80), color=255) for index in range(3)]
+    frames[0].save(os.path.join(subfolder, "letter-001.TIF"), save_all=True, append_images=frames[1:])
+
+    class DummyTextractClient:
+        def detect_document_text(self, Document):
+            width = Image.open(io.BytesIO(Document["Bytes"])).size[0]
+            geometry = {"BoundingBox": {"Left": 0.1, "Top": 0.1, "Width": 0.3, "Height": 0.1}}
+            return {"Blocks": [
+                {"BlockType": "LINE", "Id": "l", "Text": f"width {width}", "Confidence": 90, "Geometry": geometry,
+                 "Relationships": [{"Type": "CHILD", "Ids": ["w"]}]},
+                {"BlockType": "WORD", "Id": "w", "Text": str(width), "Confidence": 90, "Geometry": geometry},
+            ]}
+
+    monkeypatch.setattr("boto3.client", lambda service, **kwargs: DummyTextractClient())
+    TextractOCR().select_image(folders["input_folder"])
+
+    json_sorter = os.path.join(folders["json_sorter"], "batch")
+    assert sorted(os.listdir(json_sorter)) == ["letter-001_p0001.json", "letter-001_p0002.json", "letter-001_p0003.json"]
+    with open(os.path.join(folders["text_sorter"], "batch", "letter-001_p0002.txt")) as f:
+        assert f.read() == "width 110"
+
+    SortOCR().start_sorting()
+    AltoGenerator()
+
+    output_file = os.path.join(folders["processed_folder"], "batch", "letter", "letter.xml")
+    with open(output_file, encoding="utf-8") as f:
+        content = f.read()
+    assert content.count("<Page ") == 3
+    assert 'ID="letter-001_p0003"' in content and 'WIDTH="120"' in content
+
+
+def test_alto_calculate_positions_indexes_words(monkeypatch):
+    from xml.etree.ElementTree import Element
+    from utils import alto
+
+    def word(word_id, text, left):
+        return {"BlockType": "WORD", "Id": word_id, "Text": text, "Confidence": 87.654,
+                "Geometry": {"BoundingBox": {"Left": left, "Top": 0.2, "Width": 0.1, "Height": 0.05}}}
+
+    data = {"Blocks": [
+        {"BlockType": "LINE", "Id": "l1", "Text": "one two", "Confidence": 90,
+         "Geometry": {"BoundingBox": {"Left": 0.1, "Top": 0.2, "Width": 0.25, "Height": 0.05}},
+         "Relationships": [{"Type": "CHILD", "Ids": ["w1", "w2", "missing"]}]},
+        word("w1", "one", 0.1), word("w2", "two", 0.25),
+    ]}
+
+    def render():
+        print_space = Element("PrintSpace")
+        AltoGenerator.__new__(AltoGenerator).calculate_positions(data, 1000, 2000, print_space, 0, -1, 0)
+        return print_space
+
+    monkeypatch.setattr(alto, "np", None)
+    print_space = render()
+    strings = print_space.findall(".//String")
+    assert [(s.get("CONTENT"), s.get("HPOS"), s.get("VPOS"), s.get("WIDTH"), s.get("HEIGHT"), s.get("WC")) for s in strings] == [
+        ("one", "100", "400", "100", "100", "0.88"), ("two", "250", "400", "100", "100", "0.88")]
+    spaces = print_space.findall(".//SP")
+    assert len(spaces) == 1
+    assert (spaces[0].get("WIDTH"), spaces[0].get("VPOS")) == ("50", "400")
+    assert print_space.find(".//TextLine").get("WIDTH") == "250"
+
+
+@pytest.mark.parametrize("pretty_print", [True, False])
+def test_alto_writer_streams_pages(tmp_path, pretty_print):
+    from xml.etree.ElementTree import Element, SubElement, parse
+    from utils.alto import AltoWriter
+
+    output_file = str(tmp_path / "out.xml")
+    with AltoWriter(output_file, pretty_print) as writer:
+        for index in range(3):
+            page = Element("Page", attrib={"ID": f"page_{index}"})
+            SubElement(page, "PrintSpace")
+            writer.write_page(page)
+        # Nothing is visible under the final name until the document is complete
+        assert not os.path.exists(output_file)
+
+    root = parse(output_file).getroot()
+    namespace = "{http://www.loc.gov/standards/alto/ns-v3#}"
+    assert root.tag == namespace + "alto"
+    assert root.find(f"{namespace}Description/{namespace}MeasurementUnit").text == "pixel"
+    assert [page.get("ID") for page in root.iter(namespace + "Page")] == ["page_0", "page_1", "page_2"]
+    with open(output_file, encoding="utf-8") as f:
+        assert ("\n\t\t<Page" in f.read()) == pretty_print
+
+
+def make_alto_batch(folders, top, subfolders, pages):
+    """Creates matching JSON, image and text folders for AltoGenerator."""
+    for subfolder in subfolders:
+        for root in (folders["json_folder"], folders["images_folder"], folders["text_folder"]):
+            os.makedirs(os.path.join(root, top, subfolder), exist_ok=True)
+        for index in range(pages):
+            name = f"{subfolder}-{index:03d}"
+            geometry = {"BoundingBox": {"Left": 0.1, "Top": 0.01 * index, "Width": 0.3, "Height": 0.1}}
+            data = {"Blocks": [
+                {"BlockType": "LINE", "Id": "l", "Text": name, "Confidence": 90, "Geometry": geometry,
+                 "Relationships": [{"Type": "CHILD", "Ids": ["w"]}]},
+                {"BlockType": "WORD", "Id": "w", "Text": name, "Confidence": 90, "Geometry": geometry},
+            ]}
+            with open(os.path.join(folders["json_folder"], top, subfolder, name + ".json"), "w") as f:
+                json.dump(data, f)
+            Image.new("RGB", (200 + index, 100), color="white").save(os.path.join(folders["images_folder"], top, subfolder, name + ".jpg"))
+            with open(os.path.join(folders["text_folder"], top, subfolder, name + ".txt"), "w") as f:
+                f.write(name)
+
+
+@pytest.mark.parametrize("alto_max_workers", [1, 2])
+def test_alto_quarantines_incomplete_pages_and_merges_them_later(temp_config, alto_max_workers):
+    folders, values = temp_config
+    values["alto_max_workers"] = alto_max_workers
+    make_alto_batch(folders, "batch", ["letters"], 4)
+    letters = [os.path.join(root, "batch", "letters") for root in (folders["json_folder"], folders["images_folder"], folders["text_folder"])]
+
+    # letters-002 has no OCR output, letters-003 has no image
+    os.remove(os.path.join(letters[0], "letters-002.json"))
+    os.remove(os.path.join(letters[1], "letters-003.jpg"))
+    AltoGenerator()
+
+    processed = os.path.join(folders["processed_folder"], "batch", "letters")
+    alto_file = os.path.join(processed, "letters.xml")
+    with open(alto_file, encoding="utf-8") as f:
+        assert re.findall(r'<Page [^>]*ID="([^"]+)"', f.read()) == ["letters-000", "letters-001"]
+    failed = os.path.join(folders["failed_folder"], "batch")
+    assert os.listdir(os.path.join(failed, "letters")) == ["letters-003.json"]
+    assert os.listdir(os.path.join(failed, "letters_image")) == ["letters-002.jpg"]
+    assert sorted(os.listdir(os.path.join(failed, "letters_text"))) == ["letters-002.txt", "letters-003.txt"]
+    with open(os.path.join(folders["json_log_path"], "failed_jobs_log.json"), encoding="utf-8") as f:
+        logged = [page for pages in json.load(f).values() for page in pages["ALTO page error"]]
+    assert sorted(logged) == [os.path.join("batch", "letters", "letters-002"), os.path.join("batch", "letters", "letters-003")]
+
+    # A later run with letters-002 adds its page without rendering the others again
+    make_alto_batch(folders, "batch", ["letters"], 3)
+    for folder in letters:
+        for file_name in os.listdir(folder):
+            if not file_name.startswith("letters-002"):
+                os.remove(os.path.join(folder, file_name))
+    AltoGenerator()
+
+    with open(alto_file, encoding="utf-8") as f:
+        content = f.read()
+    assert re.findall(r'<Page [^>]*ID="([^"]+)"', content) == ["letters-000", "letters-001", "letters-002"]
+    assert content.count("</Layout>") == 1
+    assert sorted(os.listdir(os.path.join(processed, "jpg"))) == ["letters-000.jpg", "letters-001.jpg", "letters-002.jpg"]
+
+
+def deliver_and_clean_up(folders):
+    """Delivers the processed folders and flattens the output as a pipeline run does."""
+    LibNas().send_to_libnas()
+    os.makedirs(folders["core_folders"], exist_ok=True)
+    os.makedirs(folders["input_folder"], exist_ok=True)
+    PipelineScheduler.clean_up()
+
+
+def test_alto_adds_later_pages_to_the_delivered_and_flattened_alto(temp_config):
+    folders, values = temp_config
+    make_alto_batch(folders, "batch", ["letters"], 2)
+    AltoGenerator()
+    deliver_and_clean_up(folders)
+    delivered = os.path.join(folders["libnas_output"], "letters")
+    assert os.path.exists(os.path.join(delivered, "letters.xml"))
+
+    # The next run only has letters-002, its page is added to the ALTO XML already delivered
+    make_alto_batch(folders, "batch", ["letters"], 3)
+    for root in (folders["json_folder"], folders["images_folder"], folders["text_folder"]):
+        for file_name in os.listdir(os.path.join(root, "batch", "letters")):
+            if not file_name.startswith("letters-002"):
+                os.remove(os.path.join(root, "batch", "letters", file_name))
+    AltoGenerator()
+    deliver_and_clean_up(folders)
+
+    assert sorted(os.listdir(folders["libnas_output"])) == ["letters"]
+    with open(os.path.join(delivered, "letters.xml"), encoding="utf-8") as f:
+        assert re.findall(r'<Page [^>]*ID="([^"]+)"', f.read()) == ["letters-000", "letters-001", "letters-002"]
+    assert sorted(os.listdir(os.path.join(delivered, "jpg"))) == ["letters-000.jpg", "letters-001.jpg", "letters-002.jpg"]
+
+
+def test_alto_generator_process_pool(temp_config):
+    folders, values = temp_config
+    make_alto_batch(folders, "serial", ["letters", "maps"], 5)
+    AltoGenerator()
+
+    values["alto_max_workers"] = 2
+    make_alto_batch(folders, "parallel", ["letters", "maps"], 5)
+    AltoGenerator()
+
+    for subfolder in ("letters", "maps"):
+        serial_dir = os.path.join(folders["processed_folder"], "serial", subfolder)
+        parallel_dir = os.path.join(folders["processed_folder"], "parallel", subfolder)
+        with open(os.path.join(serial_dir, subfolder + ".xml")) as f:
+            serial_xml = f.read()
+        with open(os.path.join(parallel_dir, subfolder + ".xml")) as f:
+            parallel_xml = f.read()
+        assert serial_xml == parallel_xml
+        assert serial_xml.count("<Page ") == 5
+        assert sorted(os.listdir(parallel_dir)) == ["jpg", "json", f"{subfolder}.xml", "txt"]
+    assert not os.path.exists(os.path.join(folders["json_folder"], "parallel"))
+
+
+def test_packed_output_archives_subfolders_and_adds_later_pages(temp_config, tmp_path, capsys):
+    folders, values = temp_config
+    values["packed_output"] = True
+    make_alto_batch(folders, "batch", ["letters"], 3)
+    AltoGenerator()
+
+    processed = os.path.join(folders["processed_folder"], "batch", "letters")
+    assert sorted(os.listdir(processed)) == ["letters.tar", "letters.tar.index.json"]
+    archive = PackedArchive(os.path.join(processed, "letters.tar"))
+    assert "json/letters-001.json" in archive.names() and "jpg/letters-002.jpg" in archive.names()
+
+    # A plain tar that standard tools read, with the same content as a single member read
+    with tarfile.open(archive.path) as tar:
+        assert sorted(tar.getnames()) == sorted(archive.names())
+        assert tar.extractfile("letters.xml").read() == archive.read("letters.xml")
+    assert archive.read("letters.xml").count(b"<Page ") == 3
+
+    # A later run adds its page to the archive, the earlier members are kept
+    make_alto_batch(folders, "batch", ["letters"], 4)
+    for root in (folders["json_folder"], folders["images_folder"], folders["text_folder"]):
+        for file_name in os.listdir(os.path.join(root, "batch", "letters")):
+            if not file_name.startswith("letters-003"):
+                os.remove(os.path.join(root, "batch", "letters", file_name))
+    AltoGenerator()
+    archive = PackedArchive(os.path.join(processed, "letters.tar"))
+    assert sorted(name for name in archive.names() if name.startswith("jpg/")) == [f"jpg/letters-00{i}.jpg" for i in range(4)]
+    assert re.findall(rb'<Page [^>]*ID="([^"]+)"', archive.read("letters.xml")) == [b"letters-000", b"letters-001", b"letters-002", b"letters-003"]
+
+    # The archive is delivered as it is, and single members are listed and extracted from LibNas
+    LibNas().send_to_libnas()
+    delivered = os.path.join(folders["libnas_output"], "batch", "letters", "letters.tar")
+    assert archive_main(["list", delivered]) == 0
+    assert "txt/letters-000.txt" in capsys.readouterr().out
+    extracted = tmp_path / "extracted"
+    assert archive_main(["extract", delivered, "json/letters-002.json", "-o", str(extracted)]) == 0
+    with open(extracted / "json" / "letters-002.json", "rb") as f:
+        assert f.read() == PackedArchive(delivered).read("json/letters-002.json")
+    assert os.listdir(extracted) == ["json"]
+
+
+def test_scheduler_reports_failed_folders_and_continues(temp_config):
+    folders, values = temp_config
+    make_alto_batch(folders, "good", ["letters"], 2)
+    make_alto_batch(folders, "broken", ["maps"], 2)
+    shutil.rmtree(os.path.join(folders["images_folder"], "broken"))
+
+    scheduler = PipelineScheduler()
+    assert scheduler.ready_folders() == ["good", "broken"]
+    results = {result["folder"]: result for result in scheduler.generate_alto()}
+
+    assert results["good"]["status"] == "completed"
+    assert results["broken"]["status"] == "failed"
+    assert results["broken"]["error"]
+    assert os.path.exists(os.path.join(folders["processed_folder"], "good", "letters", "letters.xml"))
+    assert "good" not in scheduler.ready_folders()
+
+
+def test_scheduler_reports_malformed_ocr_output_as_a_failed_folder(temp_config):
+    folders, values = temp_config
+    make_alto_batch(folders, "good", ["letters"], 2)
+    make_alto_batch(folders, "malformed", ["maps"], 2)
+    # A LINE block without its geometry
+    with open(os.path.join(folders["json_folder"], "malformed", "maps", "maps-001.json"), "w") as f:
+        json.dump({"Blocks": [{"BlockType": "LINE", "Id": "l", "Text": "Galway", "Confidence": 90}]}, f)
+
+    results = {result["folder"]: result for result in PipelineScheduler().generate_alto()}
+
+    assert results["good"]["status"] == "completed"
+    assert results["malformed"]["status"] == "failed"
+    LogActivities.flush()
+    with open(os.path.join(folders["logs_folder"], "errors.log"), encoding="UTF-8") as f:
+        assert "Traceback" in f.read()
+
+
+@pytest.mark.parametrize("alto_max_workers", [1, 2])
+def test_scheduler_fails_only_the_bad_subfolder_of_a_folder(temp_config, alto_max_workers):
+    folders, values = temp_config
+    values["alto_max_workers"] = alto_max_workers
+    make_alto_batch(folders, "batch", ["aaa", "mmm", "zzz"], 2)
+    # zzz has no page with both its image and its JSON, mmm has a LINE block without its geometry
+    os.rename(os.path.join(folders["json_folder"], "batch", "zzz", "zzz-000.json"), os.path.join(folders["json_folder"], "batch", "zzz", "renamed-000.json"))
+    os.rename(os.path.join(folders["json_folder"], "batch", "zzz", "zzz-001.json"), os.path.join(folders["json_folder"], "batch", "zzz", "renamed-001.json"))
+    with open(os.path.join(folders["json_folder"], "batch", "mmm", "mmm-001.json"), "w") as f:
+        json.dump({"Blocks": [{"BlockType": "LINE", "Id": "l", "Text": "Galway", "Confidence": 90}]}, f)
+
+    [result] = PipelineScheduler().generate_alto()
+
+    assert result["status"] == "failed"
+    assert sorted(failed["subfolder"] for failed in result["failed_subfolders"]) == ["mmm", "zzz"]
+    assert os.path.exists(os.path.join(folders["processed_folder"], "batch", "aaa", "aaa.xml"))
+    assert not os.path.exists(os.path.join(folders["json_folder"], "batch"))
+    failed = os.path.join(folders["failed_folder"], "batch")
+    assert sorted(os.listdir(failed)) == ["mmm", "mmm_image", "mmm_text", "zzz", "zzz_image", "zzz_text"]
+
+
+def test_streaming_pipeline_delivers_folders_with_bounded_input(temp_config, monkeypatch):
+    folders, values = temp_config
+    values["ocr_max_workers"] = 2
+    for folder in ("letters", "maps", "deeds"):
+        os.makedirs(os.path.join(folders["libnas_input"], folder))
+        for index in range(3):
+            Image.new("RGB", (120, 90), color="white").save(os.path.join(folders["libnas_input"], folder, f"{folder}-00{index}.png"))
+
+    class DummyTextractClient:
+        def detect_document_text(self, Document):
+            geometry = {"BoundingBox": {"Left": 0.1, "Top": 0.2, "Width": 0.3, "Height": 0.1}}
+            return {"Blocks": [
+                {"BlockType": "LINE", "Id": "l", "Text": "Galway", "Confidence": 90, "Geometry": geometry,
+                 "Relationships": [{"Type": "CHILD", "Ids": ["w"]}]},
+                {"BlockType": "WORD", "Id": "w", "Text": "Galway", "Confidence": 90, "Geometry": geometry},
+            ]}
+
+    monkeypatch.setattr("boto3.client", lambda service, **kwargs: DummyTextractClient())
+
+    # Images waiting in the input folder never exceed the queue, the OCR workers and the copies in flight
+    waiting = []
+    copy_image = LibNas.copy_image
+    def counting_copy_image(self, root, filename):
+        waiting.append(sum(len(files) for _, _, files in os.walk(folders["input_folder"])))
+        return copy_image(self, root, filename)
+    monkeypatch.setattr(LibNas, "copy_image", counting_copy_image)
+
+    results = StreamingPipeline().run()
+
+    assert sorted((result["folder"], result["status"]) for result in results) == [("deeds", "completed"), ("letters", "completed"), ("maps", "completed")]
+    assert max(waiting) <= values["stream_queue_size"] + values["ocr_max_workers"] + values["copy_max_workers"]
+    for folder in ("letters", "maps", "deeds"):
+        with open(os.path.join(folders["libnas_output"], folder, f"{folder}.xml"), encoding="utf-8") as f:
+            assert f.read().count("<Page ") == 3
+    assert not os.path.exists(os.path.join(folders["json_folder"], "letters"))
+
+
+def test_streaming_pipeline_carries_on_after_a_failed_copy(temp_config, monkeypatch):
+    folders, values = temp_config
+    for folder in ("letters", "maps"):
+        os.makedirs(os.path.join(folders["libnas_input"], folder))
+        for index in range(3):
+            Image.new("RGB", (120, 90), color="white").save(os.path.join(folders["libnas_input"], folder, f"{folder}-00{index}.png"))
+
+    class DummyTextractClient:
+        def detect_document_text(self, Document):
+            geometry = {"BoundingBox": {"Left": 0.1, "Top": 0.2, "Width": 0.3, "Height": 0.1}}
+            return {"Blocks": [
+                {"BlockType": "LINE", "Id": "l", "Text": "Galway", "Confidence": 90, "Geometry": geometry,
+                 "Relationships": [{"Type": "CHILD", "Ids": ["w"]}]},
+                {"BlockType": "WORD", "Id": "w", "Text": "Galway", "Confidence": 90, "Geometry": geometry},
+            ]}
+
+    monkeypatch.setattr("boto3.client", lambda service, **kwargs: DummyTextractClient())
+
+    # The first image of letters can never be copied, copies run on the LibNas copy pool
+    copy_threads = set()
+    copy_image = LibNas.copy_image
+    def recording_copy_image(self, root, filename):
+        copy_threads.add(threading.current_thread().name.rsplit("_", 1)[0])
+        return copy_image(self, root, filename)
+    monkeypatch.setattr(LibNas, "copy_image", recording_copy_image)
+    copy_file_once = LibNas.copy_file_once
+    def failing_copy_file_once(self, src_file, dest_file):
+        if src_file.endswith("letters-000.png"):
+            raise OSError("LibNas went away")
+        return copy_file_once(self, src_file, dest_file)
+    monkeypatch.setattr(LibNas, "copy_file_once", failing_copy_file_once)
+
+    results = StreamingPipeline().run()
+
+    assert sorted((result["folder"], result["status"]) for result in results) == [("letters", "completed"), ("maps", "completed")]
+    assert copy_threads == {"stream-copy"}
+    with open(os.path.join(folders["libnas_output"], "letters", "letters.xml"), encoding="utf-8") as f:
+        assert re.findall(r'<Page [^>]*ID="([^"]+)"', f.read()) == ["letters-001", "letters-002"]
+    with open(os.path.join(folders["libnas_output"], "maps", "maps.xml"), encoding="utf-8") as f:
+        assert f.read().count("<Page ") == 3
+
+
+@pytest.mark.parametrize("mode", ["scan", "inotify"])
+def test_input_watcher_reports_settled_folders(tmp_path, mode):
+    watched = tmp_path / "libnas_input"
+    os.makedirs(watched / "old")
+    (watched / "old" / "old-000.png").write_bytes(b"old")
+
+    watcher = InputWatcher(str(watched), 0.2, 0.05, mode)
+    if mode == "inotify" and watcher.mode != "inotify":
+        pytest.skip("inotify is not available")
+    assert watcher.poll() == []
+    watcher.wait()
+    time.sleep(0.2)
+    assert watcher.poll() == ["old"]
+    watcher.mark_processed(["old"])
+
+    # A new folder is reported only once it stops changing, a processed folder only if it changes
+    os.makedirs(watched / "new")
+    (watched / "new" / "new-000.png").write_bytes(b"new")
+    assert watcher.poll() == []
+    time.sleep(0.25)
+    assert watcher.poll() == ["new"]
+    watcher.mark_processed(["new"])
+    assert watcher.poll() == []
+    (watched / "old" / "old-001.png").write_bytes(b"old")
+    time.sleep(0.25)
+    watcher.poll()
+    time.sleep(0.25)
+    assert watcher.poll() == ["old"]
+    watcher.close()
+
+
+def test_daemon_processes_new_folders(temp_config, monkeypatch):
+    folders, values = temp_config
+    batch = os.path.join(folders["libnas_input"], "letters")
+    os.makedirs(batch)
+    for index in range(2):
+        Image.new("RGB", (120, 90), color="white").save(os.path.join(batch, f"letters-00{index}.png"))
+
+    class DummyTextractClient:
+        def detect_document_text(self, Document):
+            geometry = {"BoundingBox": {"Left": 0.1, "Top": 0.2, "Width": 0.3, "Height": 0.1}}
+            return {"Blocks": [{"BlockType": "LINE", "Id": "l", "Text": "Galway", "Confidence": 90, "Geometry": geometry}]}
+
+    monkeypatch.setattr("boto3.client", lambda service, **kwargs: DummyTextractClient())
+    daemon = PipelineDaemon()
+    daemon.run(max_batches=1)
+
+    with open(os.path.join(folders["libnas_output"], "letters", "letters.xml"), encoding="utf-8") as f:
+        assert f.read().count("<Page ") == 2
+    assert daemon.watcher.poll() == []
+
+
+def test_daemon_survives_a_failed_batch_and_keeps_its_workers(temp_config, monkeypatch):
+    folders, values = temp_config
+    batch = os.path.join(folders["libnas_input"], "letters")
+    os.makedirs(batch)
+    for index in range(2):
+        Image.new("RGB", (120, 90), color="white").save(os.path.join(batch, f"letters-00{index}.png"))
+
+    class DummyTextractClient:
+        def detect_document_text(self, Document):
+            geometry = {"BoundingBox": {"Left": 0.1, "Top": 0.2, "Width": 0.3, "Height": 0.1}}
+            return {"Blocks": [{"BlockType": "LINE", "Id": "l", "Text": "Galway", "Confidence": 90, "Geometry": geometry}]}
+
+    monkeypatch.setattr("boto3.client", lambda service, **kwargs: DummyTextractClient())
+    daemon = PipelineDaemon()
+    copy_images = daemon.pipeline.copy_images
+    workers = []
+
+    def flaky_copy_images(folders):
+        workers.append(list(daemon.pipeline.workers))
+        if len(workers) == 1:
+            raise OSError("LibNas is not reachable")
+        copy_images(folders)
+
+    monkeypatch.setattr(daemon.pipeline, "copy_images", flaky_copy_images)
+    daemon.run(max_batches=2)
+
+    # The failed batch was not marked processed, so it was tried again with the same workers
+    assert daemon.failed_batches == 1
+    with open(os.path.join(folders["libnas_output"], "letters", "letters.xml"), encoding="utf-8") as f:
+        assert f.read().count("<Page ") == 2
+    assert workers[0] == workers[1] and workers[0]
+    assert not daemon.pipeline.workers
+
+
+def test_fused_alto_matches_json_path(temp_config, monkeypatch):
+    folders, values = temp_config
+
+    class DummyTextractClient:
+        def detect_document_text(self, Document):
+            geometry = {"BoundingBox": {"Left": 0.1, "Top": 0.2, "Width": 0.3, "Height": 0.1}}
+            return {"Blocks": [
+                {"BlockType": "LINE", "Id": "l", "Text": "Galway", "Confidence": 90, "Geometry": geometry,
+                 "Relationships": [{"Type": "CHILD", "Ids": ["w"]}]},
+                {"BlockType": "WORD", "Id": "w", "Text": "Galway", "Confidence": 90, "Geometry": geometry},
+            ]}
+
+    monkeypatch.setattr("boto3.client", lambda service, **kwargs: DummyTextractClient())
+
+    def run_pipeline(batch):
+        subfolder = os.path.join(folders["input_folder"], batch)
+        os.makedirs(subfolder, exist_ok=True)
+        for index in range(3):
+            Image.new("RGB", (120, 90 + index), color="white").save(os.path.join(subfolder, f"letter-00{index}.png"))
+        TextractOCR().select_image(folders["input_folder"])
+        SortOCR().start_sorting()
+
+    run_pipeline("a_json")
+    AltoGenerator()
+
+    values["fused_alto"] = True
+    run_pipeline("b_fused")
+    json_subfolder = os.path.join(folders["json_folder"], "b_fused", "letter")
+    assert sorted(os.listdir(json_subfolder)) == [f"letter-00{index}{extension}" for index in range(3) for extension in (".alto", ".json")]
+
+    # The fused pages are concatenated, the JSON archive is not read again
+    from utils import alto
+    monkeypatch.setattr(alto.json, "load", lambda f: pytest.fail("JSON parsed during ALTO assembly"))
+    AltoGenerator()
+
+    outputs = []
+    for batch in ("a_json", "b_fused"):
+        processed = os.path.join(folders["processed_folder"], batch, "letter")
+        with open(os.path.join(processed, "letter.xml"), encoding="utf-8") as f:
+            outputs.append(f.read())
+        assert sorted(os.listdir(os.path.join(processed, "json"))) == [f"letter-00{index}.json" for index in range(3)]
+    assert outputs[0] == outputs[1]
+    assert outputs[1].count("<Page ") == 3
+
+
+@pytest.mark.parametrize("pretty_json", [False, True])
+def test_save_ocr_output_single_pass(temp_config, pretty_json, monkeypatch):
+    folders, values = temp_config
+    values["pretty_json"] = pretty_json
+    geometry = {"BoundingBox": {"Left": 0.1, "Top": 0.1, "Width": 0.3, "Height": 0.1}}
+    response = {"Blocks": [
+        {"BlockType": "PAGE", "Id": "p", "Geometry": geometry},
+        {"BlockType": "LINE", "Id": "l1", "Text": " first line", "Confidence": 60, "Geometry": geometry},
+        {"BlockType": "WORD", "Id": "w1", "Text": "first", "Confidence": 60, "Geometry": geometry},
+        {"BlockType": "WORD", "Id": "w2", "Text": "line", "Confidence": 60, "Geometry": geometry},
+        {"BlockType": "LINE", "Id": "l2", "Text": "second", "Confidence": 90, "Geometry": geometry},
+        {"BlockType": "WORD", "Id": "w3", "Text": "second", "Confidence": 90, "Geometry": geometry},
+    ]}
+
+    summary = TextractOCR.summarise_response(response)
+    assert summary == {"lines": 2, "words": 3, "average_confidence": 75, "min_confidence": 60,
+                       "line_text": [" first line", "second"]}
+
+    monkeypatch.setattr("boto3.client", lambda service, **kwargs: object())
+    output_file_json = os.path.join(folders["json_sorter"], "page.json")
+    output_file_text = os.path.join(folders["text_sorter"], "page.txt")
+    assert TextractOCR().save_ocr_output("page.png", response, output_file_json, output_file_text)
+
+    with open(output_file_text, encoding="utf-8") as f:
+        assert f.read() == "first line\nsecond"
+    with open(output_file_json, encoding="utf-8") as f:
+        content = f.read()
+    assert json.loads(content) == response
+    assert ("\n" in content) == pretty_json
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_compact_page_round_trip_renders_same_alto(compress):
+    geometry = lambda left: {"BoundingBox": {"Left": left, "Top": 0.123456789, "Width": 0.1, "Height": 0.05},
+                             "Polygon": [{"X": left, "Y": 0.1}]}
+    response = {
+        "PipelineMetadata": {"OriginalWidth": 3001, "OriginalHeight": 4003, "ScaleFactor": 0.5},
+        "Blocks": [
+            {"BlockType": "PAGE", "Id": "p", "Geometry": geometry(0.0)},
+            {"BlockType": "LINE", "Id": "l1", "Text": "Gaillimh é", "Confidence": 97.345, "Geometry": geometry(0.1),
+             "Relationships": [{"Type": "CHILD", "Ids": ["w1", "missing", "w2", "w3"]}]},
+            {"BlockType": "LINE", "Id": "l2", "Text": "", "Confidence": 50.0, "Geometry": geometry(0.5)},
+            {"BlockType": "WORD", "Id": "w1", "Text": "Gaillimh", "Confidence": 99.995, "Geometry": geometry(0.1)},
+            {"BlockType": "WORD", "Id": "w2", "Text": "é", "Confidence": 12.5, "Geometry": geometry(0.25)},
+            {"BlockType": "WORD", "Id": "w3", "Text": "\"quoted\"", "Confidence": 80.0, "Geometry": geometry(0.37)},
+        ],
+    }
+
+    page = CompactPage.from_bytes(CompactPage.from_response(response).to_bytes(compress))
+    assert page.line_text == ["Gaillimh é", ""]
+    assert page.word_text == ["Gaillimh", "é", "\"quoted\""]
+    assert list(page.line_offsets) == [0, 3, 3]
+    assert list(page.word_spaced) == [0, 1, 0]
+    assert page.metadata["OriginalWidth"] == 3001
+
+    assert AltoGenerator.render_response(page, None, None, "page") == AltoGenerator.render_response(response, None, None, "page")
+    assert len(CompactPage.from_response(response).to_bytes(compress)) < len(json.dumps(response, indent=4))
+
+    with pytest.raises(ValueError):
+        CompactPage.from_bytes(b"{}")
+
+
+@pytest.mark.parametrize("raw_json_output", [True, False])
+def test_compact_output_is_not_delivered(temp_config, monkeypatch, raw_json_output):
+    folders, values = temp_config
+    values["compact_ocr_output"] = True
+    values["raw_json_output"] = raw_json_output
+    subfolder = os.path.join(folders["input_folder"], "batch")
+    os.makedirs(subfolder, exist_ok=True)
+    Image.new("RGB", (120, 90), color="white").save(os.path.join(subfolder, "letter-001.png"))
+
+    class DummyTextractClient:
+        def detect_document_text(self, Document):
+            geometry = {"BoundingBox": {"Left": 0.1, "Top": 0.2, "Width": 0.3, "Height": 0.1}}
+            return {"Blocks": [
+                {"BlockType": "LINE", "Id": "l", "Text": "Galway", "Confidence": 90, "Geometry": geometry,
+                 "Relationships": [{"Type": "CHILD", "Ids": ["w"]}]},
+                {"BlockType": "WORD", "Id": "w", "Text": "Galway", "Confidence": 90, "Geometry": geometry},
+            ]}
+
+    monkeypatch.setattr("boto3.client", lambda service, **kwargs: DummyTextractClient())
+    TextractOCR().select_image(folders["input_folder"])
+    assert sorted(os.listdir(os.path.join(folders["json_sorter"], "batch"))) == (["letter-001.json"] if raw_json_output else []) + ["letter-001.ocr"]
+
+    SortOCR().start_sorting()
+    AltoGenerator()
+
+    processed = os.path.join(folders["processed_folder"], "batch", "letter")
+    with open(os.path.join(processed, "letter.xml"), encoding="utf-8") as f:
+        content = f.read()
+    assert 'CONTENT="Galway"' in content and 'WIDTH="120"' in content
+    # The compact pages are only read to build the ALTO XML, the delivery has the raw JSON if it was kept
+    if raw_json_output:
+        assert os.listdir(os.path.join(processed, "json")) == ["letter-001.json"]
+    else:
+        assert sorted(os.listdir(processed)) == ["jpg", "letter.xml", "txt"]
+
+
+def test_image_size_probe_reads_headers(tmp_path, monkeypatch):
+    for extension, mode in ((".png", "RGB"), (".jpg", "L"), (".TIF", "1"), (".TIF", "RGB")):
+        path = str(tmp_path / f"image_{mode}{extension}")
+        Image.new(mode, (1234, 567)).save(path)
+        assert ImageSizeProbe.probe(path) == (1234, 567)
+
+    path = str(tmp_path / "multi.TIF")
+    frames = [Image.new("L", (100 + index, 50 + index)) for index in range(3)]
+    frames[0].save(path, save_all=True, append_images=frames[1:])
+    assert ImageSizeProbe.get_size(path, 2) == (102, 52)
+
+    # Cached results are returned without opening the file again
+    monkeypatch.setattr(ImageSizeProbe, "probe", classmethod(lambda cls, *args: pytest.fail("image read twice")))
+    assert ImageSizeProbe.get_size(path, 2) == (102, 52)
+
+
 def test_libnas_copy_and_send(temp_config):
     folders, _ = temp_config
     # Create a dummy file in the libnas_input folder.
@@ -197,6 +1276,384 @@ def test_libnas_copy_and_send(temp_config):
     expected_dir = os.path.join(libnas_output, "test_dir")
     assert os.path.exists(expected_dir)
 
+def test_libnas_copy_is_parallel_retried_and_verified(temp_config, monkeypatch):
+    folders, values = temp_config
+    values["manifest_enabled"] = True
+    batch = os.path.join(folders["libnas_input"], "batch")
+    os.makedirs(batch)
+    for index in range(6):
+        with open(os.path.join(batch, f"page-00{index}.jpg"), "wb") as f:
+            f.write(bytes(range(index, 250)))
+
+    # page-001 fails once and is retried, page-002 always fails and does not stop the others
+    attempts = {}
+    copy_file_once = LibNas.copy_file_once
+    def flaky_copy_file_once(self, src_file, dest_file):
+        name = os.path.basename(src_file)
+        attempts[name] = attempts.get(name, 0) + 1
+        if name == "page-002.jpg" or (name == "page-001.jpg" and attempts[name] == 1):
+            raise TimeoutError("LibNas timed out")
+        return copy_file_once(self, src_file, dest_file)
+    monkeypatch.setattr(LibNas, "copy_file_once", flaky_copy_file_once)
+
+    stats = LibNas().copy_from_libnas()
+
+    copied = sorted(os.listdir(os.path.join(folders["input_folder"], "batch")))
+    assert copied == ["page-000.jpg", "page-001.jpg", "page-003.jpg", "page-004.jpg", "page-005.jpg"]
+    assert attempts["page-001.jpg"] == 2 and attempts["page-002.jpg"] == values["copy_retries"]
+    assert stats["copied"] == 5 and stats["failed"] == 1
+    assert stats["bytes"] == sum(250 - index for index in (0, 1, 3, 4, 5))
+    assert "mb_per_second" in stats
+
+    # The checksum computed while copying is the one recorded in the manifest
+    manifest = ProcessingManifest(os.path.join(folders["logs_folder"], "manifest.sqlite3"))
+    record = manifest.lookup(os.path.join(batch, "page-004.jpg"))
+    assert record["sha256"] == ProcessingManifest.file_hash(os.path.join(folders["input_folder"], "batch", "page-004.jpg"))
+
+
+def test_libnas_copy_times_out_a_hung_read(temp_config, monkeypatch):
+    folders, values = temp_config
+    values["copy_timeout"] = 0.2
+    batch = os.path.join(folders["libnas_input"], "batch")
+    os.makedirs(batch)
+    with open(os.path.join(batch, "page-000.jpg"), "wb") as f:
+        f.write(bytes(range(250)))
+
+    # The first attempt hangs in its read until the test releases it, the retry goes through
+    release, finished = threading.Event(), threading.Event()
+    readinto = io.FileIO.readinto
+    hung = []
+    class HangingFileIO(io.FileIO):
+        def readinto(self, buffer):
+            if not hung:
+                hung.append(threading.current_thread())
+                release.wait()
+                result = readinto(self, buffer)
+                finished.set()
+                return result
+            return readinto(self, buffer)
+    monkeypatch.setattr("utils.libnas.open", lambda file, mode="r", *args, **kwargs:
+                        HangingFileIO(file, "rb") if mode == "rb" and kwargs.get("buffering") == 0 else io.open(file, mode, *args, **kwargs), raising=False)
+
+    # Without the timeout the copy would wait for the release
+    safety = threading.Timer(5, release.set)
+    safety.start()
+    start = time.monotonic()
+    stats = LibNas().copy_from_libnas()
+    assert time.monotonic() - start < 5
+    assert stats["copied"] == 1 and "failed" not in stats
+
+    # The abandoned attempt gives up once its read returns, it leaves the copy and no temporary file behind
+    release.set()
+    safety.cancel()
+    assert finished.wait(5)
+    hung[0].join(5)
+    copy_folder = os.path.join(folders["input_folder"], "batch")
+    assert os.listdir(copy_folder) == ["page-000.jpg"]
+    with open(os.path.join(copy_folder, "page-000.jpg"), "rb") as f:
+        assert f.read() == bytes(range(250))
+
+
+@pytest.mark.parametrize("manifest_enabled", [False, True])
+def test_libnas_delta_sync_copies_only_new_or_changed_images(temp_config, manifest_enabled, monkeypatch):
+    folders, values = temp_config
+    values["manifest_enabled"] = manifest_enabled
+    values["overwrite_files"] = False
+    batch = os.path.join(folders["libnas_input"], "batch")
+    os.makedirs(batch)
+    for index in range(3):
+        with open(os.path.join(batch, f"page-00{index}.jpg"), "wb") as f:
+            f.write(b"page %d" % index)
+    stats = LibNas().copy_from_libnas()
+    assert stats["copied"] == 3
+
+    # Unchanged pages are skipped without reading them
+    with monkeypatch.context() as patch:
+        patch.setattr(ProcessingManifest, "file_hash", classmethod(lambda cls, path: pytest.fail("unchanged page read")))
+        stats = LibNas().copy_from_libnas()
+    assert stats.get("copied", 0) == 0
+    assert stats["skipped"] == 3 and stats["skipped_bytes"] == 18
+
+    # A changed page is copied even with overwrite off, a touched but identical page is not
+    with open(os.path.join(batch, "page-001.jpg"), "wb") as f:
+        f.write(b"PAGE 1")
+    os.utime(os.path.join(batch, "page-002.jpg"), ns=(1, 1))
+    stats = LibNas().copy_from_libnas()
+    assert stats["copied"] == 1 and stats["skipped"] == 2
+    with open(os.path.join(folders["input_folder"], "batch", "page-001.jpg"), "rb") as f:
+        assert f.read() == b"PAGE 1"
+
+    # Without content hashes any change of modification time counts as a change
+    values["delta_sync_hash"] = False
+    os.utime(os.path.join(batch, "page-000.jpg"), ns=(2, 2))
+    stats = LibNas().copy_from_libnas()
+    assert stats["copied"] == 1 and stats["skipped"] == 2
+
+
+@pytest.mark.parametrize("copy_masters", [True, False])
+def test_direct_read_ocrs_from_libnas_and_copies_masters_once(temp_config, copy_masters, monkeypatch):
+    folders, values = temp_config
+    values["direct_read"] = True
+    values["direct_read_copy_masters"] = copy_masters
+    batch = os.path.join(folders["libnas_input"], "letters")
+    os.makedirs(batch)
+    for index in range(2):
+        Image.new("RGB", (640 + index, 480), color="white").save(os.path.join(batch, f"letters-00{index}.png"))
+
+    class DummyTextractClient:
+        def detect_document_text(self, Document):
+            assert isinstance(Document["Bytes"], bytes)
+            geometry = {"BoundingBox": {"Left": 0.1, "Top": 0.2, "Width": 0.3, "Height": 0.1}}
+            return {"Blocks": [{"BlockType": "LINE", "Id": "l", "Text": "Galway", "Confidence": 90, "Geometry": geometry}]}
+
+    monkeypatch.setattr("boto3.client", lambda service, **kwargs: DummyTextractClient())
+
+    # Only stubs are written to the input folder
+    LibNas().copy_from_libnas()
+    stub = os.path.join(folders["input_folder"], "letters", "letters-000.png")
+    assert ImageReference.resolve(stub) == os.path.abspath(os.path.join(batch, "letters-000.png"))
+
+    TextractOCR().select_image(folders["input_folder"])
+    SortOCR().start_sorting()
+    AltoGenerator()
+    LibNas().send_to_libnas()
+
+    delivered = os.path.join(folders["libnas_output"], "letters", "letters")
+    with open(os.path.join(delivered, "letters.xml"), encoding="utf-8") as f:
+        assert re.findall(r'<Page [^>]*WIDTH="(\d+)"', f.read()) == ["640", "641"]
+    if copy_masters:
+        for index in range(2):
+            with open(os.path.join(delivered, "jpg", f"letters-00{index}.png"), "rb") as f, open(os.path.join(batch, f"letters-00{index}.png"), "rb") as source:
+                assert f.read() == source.read()
+    else:
+        assert not os.path.exists(os.path.join(delivered, "jpg")) or not os.listdir(os.path.join(delivered, "jpg"))
+
+
+def test_libnas_delivery_is_staged_verified_and_retried(temp_config, monkeypatch):
+    folders, values = temp_config
+    output = folders["libnas_output"]
+    for name in ("letters", "maps", "deeds"):
+        os.makedirs(os.path.join(folders["processed_folder"], name, name))
+        with open(os.path.join(folders["processed_folder"], name, name, f"{name}.xml"), "w") as f:
+            f.write(f"<{name} v2/>")
+
+    # An earlier delivery of letters keeps its files that are not delivered again
+    os.makedirs(os.path.join(output, "letters", "letters", "jpg"))
+    with open(os.path.join(output, "letters", "letters", "letters.xml"), "w") as f:
+        f.write("<letters v1/>")
+    with open(os.path.join(output, "letters", "letters", "jpg", "letters-000.jpg"), "w") as f:
+        f.write("image")
+
+    # maps fails once and is retried, deeds always fails and is not delivered at all
+    attempts = {}
+    copy_file = LibNas.copy_file
+    def flaky_copy_file(self, src_file, dest_file):
+        name = os.path.basename(src_file).split(".")[0]
+        attempts[name] = attempts.get(name, 0) + 1
+        if name == "deeds" or (name == "maps" and attempts[name] == 1):
+            raise OSError("LibNas went away")
+        return copy_file(self, src_file, dest_file)
+    monkeypatch.setattr(LibNas, "copy_file", flaky_copy_file)
+
+    stats = LibNas().send_to_libnas()
+
+    assert stats["folders"] == 2 and stats["failed"] == 1
+    assert attempts["maps"] == 2 and attempts["deeds"] == values["delivery_retries"]
+    assert sorted(os.listdir(output)) == ["letters", "maps"]
+    with open(os.path.join(output, "letters", "letters", "letters.xml")) as f:
+        assert f.read() == "<letters v2/>"
+    assert os.listdir(os.path.join(output, "letters", "letters", "jpg")) == ["letters-000.jpg"]
+    assert os.listdir(folders["processed_folder"]) == ["deeds"]
+
+
+def test_resume_finishes_interrupted_delivery(temp_config):
+    folders, _ = temp_config
+    output = folders["libnas_output"]
+    # Stopped after the old folder was swapped out, and during another folder's copy
+    os.makedirs(os.path.join(output, ".letters.delivering", "letters"))
+    os.makedirs(os.path.join(output, ".letters.delivering.replaced", "letters"))
+    os.makedirs(os.path.join(output, ".maps.delivering", "maps"))
+
+    assert LibNas().recover_deliveries() == 2
+    assert os.listdir(output) == ["letters"]
+
+
+def test_manifest_reruns_only_touch_new_or_changed_pages(temp_config, monkeypatch):
+    folders, values = temp_config
+    values["manifest_enabled"] = True
+    batch = os.path.join(folders["libnas_input"], "batch")
+    os.makedirs(batch, exist_ok=True)
+    for index in range(2):
+        Image.new("RGB", (120, 90), color="white").save(os.path.join(batch, f"letter-00{index}.png"))
+
+    calls = []
+
+    class DummyTextractClient:
+        def detect_document_text(self, Document):
+            calls.append(Document)
+            geometry = {"BoundingBox": {"Left": 0.1, "Top": 0.2, "Width": 0.3, "Height": 0.1}}
+            return {"Blocks": [
+                {"BlockType": "LINE", "Id": "l", "Text": "Galway", "Confidence": 90, "Geometry": geometry,
+                 "Relationships": [{"Type": "CHILD", "Ids": ["w"]}]},
+                {"BlockType": "WORD", "Id": "w", "Text": "Galway", "Confidence": 90, "Geometry": geometry},
+            ]}
+
+    monkeypatch.setattr("boto3.client", lambda service, **kwargs: DummyTextractClient())
+
+    def run_pipeline():
+        LibNas().copy_from_libnas()
+        TextractOCR().select_image(folders["input_folder"])
+        SortOCR().start_sorting()
+        if os.listdir(folders["json_folder"]):
+            AltoGenerator()
+        LibNas().send_to_libnas()
+
+    run_pipeline()
+    manifest = ProcessingManifest(os.path.join(folders["logs_folder"], "manifest.sqlite3"))
+    assert manifest.stats() == {"delivered": 2}
+    assert len(calls) == 2
+
+    # Nothing changed on LibNas, nothing is copied or OCR'd again
+    run_pipeline()
+    assert len(calls) == 2
+    assert not any(files for _, _, files in os.walk(folders["input_folder"]))
+
+    # A touched but identical page is recognised by its hash, a changed page is processed again
+    os.utime(os.path.join(batch, "letter-000.png"), ns=(1, 1))
+    Image.new("RGB", (120, 90), color="black").save(os.path.join(batch, "letter-001.png"))
+    shutil.rmtree(os.path.join(folders["libnas_output"], "batch"))
+    run_pipeline()
+    assert len(calls) == 3
+    assert manifest.stats() == {"delivered": 2}
+    assert os.listdir(os.path.join(folders["libnas_output"], "batch", "letter", "jpg")) == ["letter-001.png"]
+
+
+def test_manifest_keeps_pages_with_the_same_name_in_different_folders_apart(temp_config, monkeypatch):
+    folders, values = temp_config
+    values["manifest_enabled"] = True
+    sources = {}
+    for folder, colour in (("ProjA-1", "black"), ("ProjB-1", "white")):
+        os.makedirs(os.path.join(folders["libnas_input"], folder), exist_ok=True)
+        sources[folder] = os.path.join(folders["libnas_input"], folder, "ProjX-0001.jpg")
+        Image.new("RGB", (120, 90), color=colour).save(sources[folder])
+    with open(sources["ProjA-1"], "rb") as f:
+        failing = [f.read()]
+
+    class DummyTextractClient:
+        def detect_document_text(self, Document):
+            if Document["Bytes"] in failing:
+                raise RuntimeError("Textract failed")
+            geometry = {"BoundingBox": {"Left": 0.1, "Top": 0.2, "Width": 0.3, "Height": 0.1}}
+            return {"Blocks": [
+                {"BlockType": "LINE", "Id": "l", "Text": "Galway", "Confidence": 90, "Geometry": geometry,
+                 "Relationships": [{"Type": "CHILD", "Ids": ["w"]}]},
+                {"BlockType": "WORD", "Id": "w", "Text": "Galway", "Confidence": 90, "Geometry": geometry},
+            ]}
+
+    monkeypatch.setattr("boto3.client", lambda service, **kwargs: DummyTextractClient())
+
+    def run_pipeline():
+        stats = LibNas().copy_from_libnas()
+        TextractOCR().select_image(folders["input_folder"])
+        SortOCR().start_sorting()
+        if os.listdir(folders["json_folder"]):
+            AltoGenerator()
+        LibNas().send_to_libnas()
+        return stats
+
+    # ProjA's OCR fails, delivering ProjB's page of the same name leaves it failed
+    run_pipeline()
+    manifest = ProcessingManifest(os.path.join(folders["logs_folder"], "manifest.sqlite3"))
+    assert manifest.lookup(sources["ProjA-1"])["stage"] == "failed"
+    assert manifest.lookup(sources["ProjB-1"])["stage"] == "delivered"
+
+    # So the next run copies the failed page again and only skips the delivered one
+    failing.clear()
+    stats = run_pipeline()
+    assert (stats.get("copied"), stats.get("skipped")) == (1, 1)
+    assert manifest.lookup(sources["ProjA-1"])["stage"] == "delivered"
+    assert manifest.lookup(sources["ProjB-1"])["stage"] == "delivered"
+
+
+def test_manifest_marks_packed_pages_delivered(temp_config, monkeypatch):
+    folders, values = temp_config
+    values.update({"manifest_enabled": True, "packed_output": True})
+    os.makedirs(os.path.join(folders["libnas_input"], "Letters-1"))
+    sources = [os.path.join(folders["libnas_input"], "Letters-1", f"Proj-000{index}.jpg") for index in range(3)]
+    for source in sources[:2]:
+        Image.new("RGB", (120, 90), color="white").save(source)
+
+    class DummyTextractClient:
+        def detect_document_text(self, Document):
+            geometry = {"BoundingBox": {"Left": 0.1, "Top": 0.2, "Width": 0.3, "Height": 0.1}}
+            return {"Blocks": [
+                {"BlockType": "LINE", "Id": "l", "Text": "Galway", "Confidence": 90, "Geometry": geometry,
+                 "Relationships": [{"Type": "CHILD", "Ids": ["w"]}]},
+                {"BlockType": "WORD", "Id": "w", "Text": "Galway", "Confidence": 90, "Geometry": geometry},
+            ]}
+
+    monkeypatch.setattr("boto3.client", lambda service, **kwargs: DummyTextractClient())
+
+    def run_pipeline():
+        stats = LibNas().copy_from_libnas()
+        TextractOCR().select_image(folders["input_folder"])
+        SortOCR().start_sorting()
+        if os.listdir(folders["json_folder"]):
+            AltoGenerator()
+        deliver_and_clean_up(folders)
+        return stats
+
+    # Pages are recorded where clean up leaves the archive, output/<subfolder>
+    run_pipeline()
+    delivered = os.path.join(folders["libnas_output"], "Proj")
+    manifest = ProcessingManifest(os.path.join(folders["logs_folder"], "manifest.sqlite3"))
+    for source in sources[:2]:
+        record = manifest.lookup(source)
+        assert record["stage"] == "delivered"
+        assert record["location"] == os.path.join(delivered, "jpg", os.path.basename(source))
+    assert manifest.stats() == {"delivered": 2}
+
+    # Delta sync skips packed pages like pages delivered as folders, a new page is added to the delivered archive
+    Image.new("RGB", (120, 90), color="white").save(sources[2])
+    stats = run_pipeline()
+    assert (stats.get("copied"), stats.get("skipped")) == (1, 2)
+    archive = PackedArchive(os.path.join(delivered, "Proj.tar"))
+    assert sorted(name for name in archive.names() if name.startswith("jpg/")) == [f"jpg/Proj-000{index}.jpg" for index in range(3)]
+    assert archive.read("Proj.xml").count(b"<Page ") == 3
+    assert manifest.stats() == {"delivered": 3}
+    assert manifest.lookup(sources[2])["location"] == os.path.join(delivered, "jpg", "Proj-0002.jpg")
+
+
+def test_resume_reconciles_interrupted_run(temp_config):
+    folders, values = temp_config
+    values["manifest_enabled"] = True
+
+    # The ALTO XML of "letters" was written but only its JSON folder was moved
+    make_alto_batch(folders, "batch", ["letters", "maps"], 2)
+    processed = os.path.join(folders["processed_folder"], "batch", "letters")
+    os.makedirs(processed)
+    with open(os.path.join(processed, "letters.xml"), "w") as f:
+        f.write("<alto />")
+    os.rename(os.path.join(folders["json_folder"], "batch", "letters"), os.path.join(processed, "json"))
+
+    # The run stopped while writing a JSON file, and before the OCR output of a page was sorted
+    os.remove(os.path.join(folders["json_folder"], "batch", "maps", "maps-001.json"))
+    os.makedirs(os.path.join(folders["json_sorter"], "batch"))
+    with open(os.path.join(folders["json_sorter"], "batch", "maps-001.json.tmp"), "w") as f:
+        f.write('{"Blo')
+
+    summary = PipelineRecovery().resume()
+    assert summary == {"temp_files_removed": 1, "moves_finished": 2, "deliveries_recovered": 0, "images_requeued": 1}
+    assert sorted(os.listdir(processed)) == ["jpg", "json", "letters.xml", "txt"]
+    assert os.listdir(os.path.join(folders["input_folder"], "batch")) == ["maps-001.jpg"]
+    assert not os.path.exists(os.path.join(folders["json_sorter"], "batch"))
+
+    # The rest of the batch goes through the pipeline as usual
+    AltoGenerator()
+    with open(os.path.join(folders["processed_folder"], "batch", "maps", "maps.xml"), encoding="utf-8") as f:
+        assert f.read().count("<Page ") == 1
+
+
 def test_alto_generator(temp_config):
     folders, _ = temp_config
     # Set up a dummy JSON folder structure that AltoGenerator expects.
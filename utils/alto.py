@@ -1,20 +1,162 @@
 import os
+import re
 import json
 import math
 import shutil
-from PIL import Image
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from utils.config import CoreConfig
 from utils.log import LogActivities
-from xml.dom.minidom import parseString
-from xml.etree.ElementTree import Element, SubElement, tostring
+from utils.json_logger import JsonLogger
+from utils.compact import CompactPage
+from utils.manifest import ProcessingManifest
+from utils.pages import split_page_stem
+from utils.imagesize import ImageSizeProbe
+from utils.preprocess import allow_pixels
+from utils.reference import ImageReference
+from utils.archive import PackedArchive
+from utils.check import CheckEmptyFolder
+from xml.etree.ElementTree import Element, SubElement, tostring, indent
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, the pure Python conversion gives the same values
+    np = None
+
+
+class AltoWriter:
+    """
+    Writes an ALTO XML file incrementally: the header and Description first, then each Page as soon
+    as it is rendered, then the closing tags. The file is written under a temporary name and only
+    renamed into place once it is complete.
+    """
+
+    # Page elements of a file written by AltoWriter, used to add pages to an existing file
+    PAGE_PATTERN = re.compile(r"<Page\b[^>]*?(?:/>|>.*?</Page>)", re.DOTALL)
+    PAGE_ID_PATTERN = re.compile(r'\bID="([^"]*)"')
+
+    def __init__(self, output_file, pretty_print=True):
+        """
+        Initialises the writer.
+
+        Args:
+            output_file (str): Path to the ALTO XML file.
+            pretty_print (bool): Indent the XML with tabs, False writes it without whitespace.
+        """
+        self.output_file = output_file
+        self.pretty_print = pretty_print
+        self.temp_file = f"{output_file}.tmp"
+        self.file = None
+
+    def header(self):
+        """Returns the XML declaration, the alto root element, the Description and the opening Layout tag."""
+        root = Element("alto", attrib={
+            'xmlns': "http://www.loc.gov/standards/alto/ns-v3#",
+            'xmlns:xlink': "http://www.w3.org/1999/xlink",
+            'xmlns:xsi': "http://www.w3.org/2001/XMLSchema-instance",
+            'xsi:schemaLocation': "http://www.loc.gov/standards/alto/ns-v3# http://www.loc.gov/alto/v3/alto-3-0.xsd"
+        })
+
+        # Create the description section of the ALTO XML 
+        description = SubElement(root, "Description")
+        measurement_unit = SubElement(description, "MeasurementUnit")
+        measurement_unit.text = "pixel" # Measurement unit in pixel 
+        SubElement(description, "sourceImageInformation")
+        ocr_processing = SubElement(description, "OCRProcessing", attrib={'ID': "OCR_0"})
+        ocr_processing_step = SubElement(ocr_processing, "ocrProcessingStep")
+        processing_software = SubElement(ocr_processing_step, "processingSoftware")
+        software_name = SubElement(processing_software, "softwareName")
+        software_name.text = "Textract"
+
+        SubElement(root, "Layout")
+        if self.pretty_print:
+            indent(root, space="\t")
+
+        # Cut the serialised document at the empty Layout, pages are streamed in between
+        head = tostring(root, encoding="unicode").rsplit("<Layout />", 1)[0]
+        return '<?xml version="1.0" encoding="utf-8"?>\n' + head + "<Layout>"
+
+    def footer(self):
+        """Returns the closing Layout and alto tags."""
+        if self.pretty_print:
+            return "\n\t</Layout>\n</alto>\n"
+        return "</Layout></alto>"
+
+    @staticmethod
+    def render_page(page, pretty_print=True):
+        """
+        Serialises a Page element into the fragment written between the Layout tags.
+
+        Args:
+            page (Element): The Page element.
+            pretty_print (bool): Indent the fragment to its depth in the document.
+        Returns:
+            str: The serialised Page.
+        """
+        if pretty_print:
+            indent(page, space="\t", level=2)
+            return "\n\t\t" + tostring(page, encoding="unicode")
+        return tostring(page, encoding="unicode")
+
+    @classmethod
+    def read_pages(cls, alto_file):
+        """
+        Reads the Page elements of an ALTO XML file written by AltoWriter.
+
+        Args:
+            alto_file (str): Path to the ALTO XML file.
+        Returns:
+            dict: The serialised Page elements, without indentation, by Page ID.
+        """
+        with open(alto_file, 'r', encoding='utf-8') as f:
+            return cls.parse_pages(f.read())
+
+    @classmethod
+    def parse_pages(cls, content):
+        """Returns the serialised Page elements of ALTO XML content by Page ID."""
+        pages = {}
+        for match in cls.PAGE_PATTERN.finditer(content):
+            page = match.group(0)
+            page_id = cls.PAGE_ID_PATTERN.search(page, 0, page.index(">"))
+            if page_id:
+                pages[page_id.group(1)] = page
+        return pages
+
+    def write_page(self, page):
+        """Serialises a Page element and writes it to the file."""
+        self.write_fragment(self.render_page(page, self.pretty_print))
+
+    def write_fragment(self, fragment):
+        """Writes an already serialised Page to the file."""
+        self.file.write(fragment)
+
+    def __enter__(self):
+        self.file = open(self.temp_file, 'w', encoding='utf-8')
+        self.file.write(self.header())
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.file.close()
+            os.remove(self.temp_file)
+            return False
+        self.file.write(self.footer())
+        self.file.close()
+        os.replace(self.temp_file, self.output_file)
+        return False
 
 
 class AltoGenerator():
 
-    def __init__(self):
+    def __init__(self, run=True):
 
         """
         Initialise the AltoGenerator class with required folder paths and parameters from the config file.
+
+        Args:
+            run (bool): Generate the ALTO XML of the top folder in the json folder straight away. False leaves
+                it to the caller, see generate_folder.
         """
 
         # Initialisation of required folders and parameters
@@ -29,22 +171,49 @@ class AltoGenerator():
         self.failed_folder = self.folders["failed_folder"]
         self.images_folder = self.folders["images_folder"]
         self.processed_folder = self.folders["processed_folder"]
+        self.libnas_output = self.folders["libnas_output"]
         
         # Parameters from config.py 
         self.overwrite_files = self.parameters["overwrite_files"]
         self.image_extensions = self.parameters["image_extensions"]
         self.output_extension_json = self.parameters["output_extension_json"]
         self.output_extension_text = self.parameters["output_extension_text"]
+        self.output_extension_alto = self.parameters["output_extension_alto"]
+        self.output_extension_compact = self.parameters["output_extension_compact"]
         self.rename_failed_json = self.parameters["rename_failed_json"]
         self.rename_failed_image = self.parameters["rename_failed_image"]
         self.rename_failed_text = self.parameters["rename_failed_text"]
         self.low_confidence_threshold = self.parameters["low_confidence_threshold"]
+        self.alto_page_error_message = self.parameters["alto_page_error_message"]
+        self.alto_pretty_print = self.parameters["alto_pretty_print"]
+        self.alto_max_workers = self.parameters["alto_max_workers"] or os.cpu_count()
+        self.packed_output = self.parameters["packed_output"]
+        self.packed_output_compression = self.parameters["packed_output_compression"]
+        self.packed_output_zstd_level = self.parameters["packed_output_zstd_level"]
+        self.direct_read_copy_masters = self.parameters["direct_read_copy_masters"]
+
+        # Image sizes Pillow has to read (formats the header probe does not know) may be archival masters
+        allow_pixels(self.parameters["source_max_pixels"])
 
         # Logging initailisation has to come after logs folder name
         self.log_activity = LogActivities(self.logs_folder)
+        self.json_logging = JsonLogger()
+
+        if self.packed_output and not PackedArchive.available(self.packed_output_compression):
+            print(f"{self.packed_output_compression} is not available, output archives are written uncompressed")
+            self.log_activity.error(f"{self.packed_output_compression} is not available, output archives are written uncompressed")
+            self.packed_output_compression = "none"
+
+        self.manifest = None
+        if self.parameters["manifest_enabled"]:
+            self.manifest = ProcessingManifest(os.path.join(self.logs_folder, self.parameters["manifest_file_name"]))
 
+        # Pages quarantined and subfolders that failed while processing the current folder
+        self.quarantined_pages = []
+        self.failed_subfolders = []
 
-        self.process_files(self.json_folder, self.failed_folder, self.images_folder, self.text_folder, self.image_extensions, self.processed_folder)
+        if run:
+            self.process_files(self.json_folder, self.failed_folder, self.images_folder, self.text_folder, self.image_extensions, self.processed_folder)
 
     def process_files(self, json_folder, failed_folder, images_folder, text_folder, image_extensions, processed_folder):
    
@@ -57,7 +226,39 @@ class AltoGenerator():
                 # return
             
             # Get the top folder from the sorted json folder
-            top_json_folder = json_folders[0]
+            self.process_folder(json_folders[0], json_folder, failed_folder, images_folder, text_folder, image_extensions, processed_folder)
+
+    def generate_folder(self, top_json_folder):
+        """
+        Generates the ALTO XML of every subfolder of a top folder in the json folder. Errors are
+        returned as the folder's result instead of being raised, so the other folders still run. A
+        subfolder that fails is moved to the failed folder and the other subfolders carry on.
+
+        Args:
+            top_json_folder (str): The top folder name.
+        Returns:
+            dict: The folder, its status ("completed", or "failed" if any subfolder failed), the error
+                message if it failed, the subfolders that failed with their errors and the pages that
+                were quarantined.
+        """
+        self.quarantined_pages = []
+        self.failed_subfolders = []
+        try:
+            self.process_folder(top_json_folder, self.json_folder, self.failed_folder, self.images_folder,
+                                self.text_folder, self.image_extensions, self.processed_folder)
+        except Exception as e:
+            # An unreadable top folder fails this folder only
+            self.log_activity.error(f"ALTO generation failed for {top_json_folder}: {e}\n{traceback.format_exc()}")
+            return {"folder": top_json_folder, "status": "failed", "error": str(e),
+                    "failed_subfolders": self.failed_subfolders, "quarantined": self.quarantined_pages}
+        if self.failed_subfolders:
+            error = "; ".join(f"{failed['subfolder']}: {failed['error']}" for failed in self.failed_subfolders)
+            return {"folder": top_json_folder, "status": "failed", "error": error,
+                    "failed_subfolders": self.failed_subfolders, "quarantined": self.quarantined_pages}
+        return {"folder": top_json_folder, "status": "completed", "error": None, "failed_subfolders": [], "quarantined": self.quarantined_pages}
+
+    def process_folder(self, top_json_folder, json_folder, failed_folder, images_folder, text_folder, image_extensions, processed_folder):
+
             top_json_folder_path = os.path.join(json_folder, top_json_folder) 
             top_images_folder_path = os.path.join(images_folder, top_json_folder) 
             top_text_folder_path = os.path.join(text_folder, top_json_folder) 
@@ -65,143 +266,17 @@ class AltoGenerator():
             
             subfolder_top_json_folder =  sorted([subfolders for subfolders in os.listdir(top_json_folder_path) if os.path.isdir(os.path.join(top_json_folder_path, subfolders))], reverse=True)
         
+            # Subfolders that passed the checks and wait for their ALTO XML
+            pending = []
+
             for subfolder in subfolder_top_json_folder:
-                text_subfolder_path = os.path.join(top_text_folder_path, subfolder)
-                json_subfolder_path = os.path.join(top_json_folder_path, subfolder)
-                image_subfolder_path = os.path.join(top_images_folder_path, subfolder)
+                try:
+                    self.check_subfolder(top_json_folder, subfolder, pending, json_folder, failed_folder, images_folder, text_folder, image_extensions, processed_folder)
+                except Exception as e:
+                    # Only this subfolder fails, the other subfolders of the folder carry on
+                    self.fail_subfolder(top_json_folder, subfolder, e)
 
-                # Path to the new failed folder based on the subdirectory
-                new_failed_folder = os.path.join(failed_folder, top_json_folder)
-            
-                # Check if the sub directories directory match
-                image_subdirs = os.listdir(top_images_folder_path)
-                json_subdirs =os.listdir(top_json_folder_path)
-                # text_subdirs =os.listdir(top_text_folder_path)
-                missing_dir = set(image_subdirs) ^ set(json_subdirs)
-
-                # Move missing subfolder to failed folder
-                if missing_dir:
-                    for folder in missing_dir:
-                        os.makedirs(new_failed_folder, exist_ok=True)
-                        if os.path.exists(os.path.join(top_images_folder_path, folder)):              
-                            old_path = os.path.join(top_images_folder_path,folder)
-                            new_path = old_path + '_image'
-                            os.rename(old_path, new_path)
-                            shutil.move(new_path, new_failed_folder)
-
-                        if os.path.exists(os.path.join(top_text_folder_path, folder)):
-                            shutil.move(os.path.join(top_text_folder_path,folder), new_failed_folder)
-
-                        if os.path.exists(os.path.join(top_json_folder_path, folder)):
-                            shutil.move(os.path.join(top_json_folder_path,folder), new_failed_folder)
-
-                # Extract all JSON file names (without extension) from the current subfolder
-                json_files = [os.path.splitext(f)[0] for f in os.listdir(json_subfolder_path) if f.endswith(self.output_extension_json)]
-
-                # Code to move JSON and images to failed folder if either fails
-                if not json_files:
-
-                    # create a parent folder in the failed folder if it does not exist
-                    os.makedirs(new_failed_folder, exist_ok=True)
-                    shutil.move(os.path.join(json_folder, top_json_folder), new_failed_folder)
-
-                    # check the images folders if the same folder exist and move its
-                    if os.path.exists(image_subfolder_path):
-                        new_image_folder_name = os.path.join(image_subfolder_path + '_image')
-                        shutil.move(new_image_folder_name, new_failed_folder)
-
-                    # check the text folders if the same folder exist and move its
-                    if os.path.exists(text_subfolder_path):
-                        new_text_folder_name = os.path.join(text_subfolder_path + '_text')
-                        shutil.move(new_text_folder_name, new_failed_folder)
-
-
-                    raise FileNotFoundError("No JSON files found in the sub folder.")
-                else:
-                    # If no equivalent image file is found, move the exisiting json and text folder to failed folder
-                    if not os.path.exists(image_subfolder_path):
-                        # create a parent folder in the failed folder if it does not exist
-                        os.makedirs(new_failed_folder, exist_ok=True)
-
-                        shutil.move(os.path.join(image_subfolder_path, '_images'), new_failed_folder)
-                        shutil.move(os.path.join(text_subfolder_path, '_text'), new_failed_folder)
-                        shutil.move(os.path.join(json_folder, top_json_folder), new_failed_folder) # Move the JSON folder
-
-                        raise FileNotFoundError("No corresponding folder found in the images directory.") 
-                    else:
-                        # Creates a list of images from the images folders for further extraction
-                        image_files = [os.path.splitext(f)[0] for f in os.listdir(image_subfolder_path) if f.endswith(image_extensions)]
-                        text_files = [os.path.splitext(f)[0] for f in os.listdir(text_subfolder_path) if f.endswith(self.output_extension_text)]
-        
-                        
-                        # Splits the files/images name from the extension for comparison
-                        json_file_names = {os.path.splitext(f)[0] for f in json_files}
-                        image_file_names = {os.path.splitext(f)[0] for f in image_files}
-                        text_file_names = {os.path.splitext(f)[0] for f in text_files}
-                    
-                                
-                        # Stops the script and move the json/image/text folder to the failed folder
-                        if len(json_files) != len(image_files) or json_file_names != image_file_names:
-                            # Create parant folder in sub directory
-                            os.makedirs(new_failed_folder, exist_ok=True)
-                            old_path = os.path.join(top_json_folder_path, subfolder)
-                            # Move content for subdirectory to failed folder
-                            shutil.move(old_path, new_failed_folder)
-
-                            # os.rename(os.path.join(new_failed_folder, top_json_folder_path), new_path)
-                            old_path = os.path.join(top_images_folder_path, subfolder)
-                            new_path = old_path +  '_image'
-                            os.rename(old_path, new_path)  
-                            shutil.move(new_path, new_failed_folder)
-
-                            old_path = os.path.join(top_text_folder_path, subfolder)
-                            new_path = old_path +  '_text'
-                            os.rename(old_path, new_path)  
-                            shutil.move(new_path, new_failed_folder)
-                            
-
-                            raise ValueError("Mismatch in number of files or names between JSON and images folder.")
-            
-                        # Generate the ALTO XML file
-                        stripped_subfolder_name = subfolder.replace("(", "").replace(")", "")
-                        
-                        # Create the output directory if it doesn't exist
-                        output_dir = os.path.join(processed_folder, top_json_folder, subfolder)
-                        if not os.path.exists(output_dir):
-                            os.makedirs(output_dir)
-                    
-                        output_file = os.path.join(processed_folder, top_json_folder,subfolder,f"{stripped_subfolder_name.split('-')[0].replace(' ','')}.xml")
-                        
-                        
-                        # Begin generating the ALTO XML file
-                        self.generate_alto_xml(json_files, output_file, top_json_folder, subfolder)
-                        # return 
-                    
-                        # Create a new folder in the success directory with the original JSON folder name
-                        processed_json_folder = os.path.join(processed_folder, top_json_folder, subfolder)
-                        os.makedirs(processed_json_folder, exist_ok=True)
-
-                        # Rename and move the JSON, Text and image folders
-                        json_renamed_folder = os.path.join(processed_json_folder, self.rename_failed_json)
-                        image_renamed_folder = os.path.join(processed_json_folder, self.rename_failed_image)
-                        text_renamed_folder = os.path.join(processed_json_folder, self.rename_failed_text)
-
-                        # try:
-                        os.rename(json_subfolder_path, json_renamed_folder)
-                        os.rename(image_subfolder_path, image_renamed_folder)
-                        os.rename(text_subfolder_path, text_renamed_folder) 
-                        # except FileExistsError:
-                        #     if self.overwrite_files:
-                        #         os.remove(os.join(output_directory, filename))
-                        #         self.log_activity.overwrite(f"File {filename} was overwritten input folder: {output_directory}")
-                        #     else:
-                        #         self.log_activity.overwrite(f"File {filename} already exist in pipeline input folder, (overwrite turned off): {output_directory}")  
-                        # except Exception as e:
-                        #     self.log_activity.error(f"An error occurred while moving {filename} : {str(e)}")
-
-                        print(f"Processing completed successfully for {top_json_folder}")
-                        self.log_activity.processing(f"Processing completed successfully for {top_json_folder}")
-                        
+            self.finish_subfolders(pending)
 
             # Check if the folder exists and is empty
             if os.path.exists(top_json_folder_path) and len(os.listdir(top_json_folder_path)) == 0:
@@ -214,133 +289,616 @@ class AltoGenerator():
                 os.rmdir(top_text_folder_path)
 
 
+    def check_subfolder(self, top_json_folder, subfolder, pending, json_folder, failed_folder, images_folder, text_folder, image_extensions, processed_folder):
+        """
+        Checks that the JSON, image and text folders of a subfolder match, quarantines its incomplete
+        pages and queues it for its ALTO XML.
+
+        Raises:
+            FileNotFoundError: If the subfolder has no OCR output or no images folder.
+            ValueError: If no page of the subfolder has both its image and its OCR output.
+        """
+        top_json_folder_path = os.path.join(json_folder, top_json_folder)
+        top_images_folder_path = os.path.join(images_folder, top_json_folder)
+        top_text_folder_path = os.path.join(text_folder, top_json_folder)
+
+        text_subfolder_path = os.path.join(top_text_folder_path, subfolder)
+        json_subfolder_path = os.path.join(top_json_folder_path, subfolder)
+        image_subfolder_path = os.path.join(top_images_folder_path, subfolder)
+
+        # Path to the new failed folder based on the subdirectory
+        new_failed_folder = os.path.join(failed_folder, top_json_folder)
+
+        # Check if the sub directories directory match
+        image_subdirs = os.listdir(top_images_folder_path)
+        json_subdirs = os.listdir(top_json_folder_path)
+        missing_dir = set(image_subdirs) ^ set(json_subdirs)
+
+        # Move missing subfolder to failed folder
+        if missing_dir:
+            for folder in missing_dir:
+                os.makedirs(new_failed_folder, exist_ok=True)
+                self.mark_pages(os.path.join(top_images_folder_path, folder), "failed")
+                if os.path.exists(os.path.join(top_images_folder_path, folder)):
+                    old_path = os.path.join(top_images_folder_path, folder)
+                    new_path = old_path + '_image'
+                    os.rename(old_path, new_path)
+                    shutil.move(new_path, new_failed_folder)
+
+                if os.path.exists(os.path.join(top_text_folder_path, folder)):
+                    shutil.move(os.path.join(top_text_folder_path, folder), new_failed_folder)
+
+                if os.path.exists(os.path.join(top_json_folder_path, folder)):
+                    shutil.move(os.path.join(top_json_folder_path, folder), new_failed_folder)
+
+        if not os.path.isdir(json_subfolder_path) or not os.path.exists(image_subfolder_path):
+            raise FileNotFoundError("No corresponding folder found in the images directory.")
+
+        # Extract all page names (without extension) from the current subfolder, in page order. A page
+        # has a JSON file, a compact OCR file or both
+        json_files = sorted({os.path.splitext(f)[0] for f in os.listdir(json_subfolder_path)
+                             if f.endswith((self.output_extension_json, self.output_extension_compact))})
+        if not json_files:
+            raise FileNotFoundError("No JSON files found in the sub folder.")
+
+        # Creates a list of images from the images folders for further extraction
+        image_files = [os.path.splitext(f)[0] for f in os.listdir(image_subfolder_path) if f.endswith(image_extensions)]
+
+        # Splits the files/images name from the extension for comparison
+        image_file_names = {os.path.splitext(f)[0] for f in image_files}
+        json_file_names = {self.page_image_name(os.path.splitext(f)[0], image_file_names) for f in json_files}
+
+        # Pages missing their image or their OCR output are quarantined, the complete pages still get their ALTO XML
+        complete_json_files = [f for f in json_files if self.page_image_name(f, image_file_names) in image_file_names]
+        if len(json_file_names) != len(image_files) or json_file_names != image_file_names:
+            if not complete_json_files:
+                raise ValueError("Mismatch in number of files or names between JSON and images folder.")
+            self.quarantine_pages(top_json_folder, subfolder, new_failed_folder, complete_json_files,
+                                  json_subfolder_path, image_subfolder_path, text_subfolder_path)
+            json_files = complete_json_files
+
+        # Generate the ALTO XML file
+        stripped_subfolder_name = subfolder.replace("(", "").replace(")", "")
+
+        # Create the output directory if it doesn't exist
+        output_dir = os.path.join(processed_folder, top_json_folder, subfolder)
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+        output_file = os.path.join(processed_folder, top_json_folder, subfolder, f"{stripped_subfolder_name.split('-')[0].replace(' ','')}.xml")
+
+        # Generate the ALTO XML file now, or together with the other subfolders in parallel mode
+        pending.append((json_files, output_file, top_json_folder, subfolder, json_subfolder_path, image_subfolder_path, text_subfolder_path))
+        if self.alto_max_workers == 1:
+            self.finish_subfolders(pending)
+
+    def fail_subfolder(self, top_json_folder, subfolder, error):
+        """
+        Moves what is left of a subfolder that failed to the failed folder, as <subfolder>,
+        <subfolder>_image and <subfolder>_text, marks its pages failed and records the error in the
+        folder's result. Called while the error is handled, so its traceback is logged.
+        """
+        print(f"ALTO generation failed for {top_json_folder}/{subfolder}: {error}")
+        self.log_activity.error(f"ALTO generation failed for {top_json_folder}/{subfolder}: {error}\n{traceback.format_exc()}")
+
+        new_failed_folder = os.path.join(self.failed_folder, top_json_folder)
+        for root, suffix in ((self.json_folder, ''), (self.images_folder, '_image'), (self.text_folder, '_text')):
+            folder_path = os.path.join(root, top_json_folder, subfolder)
+            if not os.path.isdir(folder_path):
+                continue
+            os.makedirs(new_failed_folder, exist_ok=True)
+            failed_subfolder = os.path.join(new_failed_folder, subfolder + suffix)
+            if suffix == '_image':
+                self.mark_pages(folder_path, "failed", failed_subfolder)
+            self.merge_folder(folder_path, failed_subfolder)
+
+        self.failed_subfolders.append({"subfolder": subfolder, "error": str(error)})
+
+    def quarantine_pages(self, top_json_folder, subfolder, new_failed_folder, complete_json_files,
+                         json_subfolder_path, image_subfolder_path, text_subfolder_path):
+        """
+        Moves the pages of a subfolder that have OCR output but no image, or an image but no OCR output,
+        to the failed folder and lists them in the failure log. The folders mirror the ones used when a
+        whole subfolder fails: <subfolder>, <subfolder>_image and <subfolder>_text.
+
+        Args:
+            top_json_folder (str): The top level folder name.
+            subfolder (str): The subfolder name.
+            new_failed_folder (str): The failed folder of the top level folder.
+            complete_json_files (list): The page names that have both an image and OCR output.
+            json_subfolder_path (str): The JSON folder of the subfolder.
+            image_subfolder_path (str): The images folder of the subfolder.
+            text_subfolder_path (str): The text folder of the subfolder.
+        """
+        complete_pages = set(complete_json_files)
+        complete_images = {split_page_stem(page)[0] for page in complete_pages} | complete_pages
+
+        quarantined = set()
+        for folder_path, suffix in ((json_subfolder_path, ''), (image_subfolder_path, '_image'), (text_subfolder_path, '_text')):
+            if not os.path.isdir(folder_path):
+                continue
+            for file_name in sorted(os.listdir(folder_path)):
+                stem = os.path.splitext(file_name)[0]
+                is_image = file_name.endswith(self.image_extensions)
+                if stem in (complete_images if is_image else complete_pages):
+                    continue
+
+                failed_subfolder = os.path.join(new_failed_folder, subfolder + suffix)
+                os.makedirs(failed_subfolder, exist_ok=True)
+                os.replace(os.path.join(folder_path, file_name), os.path.join(failed_subfolder, file_name))
+                if is_image and self.manifest is not None:
+                    self.manifest.advance([os.path.join(folder_path, file_name)], "failed", failed_subfolder)
+                if suffix != '_text':
+                    quarantined.add(stem)
+
+        self.quarantined_pages.extend(os.path.join(subfolder, page) for page in sorted(quarantined))
+        for page in sorted(quarantined):
+            self.json_logging.log_error_as_json(self.alto_page_error_message, os.path.join(top_json_folder, subfolder, page))
+        print(f"Quarantined {len(quarantined)} incomplete pages of {top_json_folder}/{subfolder}")
+        self.log_activity.error(f"Quarantined incomplete pages of {top_json_folder}/{subfolder}, ALTO generated for the other {len(complete_pages)} pages: {sorted(quarantined)}")
+
+    def finish_subfolders(self, pending):
+        """
+        Generates the ALTO XML of the subfolders that passed the consistency checks and moves them to
+        the processed folder. With more than one ALTO worker the pages of all the subfolders are
+        rendered together in a process pool and assembled in page order.
+
+        Args:
+            pending (list): Subfolders waiting for their ALTO XML, emptied once they are finished.
+        """
+        if not pending:
+            return
+
+        if self.alto_max_workers > 1:
+            try:
+                self.finish_in_parallel(pending)
+            except Exception as e:
+                # The subfolders left are finished one by one, so only the one at fault fails
+                self.log_activity.error(f"Generating ALTO XML in parallel failed, finishing {len(pending)} subfolders one by one: {e}")
+
+        while pending:
+            json_files, output_file, top_json_folder, subfolder, *subfolder_paths = pending.pop(0)
+            try:
+                # Begin generating the ALTO XML file
+                self.generate_alto_xml(json_files, output_file, top_json_folder, subfolder)
+                self.remove_fragments(subfolder_paths[0])
+                self.move_to_processed(top_json_folder, subfolder, *subfolder_paths)
+            except Exception as e:
+                self.fail_subfolder(top_json_folder, subfolder, e)
+
+    def finish_in_parallel(self, pending):
+        """
+        Renders the pages of all the pending subfolders together in a process pool and assembles them
+        in page order, removing each subfolder from pending once it is in the processed folder.
+        """
+        # Resolve every page up front, a missing image fails before any work is sent to the pool
+        page_jobs = [[self.resolve_page(json_file, top_json_folder, subfolder) + (self.alto_pretty_print,) + self.page_sources(json_file, top_json_folder, subfolder)
+                      for json_file in json_files]
+                     for json_files, _, top_json_folder, subfolder, *_ in pending]
+
+        with ProcessPoolExecutor(max_workers=self.alto_max_workers) as executor:
+            fragments = self.ordered_map(executor, self.render_page, [job for jobs in page_jobs for job in jobs], self.alto_max_workers * 4)
+
+            while pending:
+                json_files, output_file, top_json_folder, subfolder, *subfolder_paths = pending[0]
+                existing_pages = self.existing_pages(output_file, top_json_folder, subfolder)
+                with AltoWriter(output_file, self.alto_pretty_print) as writer:
+                    for fragment in self.merge_pages(json_files, existing_pages, fragments):
+                        writer.write_fragment(fragment)
+                self.remove_fragments(subfolder_paths[0])
+                self.move_to_processed(top_json_folder, subfolder, *subfolder_paths)
+                pending.pop(0)
+
+    @staticmethod
+    def ordered_map(executor, function, jobs, window):
+        """
+        Yields the results of function(*job) for each job in order, with at most window jobs submitted
+        ahead of the result being read so the rendered pages never pile up in memory.
+        """
+        submitted = deque()
+        for job in jobs:
+            submitted.append(executor.submit(function, *job))
+            if len(submitted) >= window:
+                yield submitted.popleft().result()
+        while submitted:
+            yield submitted.popleft().result()
+
+    def move_to_processed(self, top_json_folder, subfolder, json_subfolder_path, image_subfolder_path, text_subfolder_path):
+        """
+        Moves the JSON, image and text folders of a subfolder next to its ALTO XML in the processed folder.
+        """
+        # Create a new folder in the success directory with the original JSON folder name
+        processed_json_folder = os.path.join(self.processed_folder, top_json_folder, subfolder)
+        os.makedirs(processed_json_folder, exist_ok=True)
+
+        # Packed images keep the location they would have had in the folder, inside the archive
+        self.mark_pages(image_subfolder_path, "alto", os.path.join(processed_json_folder, self.rename_failed_image))
+
+        if self.packed_output:
+            self.pack_subfolder(top_json_folder, subfolder, processed_json_folder, json_subfolder_path, image_subfolder_path, text_subfolder_path)
+            print(f"Processing completed successfully for {top_json_folder}")
+            self.log_activity.processing(f"Processing completed successfully for {top_json_folder}")
+            return
+
+        # Rename and move the JSON, Text and image folders
+        json_renamed_folder = os.path.join(processed_json_folder, self.rename_failed_json)
+        image_renamed_folder = os.path.join(processed_json_folder, self.rename_failed_image)
+        text_renamed_folder = os.path.join(processed_json_folder, self.rename_failed_text)
+
+        # Without the raw JSON there is no json folder to deliver
+        if os.path.isdir(json_subfolder_path):
+            self.merge_folder(json_subfolder_path, json_renamed_folder)
+        self.merge_folder(image_subfolder_path, image_renamed_folder)
+        self.merge_folder(text_subfolder_path, text_renamed_folder)
+
+        print(f"Processing completed successfully for {top_json_folder}")
+        self.log_activity.processing(f"Processing completed successfully for {top_json_folder}")
+
+    def pack_subfolder(self, top_json_folder, subfolder, processed_json_folder, json_subfolder_path, image_subfolder_path, text_subfolder_path):
+        """
+        Streams the ALTO XML and the JSON, image and text files of a subfolder into one archive in
+        its processed folder, instead of moving thousands of files there, then removes them. The
+        pages of an earlier archive of the subfolder, in the processed folder or already delivered,
+        that were not processed again are kept.
+        """
+        archive_names = {subfolder + extension + suffix for extension in PackedArchive.EXTENSIONS.values() for suffix in ("", PackedArchive.INDEX_SUFFIX)}
+        files = {}
+        # The ALTO XML, and files an earlier run left unpacked in the processed folder, this run's files replace them
+        for root, _, file_names in os.walk(processed_json_folder):
+            for file_name in file_names:
+                if root == processed_json_folder and file_name in archive_names:
+                    continue
+                path = os.path.join(root, file_name)
+                files[os.path.relpath(path, processed_json_folder).replace(os.sep, "/")] = path
+
+        for folder_path, folder_name in ((json_subfolder_path, self.rename_failed_json), (image_subfolder_path, self.rename_failed_image),
+                                         (text_subfolder_path, self.rename_failed_text)):
+            if not os.path.isdir(folder_path):
+                continue
+            for file_name in os.listdir(folder_path):
+                path = os.path.join(folder_path, file_name)
+                # In direct-read mode the image is packed from LibNas input, or left out
+                reference = ImageReference.read(path)
+                if reference is not None:
+                    if not self.direct_read_copy_masters:
+                        continue
+                    path = reference["source"]
+                files[f"{folder_name}/{file_name}"] = path
+
+        previous = None
+        for folder in [processed_json_folder] + CheckEmptyFolder.delivered_folders(self.libnas_output, top_json_folder, subfolder):
+            previous_path = PackedArchive.find(folder, subfolder)
+            if previous_path is not None:
+                previous = PackedArchive(previous_path)
+                break
+
+        archive_path = os.path.join(processed_json_folder, subfolder + PackedArchive.EXTENSIONS[self.packed_output_compression])
+        index = PackedArchive.write(archive_path, files.items(), self.packed_output_compression, self.packed_output_zstd_level, previous)
+        if previous is not None and os.path.dirname(previous.path) == processed_json_folder and previous.path != archive_path:
+            os.remove(previous.path)
+            os.remove(previous.path + PackedArchive.INDEX_SUFFIX)
+
+        for path in set(files.values()):
+            if path.startswith(processed_json_folder + os.sep):
+                os.remove(path)
+        for folder_path in (json_subfolder_path, image_subfolder_path, text_subfolder_path) + tuple(
+                os.path.join(processed_json_folder, name) for name in (self.rename_failed_json, self.rename_failed_image, self.rename_failed_text)):
+            if os.path.isdir(folder_path):
+                shutil.rmtree(folder_path)
+
+        print(f"Packed {len(index['members'])} files of {top_json_folder}/{subfolder} into {archive_path}")
+        self.log_activity.processing(f"Packed {len(index['members'])} files of {top_json_folder}/{subfolder} into {archive_path}")
+
+    @staticmethod
+    def merge_folder(source, destination):
+        """
+        Renames a folder, or moves its files into the destination if an earlier run already put pages there.
+        """
+        if not os.path.exists(destination):
+            os.rename(source, destination)
+            return
+        for file_name in os.listdir(source):
+            os.replace(os.path.join(source, file_name), os.path.join(destination, file_name))
+        os.rmdir(source)
+
+    def mark_pages(self, image_folder_path, stage, destination=None):
+        """Advances the images of a folder to a stage in the manifest, destination is the folder they are moved to."""
+        if self.manifest is not None and os.path.isdir(image_folder_path):
+            self.manifest.advance([os.path.join(image_folder_path, f) for f in os.listdir(image_folder_path) if f.endswith(self.image_extensions)],
+                                  stage, destination)
+
     def generate_alto_xml(self, json_files, output_file, top_json_folder, subfolder):
 
-        root = Element("alto", attrib={
-            'xmlns': "http://www.loc.gov/standards/alto/ns-v3#",
-            'xmlns:xlink': "http://www.w3.org/1999/xlink",
-            'xmlns:xsi': "http://www.w3.org/2001/XMLSchema-instance",
-            'xsi:schemaLocation': "http://www.loc.gov/standards/alto/ns-v3# http://www.loc.gov/alto/v3/alto-3-0.xsd"
-        })
+        # Pages added by a later run are merged with the pages of the existing ALTO XML
+        existing_pages = self.existing_pages(output_file, top_json_folder, subfolder)
 
-    # Create the description section of the ALTO XML 
-        description = SubElement(root, "Description")
-        measurement_unit = SubElement(description, "MeasurementUnit")
-        measurement_unit.text = "pixel" # Measurement unit in pixel 
-        SubElement(description, "sourceImageInformation")
-        ocr_processing = SubElement(description, "OCRProcessing", attrib={'ID': "OCR_0"})
-        ocr_processing_step = SubElement(ocr_processing, "ocrProcessingStep")
-        processing_software = SubElement(ocr_processing_step, "processingSoftware")
-        software_name = SubElement(processing_software, "softwareName")
-        software_name.text = "Textract"
+        # Pages are written to the file as soon as they are rendered, so memory use is bounded by one page
+        with AltoWriter(output_file, self.alto_pretty_print) as writer:
+            self.process_json_files(json_files, top_json_folder, writer, subfolder, existing_pages)
+
+    def existing_pages(self, output_file, top_json_folder, subfolder):
+        """
+        Reads the pages of the ALTO XML an earlier run wrote for a subfolder, from the processed folder
+        or, once delivered, from the LibNas output folder. The ALTO XML may be packed in the subfolder's archive.
+
+        Returns:
+            dict: The serialised Page elements by Page ID, empty if there is no earlier ALTO XML.
+        """
+        alto_name = os.path.basename(output_file)
+        for folder in [os.path.dirname(output_file)] + CheckEmptyFolder.delivered_folders(self.libnas_output, top_json_folder, subfolder):
+            alto_file = os.path.join(folder, alto_name)
+            archive_file = PackedArchive.find(folder, subfolder)
+            if os.path.exists(alto_file):
+                pages = AltoWriter.read_pages(alto_file)
+            elif archive_file is not None and alto_name in PackedArchive(archive_file).members:
+                alto_file = archive_file
+                pages = AltoWriter.parse_pages(PackedArchive(archive_file).read(alto_name).decode("utf-8"))
+            else:
+                continue
+            print(f"Adding pages to the {len(pages)} pages of {alto_file}")
+            self.log_activity.processing(f"Adding pages to the {len(pages)} pages of {alto_file}")
+            return pages
+        return {}
+
+    def merge_pages(self, json_files, existing_pages, fragments):
+        """
+        Yields the pages of a subfolder in page order. New pages replace existing pages with the same ID.
+
+        Args:
+            json_files (list): The page names rendered now, in page order.
+            existing_pages (dict): The serialised pages of the earlier ALTO XML by Page ID.
+            fragments (iterator): The rendered new pages, in the order of json_files.
+        """
+        new_pages = set(json_files)
+        for page_id in sorted(new_pages | set(existing_pages)):
+            if page_id in new_pages:
+                yield next(fragments)
+            else:
+                yield ("\n\t\t" if self.alto_pretty_print else "") + existing_pages[page_id]
+
+    @staticmethod
+    def page_image_name(json_file_name, image_file_names):
+        """
+        Returns the name of the image a JSON file belongs to. The pages of a multi-page TIFF
+        (name_p0001, name_p0002, ...) all belong to the TIFF they came from.
+        """
+        if json_file_name in image_file_names:
+            return json_file_name
+        base, frame_index = split_page_stem(json_file_name)
+        if frame_index is not None and base in image_file_names:
+            return base
+        return json_file_name
 
-        layout = SubElement(root, "Layout")
+    @staticmethod
+    def get_image_size(image_path, frame_index=None):
+        # Reads only the image header, and each image only once per process
+        return ImageSizeProbe.get_size(ImageReference.resolve(image_path), frame_index)
 
-        self.process_json_files(json_files, top_json_folder, layout, subfolder)
+    def resolve_page(self, json_file, top_json_folder, subfolder):
+        """
+        Finds the JSON file and the image of a page.
+
+        Args:
+            json_file (str): The JSON file name without extension.
+            top_json_folder (str): The top level folder name.
+            subfolder (str): The subfolder name.
+        Returns:
+            tuple: (json file path, image file path, frame index or None, page ID)
+        """
+        json_file_path = os.path.join(self.json_folder, top_json_folder,subfolder,json_file + self.output_extension_json)
+        json_file_name = os.path.splitext(json_file)[0]
+
+        image_files = []
+        for ext in self.image_extensions:
+            full_path = os.path.join(self.images_folder,top_json_folder,subfolder, json_file_name + ext)
+            if os.path.exists(full_path):
+                image_files.append(full_path)
+
+        # Pages of a multi-page TIFF share the TIFF image
+        frame_index = None
+        if not image_files:
+            image_name, frame_index = split_page_stem(json_file_name)
+            if frame_index is not None:
+                for ext in self.image_extensions:
+                    full_path = os.path.join(self.images_folder,top_json_folder,subfolder, image_name + ext)
+                    if os.path.exists(full_path):
+                        image_files.append(full_path)
+    
+        # image_path_extension = image_file
+        image_file_path = image_files[0] if image_files else None
+    
+        if image_file_path is None or not os.path.exists(image_file_path):
+            raise FileNotFoundError(f"Image file corresponding to {json_file} not found.")
+        return json_file_path, image_file_path, frame_index, json_file_name
+
+    def page_sources(self, json_file, top_json_folder, subfolder):
+        """Returns the paths of the page fragment rendered at OCR time and of the compact OCR file of a page."""
+        page_path = os.path.join(self.json_folder, top_json_folder, subfolder, json_file)
+        return page_path + self.output_extension_alto, page_path + self.output_extension_compact
+
+    def remove_fragments(self, json_subfolder_path):
+        """
+        Deletes the page fragments and compact OCR pages of a subfolder once its ALTO XML is written,
+        only the raw JSON is delivered. The folder is removed if nothing is left in it.
+        """
+        for file_name in os.listdir(json_subfolder_path):
+            if file_name.endswith((self.output_extension_alto, self.output_extension_compact)):
+                os.remove(os.path.join(json_subfolder_path, file_name))
+        if not os.listdir(json_subfolder_path):
+            os.rmdir(json_subfolder_path)
 
-        xml_string = tostring(root, encoding='utf-8')
-        parsed_xml = parseString(xml_string)
-        xml_string_pretty = parsed_xml.toprettyxml()
+    def process_json_files(self, json_files, top_json_folder, writer, subfolder, existing_pages=None):
 
-        with open(output_file, 'w',encoding='utf-8') as f:
-            f.write(xml_string_pretty)   
+        fragments = (self.render_page(*self.resolve_page(json_file, top_json_folder, subfolder), self.alto_pretty_print,
+                                      *self.page_sources(json_file, top_json_folder, subfolder))
+                     for json_file in json_files)
+        for fragment in self.merge_pages(json_files, existing_pages or {}, fragments):
+            writer.write_fragment(fragment)
 
     @staticmethod
-    def get_image_size(image_path):
-        with Image.open(image_path) as img:
-            return img.size
+    def render_page(json_file_path, image_file_path, frame_index, page_id, pretty_print=True, fragment_file_path=None, compact_file_path=None):
+        """
+        Renders the ALTO Page of one page. This is a static method so it can run in a worker process.
+
+        Args:
+            json_file_path (str): Path to the Textract JSON file.
+            image_file_path (str): Path to the page image.
+            frame_index (int): Frame of a multi-page TIFF, None for single page images.
+            page_id (str): The Page ID, the JSON file name without extension.
+            pretty_print (bool): Indent the fragment.
+            fragment_file_path (str): Path to the fragment rendered at OCR time, used instead of the JSON if it exists.
+            compact_file_path (str): Path to the compact OCR file, read instead of the JSON if it exists.
+        Returns:
+            str: The serialised Page element.
+        """
+        # Pages rendered by the fused OCR path only need to be concatenated
+        if fragment_file_path and os.path.exists(fragment_file_path):
+            with open(fragment_file_path, 'r', encoding='utf-8') as f:
+                return f.read()
 
-    def process_json_files(self, json_files, top_json_folder, layout, subfolder):
+        # The compact OCR file holds only what ALTO needs and is much cheaper to parse
+        if compact_file_path and os.path.exists(compact_file_path):
+            data = CompactPage.load(compact_file_path)
+        else:
+            # Load JSON data
+            with open(json_file_path, 'r',encoding='utf-8') as f:
+                data = json.load(f)
 
-        for json_file in json_files:
-            json_file_path = os.path.join(self.json_folder, top_json_folder,subfolder,json_file + self.output_extension_json)
-            json_file_name = os.path.splitext(json_file)[0]
+        return AltoGenerator.render_response(data, image_file_path, frame_index, page_id, pretty_print)
 
-            image_files = []
-            for ext in self.image_extensions:
-                full_path = os.path.join(self.images_folder,top_json_folder,subfolder, json_file_name + ext)
-                if os.path.exists(full_path):
-                    image_files.append(full_path)
-        
-            # image_path_extension = image_file
-            image_file_path = image_files[0] if image_files else None
-        
-            if image_file_path is None or not os.path.exists(image_file_path):
-                raise FileNotFoundError(f"Image file corresponding to {json_file} not found.")
-            else:
-                image_width, image_height = self.get_image_size(image_file_path)
+    @staticmethod
+    def render_response(data, image_file_path, frame_index, page_id, pretty_print=True):
+        """
+        Renders the ALTO Page of a parsed Textract response or compact page.
+
+        Args:
+            data (dict | CompactPage): The Textract response or compact page.
+            image_file_path (str): Path to the page image, only read if the response has no recorded size.
+            frame_index (int): Frame of a multi-page TIFF, None for single page images.
+            page_id (str): The Page ID, the JSON file name without extension.
+            pretty_print (bool): Indent the fragment.
+        Returns:
+            str: The serialised Page element.
+        """
+        # Use the original image size recorded at OCR time, the image may have been downscaled for Textract
+        metadata = data.metadata if isinstance(data, CompactPage) else data.get("PipelineMetadata", {})
+        if "OriginalWidth" in metadata:
+            image_width, image_height = metadata["OriginalWidth"], metadata["OriginalHeight"]
+        else:
+            image_width, image_height = AltoGenerator.get_image_size(image_file_path, frame_index)
+
+        page = Element("Page", attrib={
+            'WIDTH': str(image_width), 'HEIGHT': str(image_height),
+            'PHYSICAL_IMG_NR': str(frame_index + 1) if frame_index is not None else "0", 'ID': page_id
+        })
+        print_space = SubElement(page, "PrintSpace", attrib={
+            'HPOS': "0", 'VPOS': "0",
+            'WIDTH': str(image_width), 'HEIGHT': str(image_height)
+        })
 
-                # Load JSON data
-                with open(json_file_path, 'r',encoding='utf-8') as f:
-                    data = json.load(f)
+        line_count = 0
+        string_count = -1
+        cblock_count = 0
 
-                page = SubElement(layout, "Page", attrib={
-                    'WIDTH': str(image_width), 'HEIGHT': str(image_height),
-                    'PHYSICAL_IMG_NR': "0", 'ID': json_file_name
-                })
-                print_space = SubElement(page, "PrintSpace", attrib={
-                    'HPOS': "0", 'VPOS': "0",
-                    'WIDTH': str(image_width), 'HEIGHT': str(image_height)
-                })
+        # Calculate the VPOS, HPOS, Width and Height 
+        AltoGenerator.calculate_positions(data, image_width, image_height, print_space, line_count, string_count, cblock_count)   
 
-                line_count = 0
-                string_count = -1
-                cblock_count = 0
-
-                # Calculate the VPOS, HPOS, Width and Height 
-                self.calculate_positions(data, image_width, image_height, print_space, line_count, string_count, cblock_count)   
-
-    def calculate_positions(self, data, image_width, image_height, print_space, line_count, string_count, cblock_count):
-        for block in data['Blocks']:
-                if block['BlockType'] == 'LINE':
-                    composed_block = SubElement(print_space, "ComposedBlock", attrib={
-                        'ID': f"cblock_{cblock_count}",
-                        'HPOS': str(math.ceil(block['Geometry']['BoundingBox']['Left'] * image_width) ),
-                        'VPOS': str(math.ceil(block['Geometry']['BoundingBox']['Top'] * image_height) ),
-                        'WIDTH': str(math.ceil(block['Geometry']['BoundingBox']['Width'] * image_width) ),
-                        'HEIGHT': str(math.ceil(block['Geometry']['BoundingBox']['Height'] * image_height) )
-                    })
-                    cblock_count += 1
-
-                    text_block = SubElement(composed_block, "TextBlock", attrib={
-                        'ID': f"block_{line_count}",
-                        'HPOS': str(math.ceil(block['Geometry']['BoundingBox']['Left'] * image_width) ),
-                        'VPOS': str(math.ceil(block['Geometry']['BoundingBox']['Top'] * image_height) ),
-                        'WIDTH': str(math.ceil(block['Geometry']['BoundingBox']['Width'] * image_width) ),
-                        'HEIGHT': str(math.ceil(block['Geometry']['BoundingBox']['Height'] * image_height) )
-                    })
+        return AltoWriter.render_page(page, pretty_print)
+
+    @staticmethod
+    def pixel_boxes(boxes, image_width, image_height):
+        """
+        Converts normalised bounding boxes to ALTO pixel values in bulk.
+
+        Args:
+            boxes (array): Flat Left, Top, Width, Height values, four per box.
+            image_width (int): Page width in pixels.
+            image_height (int): Page height in pixels.
+        Returns:
+            list: (HPOS, VPOS, WIDTH, HEIGHT) string tuples.
+        """
+        if np is not None and len(boxes):
+            pixels = np.ceil(np.asarray(boxes, dtype=np.float64).reshape(-1, 4) * np.array([image_width, image_height, image_width, image_height], dtype=np.float64))
+            return [tuple(map(str, row)) for row in pixels.astype(np.int64).tolist()]
+        return [(str(math.ceil(left * image_width)), str(math.ceil(top * image_height)),
+                 str(math.ceil(width * image_width)), str(math.ceil(height * image_height)))
+                for left, top, width, height in zip(*[iter(boxes)] * 4)]
+
+    @staticmethod
+    def space_boxes(word_boxes, word_spaced, image_width, image_height):
+        """
+        Converts the gaps between consecutive words to SP pixel values in bulk.
+
+        Args:
+            word_boxes (array): Flat Left, Top, Width, Height values of the words, four per word.
+            word_spaced (array): 1 for each word followed by an SP, the next word is the one after it.
+            image_width (int): Page width in pixels.
+            image_height (int): Page height in pixels.
+        Returns:
+            list: (WIDTH, VPOS, HPOS) string tuples, one per spaced word.
+        """
+        if np is not None and len(word_spaced):
+            boxes = np.asarray(word_boxes, dtype=np.float64).reshape(-1, 4)
+            spaced = np.flatnonzero(np.asarray(word_spaced, dtype=np.uint8))
+            if not len(spaced):
+                return []
+            left, top, width = boxes[spaced, 0], boxes[spaced, 1], boxes[spaced, 2]
+            next_left = boxes[spaced + 1, 0]
+            pixels = np.ceil(np.stack([(next_left - (left + width)) * image_width, top * image_height, left + width * image_width], axis=1))
+            return [tuple(map(str, row)) for row in pixels.astype(np.int64).tolist()]
+        spaces = []
+        for index, spaced in enumerate(word_spaced):
+            if spaced:
+                left, top, width = word_boxes[index * 4], word_boxes[index * 4 + 1], word_boxes[index * 4 + 2]
+                next_left = word_boxes[index * 4 + 4]
+                spaces.append((str(math.ceil((next_left - (left + width)) * image_width)), str(math.ceil(top * image_height)),
+                               str(math.ceil(left + width * image_width))))
+        return spaces
+
+    @staticmethod
+    def calculate_positions(data, image_width, image_height, print_space, line_count, string_count, cblock_count):
+        # Textract responses are reduced to the columns ALTO needs, compact pages already are
+        page = data if isinstance(data, CompactPage) else CompactPage.from_response(data)
+
+        # The geometry of the whole page is converted to pixels in bulk
+        line_pixels = AltoGenerator.pixel_boxes(page.line_boxes, image_width, image_height)
+        word_pixels = AltoGenerator.pixel_boxes(page.word_boxes, image_width, image_height)
+        space_pixels = iter(AltoGenerator.space_boxes(page.word_boxes, page.word_spaced, image_width, image_height))
+        word_text, word_confidence, word_spaced, line_offsets = page.word_text, page.word_confidence, page.word_spaced, page.line_offsets
+
+        for line_index, (hpos, vpos, width, height) in enumerate(line_pixels):
+            composed_block = SubElement(print_space, "ComposedBlock", attrib={
+                'ID': f"cblock_{cblock_count}",
+                'HPOS': hpos, 'VPOS': vpos, 'WIDTH': width, 'HEIGHT': height
+            })
+            cblock_count += 1
+
+            text_block = SubElement(composed_block, "TextBlock", attrib={
+                'ID': f"block_{line_count}",
+                'HPOS': hpos, 'VPOS': vpos, 'WIDTH': width, 'HEIGHT': height
+            })
+
+            text_line = SubElement(text_block, "TextLine", attrib={
+                'ID': f"line_{line_count}",
+                'HPOS': hpos, 'VPOS': vpos, 'WIDTH': width, 'HEIGHT': height
+            })
+            line_count += 1
+
+            for word_index in range(line_offsets[line_index], line_offsets[line_index + 1]):
+                string_count += 1
+                hpos, vpos, width, height = word_pixels[word_index]
+
+                SubElement(text_line, "String", attrib={
+                    'ID': f"string_{string_count}",
+                    'HPOS': hpos, 'VPOS': vpos, 'WIDTH': width, 'HEIGHT': height,
+                    'CONTENT': word_text[word_index],
+                    'WC': str(round(word_confidence[word_index] / 100, 2))
+                })
 
-                    text_line = SubElement(text_block, "TextLine", attrib={
-                        'ID': f"line_{line_count}",
-                        'HPOS': str(math.ceil(block['Geometry']['BoundingBox']['Left'] * image_width) ),
-                        'VPOS': str(math.ceil(block['Geometry']['BoundingBox']['Top'] * image_height) ),
-                        'WIDTH': str(math.ceil(block['Geometry']['BoundingBox']['Width'] * image_width) ),
-                        'HEIGHT': str(math.ceil(block['Geometry']['BoundingBox']['Height'] * image_height) )
+                if word_spaced[word_index]:
+                    sp_width, sp_vpos, sp_hpos = next(space_pixels)
+                    SubElement(text_line, "SP", attrib={
+                        'WIDTH': sp_width,
+                        'VPOS': sp_vpos,
+                        'HPOS': sp_hpos
                     })
-                    line_count += 1
-
-                    for index, word_id in enumerate(block['Relationships'][0]['Ids']):
-                        word = next((word for word in data['Blocks'] if word['Id'] == word_id), None)
-                        if word:
-                            string_count += 1
-
-                            string = SubElement(text_line, "String", attrib={
-                                'ID': f"string_{string_count}",
-                                'HPOS': str(math.ceil(word['Geometry']['BoundingBox']['Left'] * image_width)),
-                                'VPOS': str(math.ceil(word['Geometry']['BoundingBox']['Top'] * image_height)),
-                                'WIDTH': str(math.ceil(word['Geometry']['BoundingBox']['Width'] * image_width)),
-                                'HEIGHT': str(math.ceil(word['Geometry']['BoundingBox']['Height'] * image_height)),
-                                'CONTENT': word['Text'],
-                                'WC': str(round(word['Confidence'] / 100, 2))
-                            })
-
-                            if index < len(block['Relationships'][0]['Ids']) - 1:
-                                next_word = next((word for word in data['Blocks'] if word['Id'] == block['Relationships'][0]['Ids'][index + 1]), None)
-                                if next_word:
-                                    sp_width = next_word['Geometry']['BoundingBox']['Left'] - (
-                                            word['Geometry']['BoundingBox']['Left'] + word['Geometry']['BoundingBox']['Width'])
-                                    sp = SubElement(text_line, "SP", attrib={
-                                        'WIDTH': str(math.ceil(sp_width * image_width)),
-                                        'VPOS': str(math.ceil(word['Geometry']['BoundingBox']['Top'] * image_height)),
-                                        'HPOS': str(math.ceil(word['Geometry']['BoundingBox']['Left'] + word['Geometry']['BoundingBox']['Width'] * image_width))
-                                    })
\ No newline at end of file
@@ -0,0 +1,238 @@
+import os
+import sys
+import json
+import tarfile
+import hashlib
+import argparse
+from utils.atomic import atomic_write
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, archives are written uncompressed without it
+    zstandard = None
+
+
+class PackedArchive:
+    """
+    A processed subfolder packed into one tar file, so delivering it to LibNas is one file instead
+    of thousands of small ones.
+
+    The archive is a plain tar (".tar") or a tar compressed with zstd (".tar.zst"). A compressed
+    archive is written as one zstd frame per member, which standard tools still read as a single
+    stream (zstd -dc archive.tar.zst | tar x), while each member can be decompressed on its own.
+
+    Next to the archive an index (archive + ".index.json") lists every member with its offset and
+    length in the archive, the offset of its data in the (decompressed) frame, its size and its
+    SHA-256, so a single member is read with one seek without unpacking the archive.
+
+    Command line, to look into an archive on LibNas:
+        python -m utils.archive list <archive>
+        python -m utils.archive extract <archive> [member ...] [-o folder]
+    """
+
+    INDEX_SUFFIX = ".index.json"
+    EXTENSIONS = {"none": ".tar", "zstd": ".tar.zst"}
+    CHUNK_SIZE = 1024 ** 2
+
+    def __init__(self, path: str):
+        """
+        Opens an archive for reading.
+
+        Args:
+            path (str): The archive, its index must be next to it.
+        Raises:
+            ValueError: If the index does not belong to the archive.
+        """
+        self.path = path
+        with open(path + self.INDEX_SUFFIX, "r", encoding="utf-8") as f:
+            self.index = json.load(f)
+        if self.index["archive_size"] != os.path.getsize(path):
+            raise ValueError(f"The index of {path} does not match the archive")
+        self.compression = self.index["compression"]
+        self.members = {member["name"]: member for member in self.index["members"]}
+
+    @classmethod
+    def available(cls, compression: str) -> bool:
+        """Checks that archives can be written with a compression, zstd needs the zstandard package."""
+        return compression == "none" or (compression == "zstd" and zstandard is not None)
+
+    @classmethod
+    def find(cls, folder: str, name: str):
+        """
+        Returns the path of the archive called name in a folder, with any compression, None if there is none.
+        """
+        for extension in cls.EXTENSIONS.values():
+            path = os.path.join(folder, name + extension)
+            if os.path.exists(path) and os.path.exists(path + cls.INDEX_SUFFIX):
+                return path
+        return None
+
+    @classmethod
+    def write(cls, path: str, files, compression: str = "none", level: int = 3, previous=None) -> dict:
+        """
+        Streams files into an archive one member at a time, then writes its index. Both are written
+        under a temporary name and renamed into place.
+
+        Args:
+            path (str): The archive.
+            files (iterable): (member name, file path) pairs, a name given twice keeps the last file.
+            compression (str): "none" or "zstd".
+            level (int): The zstd compression level.
+            previous (PackedArchive): An earlier archive of the same folder, its members that are
+                not in files are copied over, which may be the archive at path itself.
+        Returns:
+            dict: The index.
+        """
+        files = dict(files)
+        members = []
+        compressor = zstandard.ZstdCompressor(level=level) if compression == "zstd" else None
+
+        with atomic_write(path, "wb") as f:
+            for name in sorted(files):
+                source = files[name]
+                stat = os.stat(source)
+                header = cls.member_header(name, stat.st_size, stat.st_mtime)
+                sha256 = hashlib.sha256()
+                offset = f.tell()
+
+                with open(source, "rb") as src:
+                    if compressor is None:
+                        f.write(header)
+                        for chunk in iter(lambda: src.read(cls.CHUNK_SIZE), b""):
+                            sha256.update(chunk)
+                            f.write(chunk)
+                        f.write(cls.padding(stat.st_size))
+                    else:
+                        frame = compressor.compressobj()
+                        f.write(frame.compress(header))
+                        for chunk in iter(lambda: src.read(cls.CHUNK_SIZE), b""):
+                            sha256.update(chunk)
+                            f.write(frame.compress(chunk))
+                        f.write(frame.compress(cls.padding(stat.st_size)))
+                        f.write(frame.flush())
+
+                members.append({"name": name, "offset": offset, "length": f.tell() - offset, "data_offset": len(header),
+                                "size": stat.st_size, "sha256": sha256.hexdigest()})
+
+            if previous is not None:
+                for name in sorted(set(previous.members) - set(files)):
+                    member = dict(previous.members[name])
+                    offset = f.tell()
+                    if previous.compression == compression:
+                        # Same format, the member's frame is copied as it is
+                        f.write(previous.read_frame(member))
+                    else:
+                        data = previous.read(name)
+                        header = cls.member_header(name, len(data), 0)
+                        frame = header + data + cls.padding(len(data))
+                        f.write(compressor.compress(frame) if compressor is not None else frame)
+                        member["data_offset"] = len(header)
+                    member["offset"] = offset
+                    member["length"] = f.tell() - offset
+                    members.append(member)
+
+            # The end of archive marker, two empty blocks
+            end = b"\0" * (2 * tarfile.BLOCKSIZE)
+            f.write(compressor.compress(end) if compressor is not None else end)
+            archive_size = f.tell()
+
+        index = {"version": 1, "compression": compression, "archive_size": archive_size, "members": members}
+        with atomic_write(path + cls.INDEX_SUFFIX, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        return index
+
+    @staticmethod
+    def member_header(name: str, size: int, mtime: float) -> bytes:
+        """Returns the tar header of a member, with a PAX header first for long or non-ASCII names."""
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(mtime)
+        info.mode = 0o644
+        return info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+
+    @staticmethod
+    def padding(size: int) -> bytes:
+        """Returns the zero bytes that fill a member's data up to a whole tar block."""
+        return b"\0" * (-size % tarfile.BLOCKSIZE)
+
+    def names(self) -> list:
+        """Returns the member names in archive order."""
+        return [member["name"] for member in self.index["members"]]
+
+    def read_frame(self, member: dict) -> bytes:
+        """Reads the bytes a member takes up in the archive, compressed if the archive is."""
+        with open(self.path, "rb") as f:
+            f.seek(member["offset"])
+            return f.read(member["length"])
+
+    def read(self, name: str) -> bytes:
+        """
+        Reads one member.
+
+        Args:
+            name (str): The member name, as listed.
+        Returns:
+            bytes: The member's content.
+        Raises:
+            KeyError: If the archive has no such member.
+            ValueError: If the content does not match its checksum.
+        """
+        member = self.members[name]
+        if self.compression == "none":
+            with open(self.path, "rb") as f:
+                f.seek(member["offset"] + member["data_offset"])
+                data = f.read(member["size"])
+        else:
+            if zstandard is None:
+                raise RuntimeError(f"Reading {self.path} needs the zstandard package")
+            frame = zstandard.ZstdDecompressor().decompressobj().decompress(self.read_frame(member))
+            data = frame[member["data_offset"]:member["data_offset"] + member["size"]]
+
+        if hashlib.sha256(data).hexdigest() != member["sha256"]:
+            raise ValueError(f"{name} in {self.path} does not match its checksum")
+        return data
+
+    def extract(self, name: str, folder: str) -> str:
+        """
+        Extracts one member into a folder, keeping its path inside the archive.
+
+        Returns:
+            str: The extracted file.
+        """
+        target = os.path.join(folder, *name.split("/"))
+        if os.path.relpath(target, folder).startswith(os.pardir):
+            raise ValueError(f"{name} would be extracted outside {folder}")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with atomic_write(target, "wb") as f:
+            f.write(self.read(name))
+        return target
+
+
+def main(argv: list = None) -> int:
+    """Lists or extracts the members of a packed archive."""
+    parser = argparse.ArgumentParser(prog="python -m utils.archive", description="List or extract members of a packed output archive.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    list_command = commands.add_parser("list", help="List the members with their sizes")
+    list_command.add_argument("archive")
+    extract_command = commands.add_parser("extract", help="Extract members, every member if none is named")
+    extract_command.add_argument("archive")
+    extract_command.add_argument("members", nargs="*")
+    extract_command.add_argument("-o", "--output", default=".", help="Folder to extract into")
+    args = parser.parse_args(argv)
+
+    archive = PackedArchive(args.archive)
+    if args.command == "list":
+        for name in archive.names():
+            print(f"{archive.members[name]['size']:>12}  {name}")
+        return 0
+
+    for name in args.members or archive.names():
+        if name not in archive.members:
+            print(f"{name}: not in {args.archive}", file=sys.stderr)
+            return 1
+        print(archive.extract(name, args.output))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
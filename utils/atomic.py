@@ -0,0 +1,31 @@
+import os
+from contextlib import contextmanager
+
+# Suffix of the temporary files written next to their final path
+TEMP_SUFFIX = ".tmp"
+
+
+@contextmanager
+def atomic_write(file_path: str, mode: str = "w", encoding: str = None, suffix: str = TEMP_SUFFIX):
+    """
+    Opens a temporary file next to file_path and renames it over file_path once the block finishes,
+    so a file is either complete or not there at all. If the block raises the temporary file is removed.
+
+    Args:
+        file_path (str): The final path of the file.
+        mode (str): "w" for text or "wb" for binary.
+        encoding (str): Text encoding, for text mode.
+        suffix (str): Suffix of the temporary file, it has to end with TEMP_SUFFIX.
+    Yields:
+        file: The temporary file.
+    """
+    temp_path = file_path + suffix
+    f = open(temp_path, mode, encoding=encoding)
+    try:
+        yield f
+    except BaseException:
+        f.close()
+        os.remove(temp_path)
+        raise
+    f.close()
+    os.replace(temp_path, file_path)
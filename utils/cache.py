@@ -0,0 +1,136 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Optional
+from collections import OrderedDict
+
+
+class OCRCache:
+    """
+    A content-addressed, size-bounded cache of Textract responses stored on the local disk.
+
+    Responses are keyed by the SHA-256 of the image bytes, so a page that is copied from LibNAS
+    again (after an ALTO failure, a re-dropped batch, ...) is never sent to Textract twice.
+    When the cache grows past max_bytes the least recently used responses are deleted.
+    """
+
+    def __init__(self, cache_folder: str, max_bytes: int):
+        """
+        Initialises the cache and indexes the responses already stored in cache_folder.
+
+        Args:
+            cache_folder (str): Folder holding the cached responses.
+            max_bytes (int): Maximum total size of the cached responses.
+        """
+        self.cache_folder = cache_folder
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.total_bytes = 0
+
+        # Cache keys in least to most recently used order, mapped to the file size
+        self._index = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_index()
+
+    def _load_index(self) -> None:
+        entries = []
+        for root, _, files in os.walk(self.cache_folder):
+            for filename in files:
+                if filename.endswith(".json"):
+                    stat = os.stat(os.path.join(root, filename))
+                    entries.append((stat.st_mtime, filename[:-5], stat.st_size))
+
+        # The modification time is bumped on every hit, so it orders the entries by last use
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self.total_bytes += size
+
+    @staticmethod
+    def key_for(image_bytes: bytes) -> str:
+        """
+        Returns the cache key of an image.
+
+        Args:
+            image_bytes (bytes): The image file content.
+        Returns:
+            str: The SHA-256 hex digest of the image.
+        """
+        return hashlib.sha256(image_bytes).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_folder, key[:2], key + ".json")
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Returns the cached Textract response for a key and marks it as recently used.
+
+        Args:
+            key (str): The cache key from key_for.
+        Returns:
+            Optional[dict]: The cached response, or None on a cache miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                response = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            if key in self._index:
+                self._index.move_to_end(key)
+        return response
+
+    def put(self, key: str, response: dict) -> None:
+        """
+        Stores a Textract response and evicts the least recently used responses if the cache is full.
+
+        Args:
+            key (str): The cache key from key_for.
+            response (dict): The Textract response to store.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first so a crash never leaves a truncated response behind
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(response, f, separators=(",", ":"))
+        os.replace(temp_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            self.total_bytes += size - self._index.pop(key, 0)
+            self._index[key] = size
+            evicted = []
+            while self.total_bytes > self.max_bytes and len(self._index) > 1:
+                old_key, old_size = self._index.popitem(last=False)
+                self.total_bytes -= old_size
+                evicted.append(old_key)
+
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        """
+        Returns the cache counters for logging.
+
+        Returns:
+            dict: Hit and miss counts, number of entries and total size in bytes.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._index),
+                "bytes": self.total_bytes,
+            }
@@ -137,12 +137,15 @@ class CheckEmptyFolder:
         
         For example, if you have:
         /output/subdirectory/children
-        this moves "children" to /output, and then removes any now-empty directories.
+        this moves "children" to /output, and then removes any now-empty directories. A child that is
+        already in /output (delivered by an earlier run) is merged, and folders flattened by an earlier
+        run are left as they are.
         """
         # Move nested child directories (e.g., /output/subdirectory/child -> /output/child)
         for item in os.listdir(self.output_folder):
             subfolder_path = os.path.join(self.output_folder, item)
-            if os.path.isdir(subfolder_path):
+            # A delivered top folder only holds subfolders, a folder with files (its ALTO XML) was flattened by an earlier run
+            if os.path.isdir(subfolder_path) and not any(entry.is_file() for entry in os.scandir(subfolder_path)):
                 # Look for directories inside each subdirectory
                 for child in os.listdir(subfolder_path):
                     child_path = os.path.join(subfolder_path, child)
@@ -152,10 +155,7 @@ class CheckEmptyFolder:
                             # If the destination already exists, merge the contents
                             print(f"Merging directory: {child_path} into {destination}")
                             self.log_activity.processing(f"Merging directory: {child_path} into {destination}")
-                            for child_item in os.listdir(child_path):
-                                src_path = os.path.join(child_path, child_item)
-                                shutil.move(src_path, destination)
-                            os.rmdir(child_path)
+                            self.merge_directory(child_path, destination)
                         else:
                             # Otherwise, move the entire child directory
                             print(f"Moving directory: {child_path} to {destination}")
@@ -172,6 +172,43 @@ class CheckEmptyFolder:
                 os.rmdir(root)
     
     
+    @classmethod
+    def merge_directory(cls, source, destination) -> None:
+        """
+        Moves the contents of a directory into an existing one and removes it. A later delivery of a
+        folder carries its ALTO XML with the earlier pages merged in, so its files replace the ones
+        already in the output.
+        """
+        for item in os.listdir(source):
+            src_path = os.path.join(source, item)
+            dst_path = os.path.join(destination, item)
+            if os.path.isdir(src_path) and os.path.isdir(dst_path):
+                cls.merge_directory(src_path, dst_path)
+            else:
+                if os.path.isdir(dst_path):
+                    shutil.rmtree(dst_path)
+                shutil.move(src_path, dst_path)
+        os.rmdir(source)
+
+    @staticmethod
+    def delivered_folders(output_folder, top_folder, subfolder) -> list:
+        """
+        Returns where a delivered subfolder may be in the output folder: flattened to
+        output/<subfolder> by is_output_folder_structured, or still at output/<top folder>/<subfolder>
+        when the output has not been cleaned up since it was delivered.
+        """
+        return [os.path.join(output_folder, subfolder), os.path.join(output_folder, top_folder, subfolder)]
+
+    @staticmethod
+    def flattened_path(output_folder, top_folder, relative) -> str:
+        """
+        Returns where a path delivered as output/<top folder>/<relative> is once is_output_folder_structured
+        has flattened the output, the top folder is dropped from anything in its subfolders.
+        """
+        if relative == os.curdir:
+            return os.path.join(output_folder, top_folder)
+        return os.path.join(output_folder, relative)
+
     def is_folder_empty(self, folder_path) -> bool:
         """Check if a given folder is empty."""
         return not any(os.scandir(folder_path))
\ No newline at end of file
@@ -1,12 +1,30 @@
+import io
 import os
+import mmap
 import json
 import boto3
 import shutil
+import threading
+from PIL import Image
 from pathlib import Path
 from dotenv import load_dotenv
+from collections import deque
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from utils.config import CoreConfig
 from utils.log import LogActivities
+from utils.alto import AltoGenerator
+from utils.compact import CompactPage
+from utils.manifest import ProcessingManifest
+from utils.atomic import atomic_write
+from utils.reference import ImageReference
+from utils.cache import OCRCache
 from utils.json_logger import JsonLogger
+from utils.preprocess import ImagePreprocessor
+from utils.tiling import PageTiler
+from utils.pages import page_stem
+from utils.rate_limit import AdaptiveRateLimiter, ThrottledError
 
 # Load environment variables from .env file
 load_dotenv()
@@ -16,6 +34,10 @@ class TextractOCR:
     A class to handle OCR processing using AWS Textract, managing folder paths, configurations, 
     and interactions with the AWS Textract service.
     """
+
+    # Textract error codes returned when the account's TPS quota is exceeded
+    THROTTLING_ERROR_CODES = ("ThrottlingException", "ProvisionedThroughputExceededException", "LimitExceededException")
+
     def __init__(self):
 
         """
@@ -33,14 +55,26 @@ class TextractOCR:
         self.json_sorter = self.folders["json_sorter"]
         self.text_sorter = self.folders["text_sorter"]
         self.images_sorter = self.folders["images_sorter"]
+        self.ocr_cache_folder = self.folders["ocr_cache_folder"]
         self.failed_ocr_folder = self.folders["failed_ocr_folder"]
         self.low_confidence_folder = self.folders["low_confidence_folder"]
         
         # Parameters from config.py 
         self.overwrite_files = self.parameters["overwrite_files"]
         self.image_extensions = self.parameters["image_extensions"]
+        self.ocr_max_workers = max(1, self.parameters["ocr_max_workers"])
+        self.throttle_max_requeues = self.parameters["throttle_max_requeues"]
+        self.ocr_tiling_enabled = self.parameters["ocr_tiling_enabled"]
         self.output_extension_json = self.parameters["output_extension_json"]
         self.output_extension_text = self.parameters["output_extension_text"]
+        self.output_extension_alto = self.parameters["output_extension_alto"]
+        self.output_extension_compact = self.parameters["output_extension_compact"]
+        self.compact_ocr_output = self.parameters["compact_ocr_output"]
+        self.compact_ocr_gzip = self.parameters["compact_ocr_gzip"]
+        self.raw_json_output = self.parameters["raw_json_output"]
+        self.pretty_json = self.parameters["pretty_json"]
+        self.alto_pretty_print = self.parameters["alto_pretty_print"]
+        self.fused_alto = self.parameters["fused_alto"]
         self.low_confidence_threshold = self.parameters["low_confidence_threshold"]
         self.low_confidence_error_message = self.parameters["low_confidence_error_message"]
         self.exception_save_error_message = self.parameters["exception_save_error_message"]
@@ -51,11 +85,46 @@ class TextractOCR:
         self.log_activity = LogActivities(self.logs_folder)
         self.json_logging = JsonLogger()
 
-        # AWS Textract client
+        # AWS Textract client, shared by every OCR worker thread (boto3 clients are thread-safe)
+        # The connection pool is sized to the number of workers so no request waits for a connection
+        # botocore does not retry, every throttle goes through the rate limiter and the requeue instead
         self.client = boto3.client("textract",
                     aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
                     aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-                    region_name=os.getenv("AWS_REGION"))
+                    region_name=os.getenv("AWS_REGION"),
+                    config=Config(max_pool_connections=max(10, self.ocr_max_workers),
+                                  retries={"mode": "standard", "total_max_attempts": 1}))
+
+        # Rate limiter shared by all workers in the process, backs off when Textract throttles
+        self.rate_limiter = AdaptiveRateLimiter.shared(self.parameters["textract_max_tps"], self.parameters["textract_min_tps"])
+
+        # In-memory transcoding / downscaling to fit the Textract limits
+        self.preprocessor = ImagePreprocessor(self.parameters["textract_max_bytes"],
+                    self.parameters["preprocess_max_pixels"],
+                    self.parameters["textract_max_side"],
+                    self.parameters["preprocess_format"],
+                    self.parameters["preprocess_jpeg_quality"],
+                    self.parameters["source_max_pixels"])
+
+        # Splits oversized pages into overlapping tiles when tiling is enabled
+        self.tiler = PageTiler(self.parameters["tile_size"], self.parameters["tile_overlap"])
+
+        # Cache of Textract responses keyed by image hash
+        self.ocr_cache = None
+        if self.parameters["ocr_cache_enabled"]:
+            self.ocr_cache = OCRCache(self.ocr_cache_folder, self.parameters["ocr_cache_max_bytes"])
+
+        # Pages OCR'd by an earlier run are not sent to Textract again
+        self.manifest = None
+        if self.parameters["manifest_enabled"]:
+            self.manifest = ProcessingManifest(os.path.join(self.logs_folder, self.parameters["manifest_file_name"]))
+
+        # With the fused ALTO path the JSON archive is written by a background thread, off the OCR workers
+        self.json_writer = None
+        self.pending_json_writes = []
+        self.pending_json_writes_lock = threading.Lock()
+        if self.fused_alto:
+            self.json_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="json-writer")
 
 
     def delete_empty_folder(self, directory_path: str) -> None:
@@ -65,11 +134,103 @@ class TextractOCR:
         Args:
             directory_path (str): The path to the directory to check and delete.
         """
-        if not os.listdir(directory_path):
-            os.rmdir(directory_path)
+        # Another OCR worker may have removed the directory already
+        try:
+            if not os.listdir(directory_path):
+                os.rmdir(directory_path)
+        except OSError:
+            pass
+
+
+    def detect_document_text(self, image_bytes: bytes) -> dict:
+        """
+        Sends the image to Textract once the shared rate limiter allows it.
+
+        Args:
+            image_bytes (bytes | mmap.mmap): The image to analyse.
+        Returns:
+            dict: The Textract response.
+        Raises:
+            ThrottledError: If Textract rejected the request because the TPS quota was exceeded.
+        """
+        # A mapped file is only copied into memory for the upload itself
+        if isinstance(image_bytes, mmap.mmap):
+            image_bytes = image_bytes[:]
+
+        self.rate_limiter.acquire()
+        try:
+            response = self.client.detect_document_text(Document={"Bytes": image_bytes})
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in self.THROTTLING_ERROR_CODES:
+                self.rate_limiter.record_throttle()
+                raise ThrottledError(str(e)) from e
+            raise
+        self.rate_limiter.record_success()
+        return response
+
+
+    def analyse_image(self, input_file: str, image_bytes: bytes) -> dict:
+        """
+        Prepares an image for Textract and returns its response. Images that would have to be
+        downscaled are split into tiles instead when tiling is enabled.
+
+        Args:
+            input_file (str): The path to the input image file, used for logging.
+            image_bytes (bytes): The image file content.
+        Returns:
+            dict: The Textract response, with the original image size recorded under PipelineMetadata.
+        """
+        # A mapped file is decoded in place, without copying it into a second buffer
+        with Image.open(image_bytes if isinstance(image_bytes, mmap.mmap) else io.BytesIO(image_bytes)) as img:
+            if self.ocr_tiling_enabled and self.preprocessor.limit_scale(*img.size) < 1.0:
+                return self.detect_tiled(input_file, img)
+            prepared = self.preprocessor.prepare_image(img, image_bytes)
 
+        if prepared.data is not image_bytes:
+            self.log_activity.processing(f"Transcoded {input_file} to {prepared.upload_format} at scale {prepared.scale:.3f} ({len(image_bytes)} -> {len(prepared.data)} bytes)")
 
-    def extract_from_image(self, input_file: str, output_file_json: str, output_file_text: str) -> bool: 
+        response = self.detect_document_text(prepared.data)
+
+        # Bounding boxes are relative to the page, the original size keeps ALTO in the original pixel space
+        response["PipelineMetadata"] = prepared.metadata()
+        return response
+
+
+    def detect_tiled(self, input_file: str, img: Image.Image) -> dict:
+        """
+        Sends the tiles of an oversized page to Textract concurrently and merges the results.
+
+        Args:
+            input_file (str): The path to the input image file, used for logging.
+            img (Image.Image): The opened page image.
+        Returns:
+            dict: A single page response with page-level geometry, as returned by PageTiler.merge.
+        """
+        width, height = img.size
+        tiles = self.tiler.plan(width, height)
+        self.log_activity.processing(f"Splitting {input_file} ({width}x{height}) into {len(tiles)} tiles")
+
+        # Decode once up front, the worker threads only crop the decoded image
+        img.load()
+
+        def ocr_tile(tile):
+            prepared = self.preprocessor.prepare_image(img.crop(tile["box"]))
+            return self.detect_document_text(prepared.data)
+
+        with ThreadPoolExecutor(max_workers=min(self.ocr_max_workers, len(tiles)), thread_name_prefix="textract-tile") as executor:
+            responses = list(executor.map(ocr_tile, tiles))
+
+        response = self.tiler.merge(tiles, responses, width, height)
+        response["PipelineMetadata"] = {
+            "OriginalWidth": width,
+            "OriginalHeight": height,
+            "ScaleFactor": 1.0,
+            "Tiles": len(tiles),
+        }
+        return response
+
+
+    def extract_from_image(self, input_file: str, output_file_json: str, output_file_text: str, image_hash: str = None) -> bool: 
         """
         Extracts text from image in the input_folder's path using AWS Textract and saves the result as a JSON file to json_sorter folder.
 
@@ -77,16 +238,31 @@ class TextractOCR:
             input_file (str): The path to the input image file.
             output_file_json (str): The path to the output JSON file.
             output_file_text (str): The path to the output TXT file.
+            image_hash (str): The SHA-256 of the image if it was already computed, it is the OCR cache key.
         Returns:
             bool: True if the image was successfully processed and saved, False otherwise.
+        Raises:
+            ThrottledError: If Textract throttled the request, the image is left in place so it can be sent again.
         """
         
         try:
-            with open(input_file, "rb") as document:
-                # Call Textract to analyse the document
-                response = self.client.detect_document_text(
-                    Document={"Bytes": document.read()}
-                )
+            # Every frame of a multi-page TIFF is OCR'd as its own page
+            if self.is_multipage_tiff(input_file):
+                return self.extract_from_multipage(input_file, output_file_json, output_file_text)
+
+            # In direct-read mode the input file is a stub and the image is read from LibNas
+            with ImageReference.open_bytes(input_file) as image_bytes:
+                # Reuse the response of an identical image analysed before
+                cache_key = (image_hash or self.ocr_cache.key_for(image_bytes)) if self.ocr_cache else None
+                response = self.ocr_cache.get(cache_key) if cache_key else None
+
+                if response is None:
+                    # Call Textract to analyse the document
+                    response = self.analyse_image(input_file, image_bytes)
+                    if cache_key:
+                        self.ocr_cache.put(cache_key, response)
+        except ThrottledError:
+            raise
         except Exception as e:
             # Log error in JSON file
             self.json_logging.log_error_as_json(self.ocr_processing_error_message,input_file )
@@ -94,15 +270,144 @@ class TextractOCR:
             shutil.move(input_file, self.failed_ocr_folder)
             return False
 
-        # Extract confidence scores for lines
-        line_confidences = [block["Confidence"] for block in response["Blocks"] if block["BlockType"] == "LINE"]
+        if not self.save_ocr_output(input_file, response, output_file_json, output_file_text):
+            shutil.move(input_file, self.low_confidence_folder)
+            return False
+
+        return True
+
+
+    @staticmethod
+    def is_multipage_tiff(input_file: str) -> bool:
+        """
+        Checks whether an image is a TIFF with more than one frame.
+
+        Args:
+            input_file (str): The path to the input image file.
+        Returns:
+            bool: True for multi-page TIFFs, False otherwise.
+        """
+        if os.path.splitext(input_file)[1].lower() not in (".tif", ".tiff"):
+            return False
+        with Image.open(ImageReference.resolve(input_file)) as img:
+            return getattr(img, "n_frames", 1) > 1
+
+
+    def extract_from_multipage(self, input_file: str, output_file_json: str, output_file_text: str) -> bool:
+        """
+        Extracts text from every frame of a multi-page TIFF concurrently. Each frame is saved as its
+        own JSON and TXT file named <image name>_p0001, <image name>_p0002, ...
+
+        Frames are decoded one at a time and only when a worker is free, so a large TIFF is never
+        held in memory as a whole.
+
+        Args:
+            input_file (str): The path to the input TIFF file.
+            output_file_json (str): The path to the output JSON file of the whole image.
+            output_file_text (str): The path to the output TXT file of the whole image.
+        Returns:
+            bool: True if at least one frame was processed and saved, False otherwise.
+        Raises:
+            ThrottledError: If Textract throttled any frame, the frames already done are served from the cache on the next attempt.
+        """
+        json_stem, json_extension = os.path.splitext(output_file_json)
+        text_stem, text_extension = os.path.splitext(output_file_text)
+        in_flight = threading.BoundedSemaphore(self.ocr_max_workers)
+        futures = []
+
+        with Image.open(ImageReference.resolve(input_file)) as img, ThreadPoolExecutor(max_workers=self.ocr_max_workers, thread_name_prefix="textract-frame") as executor:
+            frame_count = img.n_frames
+            self.log_activity.processing(f"Splitting {input_file} into {frame_count} pages")
+
+            for frame_index in range(frame_count):
+                in_flight.acquire()
+                try:
+                    img.seek(frame_index)
+                    prepared = self.preprocessor.prepare_image(img)
+                except Exception:
+                    in_flight.release()
+                    raise
+
+                future = executor.submit(self.ocr_frame, input_file, prepared, frame_index, frame_count,
+                                         page_stem(json_stem, frame_index) + json_extension,
+                                         page_stem(text_stem, frame_index) + text_extension)
+                future.add_done_callback(lambda _: in_flight.release())
+                futures.append(future)
+
+        throttled = [future for future in futures if isinstance(future.exception(), ThrottledError)]
+        if throttled:
+            raise throttled[0].exception()
+
+        if not any(future.result() for future in futures):
+            shutil.move(input_file, self.low_confidence_folder)
+            return False
+        return True
+
+
+    def ocr_frame(self, input_file: str, prepared, frame_index: int, frame_count: int, output_file_json: str, output_file_text: str) -> bool:
+        """
+        Runs OCR on one prepared TIFF frame and saves its JSON and TXT files.
+
+        Args:
+            input_file (str): The path to the input TIFF file.
+            prepared (PreparedImage): The frame prepared for upload.
+            frame_index (int): Zero-based frame index.
+            frame_count (int): Number of frames in the TIFF.
+            output_file_json (str): The path to the frame's output JSON file.
+            output_file_text (str): The path to the frame's output TXT file.
+        Returns:
+            bool: True if the frame was processed and saved, False otherwise.
+        Raises:
+            ThrottledError: If Textract throttled the request.
+        """
+        page_name = f"{input_file} [page {frame_index + 1}/{frame_count}]"
+        try:
+            cache_key = self.ocr_cache.key_for(prepared.data) if self.ocr_cache else None
+            response = self.ocr_cache.get(cache_key) if cache_key else None
+
+            if response is None:
+                response = self.detect_document_text(prepared.data)
+                response["PipelineMetadata"] = dict(prepared.metadata(), Frame=frame_index, Frames=frame_count)
+                if cache_key:
+                    self.ocr_cache.put(cache_key, response)
+        except ThrottledError:
+            raise
+        except Exception as e:
+            # Log error in JSON file
+            self.json_logging.log_error_as_json(self.ocr_processing_error_message, page_name)
+            self.log_activity.error(f"Error processing OCR for file {page_name}: {e}")
+            return False
+
+        return self.save_ocr_output(page_name, response, output_file_json, output_file_text, input_file, frame_index)
+
+
+    def save_ocr_output(self, input_file: str, response: dict, output_file_json: str, output_file_text: str,
+                        image_file: str = None, frame_index: int = None) -> bool:
+        """
+        Checks the average line confidence of a Textract response and saves it as JSON and TXT files.
+        With fused_alto the ALTO page is rendered from the response as well and the JSON is written in the background.
+
+        Args:
+            input_file (str): The image (or image page) the response belongs to, used for logging.
+            response (dict): The Textract response.
+            output_file_json (str): The path to the output JSON file.
+            output_file_text (str): The path to the output TXT file.
+            image_file (str): The image file, defaults to input_file.
+            frame_index (int): Frame of a multi-page TIFF, None for single page images.
+        Returns:
+            bool: False if the average confidence is below the threshold and nothing was saved, True otherwise.
+        """
+        # Confidence, text and word count of the page in one pass over the blocks
+        summary = self.summarise_response(response)
         
         # Calculate the average confidence score
-        if line_confidences:
-            average_confidence = sum(line_confidences) / len(line_confidences)
+        if summary["lines"]:
+            average_confidence = summary["average_confidence"]
             
             # Log the average confidence score of each file
             self.log_activity.confidence(input_file,average_confidence)
+            self.log_activity.processing(f"{input_file}: {summary['lines']} lines, {summary['words']} words, "
+                                         f"confidence min {summary['min_confidence']:.2f} avg {average_confidence:.2f}")
             
             # with open(f"{self.logs_folder.rstrip('/') + '/'}avg_confidence_score.txt", "a", encoding="UTF-8") as f: 
             #     f.write(input_file + ": " + str(average_confidence) + "\n")
@@ -117,14 +422,86 @@ class TextractOCR:
             
             # Log error in JSON file
             self.json_logging.log_error_as_json(self.low_confidence_error_message,input_file )
-
-            shutil.move(input_file, self.low_confidence_folder)
             return False
         
         
+        if self.compact_ocr_output:
+            self.save_compact(input_file, response, output_file_json)
+
+        if self.fused_alto:
+            self.save_alto_fragment(input_file, response, output_file_json, image_file or input_file, frame_index)
+
+        # The full response is archived as JSON, by the background writer with the fused ALTO path
+        if self.raw_json_output and self.fused_alto:
+            future = self.json_writer.submit(self.save_json, input_file, response, output_file_json)
+            with self.pending_json_writes_lock:
+                self.pending_json_writes.append(future)
+        elif self.raw_json_output:
+            self.save_json(input_file, response, output_file_json)
+
         try:
-            with open(output_file_json, "w", encoding="utf-8") as json_file:
-                json.dump(response, json_file, indent=4)
+            with atomic_write(output_file_text, "w", encoding="utf-8") as text_file:
+                text_file.write("\n".join(summary["line_text"]).strip())
+            print(f"Processed file saved to {output_file_text}")
+            self.log_activity.processing(f"Processed file saved to {output_file_text}")
+        except Exception as e:
+            # Log error in JSON file
+            self.json_logging.log_error_as_json(self.exception_save_error_message,input_file )
+            self.log_activity.error(f"Error saving file {output_file_text}: {e}")
+
+        return True
+
+
+    @staticmethod
+    def summarise_response(response: dict) -> dict:
+        """
+        Collects the line confidences, line text and word count of a Textract response in a single pass.
+
+        Args:
+            response (dict): The Textract response.
+        Returns:
+            dict: "lines", "words", "average_confidence" and "min_confidence" (0 without lines) and the "line_text" list.
+        """
+        line_text = []
+        confidence_total = 0.0
+        min_confidence = None
+        words = 0
+        for block in response["Blocks"]:
+            block_type = block["BlockType"]
+            if block_type == "LINE":
+                confidence = block["Confidence"]
+                confidence_total += confidence
+                if min_confidence is None or confidence < min_confidence:
+                    min_confidence = confidence
+                line_text.append(block["Text"])
+            elif block_type == "WORD":
+                words += 1
+
+        lines = len(line_text)
+        return {
+            "lines": lines,
+            "words": words,
+            "average_confidence": confidence_total / lines if lines else 0,
+            "min_confidence": min_confidence or 0,
+            "line_text": line_text,
+        }
+
+
+    def save_json(self, input_file: str, response: dict, output_file_json: str) -> None:
+        """
+        Saves a Textract response as a JSON file.
+
+        Args:
+            input_file (str): The image (or image page) the response belongs to, used for logging.
+            response (dict): The Textract response.
+            output_file_json (str): The path to the output JSON file.
+        """
+        try:
+            with atomic_write(output_file_json, "w", encoding="utf-8") as json_file:
+                if self.pretty_json:
+                    json.dump(response, json_file, indent=4)
+                else:
+                    json.dump(response, json_file, separators=(",", ":"))
             print(f"Processed file saved to {output_file_json}")
             self.log_activity.processing(f"Processed file saved to {output_file_json}")
         except Exception as e:
@@ -132,23 +509,55 @@ class TextractOCR:
             self.json_logging.log_error_as_json(self.exception_save_error_message,input_file )
             self.log_activity.error(f"Error saving file {output_file_json}: {e}")
 
-        # Extract text from Textract response
-        extracted_text = ''
-        for item in response['Blocks']:
-            if item['BlockType'] == 'LINE':
-                extracted_text += item['Text'] + '\n'
 
+    def save_compact(self, input_file: str, response: dict, output_file_json: str) -> None:
+        """
+        Saves the text, confidence and geometry of a Textract response as a compact OCR page next to the JSON file.
+
+        Args:
+            input_file (str): The image (or image page) the response belongs to, used for logging.
+            response (dict): The Textract response.
+            output_file_json (str): The path to the output JSON file.
+        """
+        output_file_compact = os.path.splitext(output_file_json)[0] + self.output_extension_compact
         try:
-            with open(output_file_text, "w", encoding="utf-8") as text_file:
-                text_file.write(extracted_text.strip())
-            print(f"Processed file saved to {output_file_text}")
-            self.log_activity.processing(f"Processed file saved to {output_file_text}")
+            CompactPage.from_response(response).save(output_file_compact, self.compact_ocr_gzip)
+            self.log_activity.processing(f"Processed file saved to {output_file_compact}")
         except Exception as e:
             # Log error in JSON file
             self.json_logging.log_error_as_json(self.exception_save_error_message,input_file )
-            self.log_activity.error(f"Error saving file {output_file_text}: {e}")
+            self.log_activity.error(f"Error saving file {output_file_compact}: {e}")
+
+
+    def save_alto_fragment(self, input_file: str, response: dict, output_file_json: str, image_file: str, frame_index: int) -> None:
+        """
+        Renders the ALTO page of a Textract response and saves it next to the JSON file, so the
+        ALTO assembly only has to concatenate the pages. If saving fails the page is rendered from
+        the JSON file later instead.
+
+        Args:
+            input_file (str): The image (or image page) the response belongs to, used for logging.
+            response (dict): The Textract response.
+            output_file_json (str): The path to the output JSON file.
+            image_file (str): The image file, only read if the response has no recorded size.
+            frame_index (int): Frame of a multi-page TIFF, None for single page images.
+        """
+        output_file_alto = os.path.splitext(output_file_json)[0] + self.output_extension_alto
+        page_id = os.path.splitext(os.path.basename(output_file_json))[0]
+        try:
+            fragment = AltoGenerator.render_response(response, image_file, frame_index, page_id, self.alto_pretty_print)
+            # A partly written fragment must never be picked up by the ALTO assembly
+            with atomic_write(output_file_alto, "w", encoding="utf-8") as alto_file:
+                alto_file.write(fragment)
+        except Exception as e:
+            self.log_activity.error(f"Error saving ALTO page {output_file_alto} for {input_file}: {e}")
 
-        return True
+
+    def wait_for_json_writes(self) -> None:
+        """Blocks until the background writer has saved every JSON file submitted so far."""
+        with self.pending_json_writes_lock:
+            pending, self.pending_json_writes = self.pending_json_writes, []
+        wait(pending)
 
 
     def move_extracted_images(self, directory_name: str, file_path: str) -> None:
@@ -167,6 +576,8 @@ class TextractOCR:
         filename = os.path.basename(file_path)
         try:
             shutil.move(file_path, output_directory)
+            if self.manifest is not None:
+                self.manifest.move([file_path], str(output_directory))
         except FileExistsError:
             if self.overwrite_files:
                 os.remove(os.join(output_directory, filename))
@@ -181,40 +592,199 @@ class TextractOCR:
         self.delete_empty_folder(directory_moved)
 
 
+    def prepare_ocr_job(self, parent_input_folder: str, root: str, filename: str) -> tuple:
+        """
+        Creates the json_sorter and text_sorter output directories for an image and builds its output file paths.
+
+        Args:
+            parent_input_folder (str): The path to the parent folder containing images to process.
+            root (str): The directory containing the image.
+            filename (str): The image file name.
+        Returns:
+            tuple: (input_file, directory_name, output_file_json, output_file_text)
+        """
+        input_file = os.path.join(root, filename)
+
+        # Get the directory name for output
+        directory_name = os.path.relpath(root, parent_input_folder)
+        output_directory_json = Path(self.json_sorter) / directory_name
+        output_directory_text = Path(self.text_sorter) / directory_name
+        output_directory_json.mkdir(parents=True, exist_ok=True)
+        output_directory_text.mkdir(parents=True, exist_ok=True)
+
+        # Prepare the output file path
+        output_file_json = os.path.join(output_directory_json, filename.rsplit(".", 1)[0] + self.output_extension_json)
+        output_file_text = os.path.join(output_directory_text, filename.rsplit(".", 1)[0] + self.output_extension_text)
+
+        return input_file, directory_name, output_file_json, output_file_text
+
+
+    def process_image(self, input_file: str, directory_name: str, output_file_json: str, output_file_text: str) -> bool:
+        """
+        Runs OCR on a single image and moves it to the images_sorter folder if OCR works.
+        Failed images are moved to the failed_ocr_folder by extract_from_image.
+
+        Args:
+            input_file (str): The path to the input image file.
+            directory_name (str): The directory name relative to the parent input folder.
+            output_file_json (str): The path to the output JSON file.
+            output_file_text (str): The path to the output TXT file.
+        Returns:
+            bool: True if the image was processed and moved, False otherwise.
+        Raises:
+            ThrottledError: If Textract throttled the request.
+        """
+        # Print file paths for debugging
+        print(f"Processing file: {input_file}")
+        print(f"Output Json & Text file: {output_file_json}")
+        self.log_activity.processing(f"Processing file: {input_file}")
+        self.log_activity.processing(f"Output Json & Text file: {output_file_json}")
+
+        image_hash = ProcessingManifest.file_hash(ImageReference.resolve(input_file)) if self.manifest is not None else None
+        if image_hash and self.is_already_ocrd(input_file, image_hash):
+            return self.resume_ocrd_image(input_file, directory_name, output_file_json)
+
+        # Move processed images file to images_sorter directory if OCR works
+        # The manifest's hash doubles as the OCR cache key, the image is only read once for both
+        if self.extract_from_image(input_file, output_file_json, output_file_text, image_hash):
+            if image_hash:
+                self.record_stage(input_file, "ocr", image_hash)
+            self.move_extracted_images(directory_name, input_file)
+            return True
+        if image_hash:
+            # The image is in failed_ocr or low_confidence, a failed page is copied again by the next run
+            self.manifest.advance([input_file], "failed")
+        return False
+
+
+    def is_already_ocrd(self, input_file: str, image_hash: str) -> bool:
+        """
+        Checks the manifest for an identical image that was already OCR'd.
+
+        Args:
+            input_file (str): The path to the input image file.
+            image_hash (str): The SHA-256 of the image.
+        Returns:
+            bool: True if the image does not need to go to Textract again.
+        """
+        record = self.manifest.lookup_location(input_file)
+        return (record is not None and record["sha256"] == image_hash
+                and self.manifest.stage_rank(record["stage"]) >= self.manifest.stage_rank("ocr"))
+
+
+    def resume_ocrd_image(self, input_file: str, directory_name: str, output_file_json: str) -> bool:
+        """
+        Handles an image the manifest says was already OCR'd. If its output is still waiting in the
+        json_sorter folder the run stopped before the image was moved, so it is moved on now.
+        Otherwise the page has moved further down the pipeline and the copy is left in place.
+
+        Args:
+            input_file (str): The path to the input image file.
+            directory_name (str): The directory name relative to the parent input folder.
+            output_file_json (str): The path to the output JSON file.
+        Returns:
+            bool: True if the image was moved to the images_sorter folder.
+        """
+        stem = os.path.splitext(output_file_json)[0]
+        outputs = [stem + extension for extension in (self.output_extension_json, self.output_extension_compact)]
+        if any(os.path.exists(output) for output in outputs) or os.path.exists(page_stem(stem, 0) + self.output_extension_json):
+            self.log_activity.processing(f"Skipping OCR for {input_file}, already OCR'd")
+            self.move_extracted_images(directory_name, input_file)
+            return True
+
+        print(f"Skipping {input_file}, it was already processed")
+        self.log_activity.processing(f"Skipping {input_file}, it was already processed ({self.manifest.lookup_location(input_file)['stage']})")
+        return False
+
+
+    def record_stage(self, input_file: str, stage: str, image_hash: str) -> None:
+        """Records the stage of an image in the manifest, adding images that did not come from LibNas."""
+        if self.manifest.lookup_location(input_file) is None:
+            self.manifest.record(input_file, stage, sha256=image_hash, location=input_file)
+        else:
+            self.manifest.advance([input_file], stage)
+
+
+    def requeue_throttled(self, input_file: str, requeue_counts: dict) -> bool:
+        """
+        Decides whether a throttled image goes back in the queue. After throttle_max_requeues
+        attempts the image is treated as a failed OCR and moved to the failed_ocr_folder.
+
+        Args:
+            input_file (str): The path to the throttled image file.
+            requeue_counts (dict): Number of times each image has been requeued, updated in place.
+        Returns:
+            bool: True if the image should be sent again, False if it was moved to the failed_ocr_folder.
+        """
+        attempts = requeue_counts.get(input_file, 0)
+        if attempts < self.throttle_max_requeues:
+            requeue_counts[input_file] = attempts + 1
+            self.rate_limiter.record_requeue()
+            self.log_activity.processing(f"Textract throttled {input_file}, requeued ({attempts + 1}/{self.throttle_max_requeues})")
+            return True
+
+        self.json_logging.log_error_as_json(self.ocr_processing_error_message, input_file)
+        self.log_activity.error(f"Error processing OCR for file {input_file}: throttled {attempts} times")
+        shutil.move(input_file, self.failed_ocr_folder)
+        if self.manifest is not None:
+            self.manifest.advance([input_file], "failed", self.failed_ocr_folder)
+        return False
+
+
     # Entry point to the script
     def select_image(self, parent_input_folder: str) -> None:
         """
         Selects image files from the specified folder, processes them, and organises them based on the OCR results.
+        Up to ocr_max_workers images are sent to Textract at the same time.
 
         Args:
             parent_input_folder (str): The path to the parent folder containing images to process.
         """
         
+        jobs = []
         for root, _, files in os.walk(parent_input_folder):
             for filename in files:
                 if "." +  filename.split(".")[1] in self.image_extensions: # Ensure the selected file is a valid images
-                    input_file = os.path.join(root, filename)
-                    
-                    # Get the directory name for output
-                    directory_name = os.path.relpath(root, parent_input_folder)
-                    output_directory_json = Path(self.json_sorter) / directory_name
-                    output_directory_text = Path(self.text_sorter) / directory_name
-                    output_directory_json.mkdir(parents=True, exist_ok=True)
-                    output_directory_text.mkdir(parents=True, exist_ok=True)
-                    
-                    # Prepare the output file path
-                    output_file_json = os.path.join(output_directory_json, filename.rsplit(".", 1)[0] + self.output_extension_json)
-                    output_file_text = os.path.join(output_directory_text, filename.rsplit(".", 1)[0] + self.output_extension_text)
-
-                    # Print file paths for debugging
-                    print(f"Processing file: {input_file}")
-                    print(f"Output Json & Text file: {output_file_json}")
-                    self.log_activity.processing(f"Processing file: {input_file}")
-                    self.log_activity.processing(f"Output Json & Text file: {output_file_json}")
-                    
-                    # Move processed images file to images_sorter directory if OCR works
-                    if self.extract_from_image(input_file, output_file_json, output_file_text):
-                        self.move_extracted_images(directory_name, input_file)
+                    jobs.append(self.prepare_ocr_job(parent_input_folder, root, filename))
+
+        # Number of times each throttled image has been put back in the queue
+        requeue_counts = {}
+
+        if self.ocr_max_workers == 1 or len(jobs) <= 1:
+            pending = deque(jobs)
+            while pending:
+                job = pending.popleft()
+                try:
+                    self.process_image(*job)
+                except ThrottledError:
+                    if self.requeue_throttled(job[0], requeue_counts):
+                        pending.append(job)
+        else:
+            with ThreadPoolExecutor(max_workers=self.ocr_max_workers, thread_name_prefix="textract") as executor:
+                futures = {executor.submit(self.process_image, *job): job for job in jobs}
+                while futures:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job = futures.pop(future)
+                        try:
+                            future.result()
+                        except ThrottledError:
+                            if self.requeue_throttled(job[0], requeue_counts):
+                                futures[executor.submit(self.process_image, *job)] = job
+                        except Exception as e:
+                            self.log_activity.error(f"Error processing OCR for file {job[0]}: {e}")
+
+        # The JSON files have to be on disk before they are sorted
+        self.wait_for_json_writes()
+
+        if jobs:
+            print(f"Textract rate limiter: {self.rate_limiter.stats()}")
+            self.log_activity.processing(f"Textract rate limiter: {self.rate_limiter.stats()}")
+            if self.ocr_cache:
+                print(f"OCR cache: {self.ocr_cache.stats()}")
+                self.log_activity.processing(f"OCR cache: {self.ocr_cache.stats()}")
+            if self.manifest is not None:
+                self.log_activity.processing(f"Manifest: {self.manifest.stats()}")
 
         # Remove empty folder from input resulting from failed OCR
         for root, dirs, _ in os.walk(parent_input_folder):
@@ -0,0 +1,174 @@
+import sys
+import gzip
+import json
+import struct
+from array import array
+from utils.atomic import atomic_write
+
+
+class CompactPage:
+    """
+    The part of a Textract page response the pipeline uses, stored as columns: the text, confidence
+    and bounding box of every LINE and WORD, plus the offsets of each line's words.
+
+    File layout (version 1), all numbers little-endian:
+        b"OCRP", version (uint8), flags (uint8, bit 0 set if the rest of the file is gzip compressed),
+        header length (uint32), JSON header (line and word counts, texts, PipelineMetadata),
+        line boxes (float64 Left, Top, Width, Height), line confidences (float64), line offsets (uint32),
+        word boxes (float64 Left, Top, Width, Height), word confidences (float64),
+        word spaced flags (uint8, 1 if an SP follows the word in its line).
+
+    Geometry is kept in double precision so the ALTO pixel values are identical to the JSON path.
+    """
+
+    MAGIC = b"OCRP"
+    VERSION = 1
+    FLAG_GZIP = 1
+
+    def __init__(self, line_text=None, line_confidence=None, line_boxes=None, line_offsets=None,
+                 word_text=None, word_confidence=None, word_boxes=None, word_spaced=None, metadata=None):
+        self.line_text = line_text if line_text is not None else []
+        self.line_confidence = line_confidence if line_confidence is not None else array("d")
+        self.line_boxes = line_boxes if line_boxes is not None else array("d")
+        self.line_offsets = line_offsets if line_offsets is not None else array("I", [0])
+        self.word_text = word_text if word_text is not None else []
+        self.word_confidence = word_confidence if word_confidence is not None else array("d")
+        self.word_boxes = word_boxes if word_boxes is not None else array("d")
+        self.word_spaced = word_spaced if word_spaced is not None else array("B")
+        self.metadata = metadata if metadata is not None else {}
+
+    @property
+    def line_count(self) -> int:
+        return len(self.line_text)
+
+    @property
+    def word_count(self) -> int:
+        return len(self.word_text)
+
+    @classmethod
+    def from_response(cls, response: dict) -> "CompactPage":
+        """
+        Builds a compact page from a Textract response.
+
+        Args:
+            response (dict): The Textract response, optionally with PipelineMetadata.
+        Returns:
+            CompactPage: The page in reading order of its LINE blocks.
+        """
+        page = cls(metadata=dict(response.get("PipelineMetadata", {})))
+
+        # Index the page's blocks by Id once, the first block wins
+        blocks_by_id = {}
+        for block in response["Blocks"]:
+            if "Id" in block:
+                blocks_by_id.setdefault(block["Id"], block)
+
+        for block in response["Blocks"]:
+            if block["BlockType"] != "LINE":
+                continue
+            box = block["Geometry"]["BoundingBox"]
+            page.line_text.append(block.get("Text", ""))
+            page.line_confidence.append(block.get("Confidence", 0.0))
+            page.line_boxes.extend((box["Left"], box["Top"], box["Width"], box["Height"]))
+
+            relationships = block.get("Relationships")
+            words = [blocks_by_id.get(word_id) for word_id in (relationships[0].get("Ids", []) if relationships else [])]
+            for index, word in enumerate(words):
+                if word:
+                    box = word["Geometry"]["BoundingBox"]
+                    page.word_text.append(word["Text"])
+                    page.word_confidence.append(word["Confidence"])
+                    page.word_boxes.extend((box["Left"], box["Top"], box["Width"], box["Height"]))
+                    page.word_spaced.append(1 if index < len(words) - 1 and words[index + 1] else 0)
+            page.line_offsets.append(len(page.word_text))
+        return page
+
+    def to_bytes(self, compress: bool = False) -> bytes:
+        """
+        Serialises the page.
+
+        Args:
+            compress (bool): Gzip everything after the version and flags.
+        Returns:
+            bytes: The serialised page.
+        """
+        header = json.dumps({
+            "lines": self.line_count,
+            "words": self.word_count,
+            "line_text": self.line_text,
+            "word_text": self.word_text,
+            "metadata": self.metadata,
+        }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+        columns = [self.line_boxes, self.line_confidence, self.line_offsets,
+                   self.word_boxes, self.word_confidence, self.word_spaced]
+        if sys.byteorder == "big":
+            columns = [array(column.typecode, column) for column in columns]
+            for column in columns:
+                column.byteswap()
+
+        body = struct.pack("<I", len(header)) + header + b"".join(column.tobytes() for column in columns)
+        flags = 0
+        if compress:
+            body = gzip.compress(body, compresslevel=6)
+            flags |= self.FLAG_GZIP
+        return self.MAGIC + struct.pack("<BB", self.VERSION, flags) + body
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CompactPage":
+        """
+        Reads a serialised page.
+
+        Args:
+            data (bytes): The output of to_bytes.
+        Returns:
+            CompactPage: The page.
+        Raises:
+            ValueError: If the data is not a compact page or was written by a newer version.
+        """
+        if data[:4] != cls.MAGIC:
+            raise ValueError("Not a compact OCR page.")
+        version, flags = struct.unpack("<BB", data[4:6])
+        if version > cls.VERSION:
+            raise ValueError(f"Unsupported compact OCR page version {version}.")
+
+        body = memoryview(data)[6:]
+        if flags & cls.FLAG_GZIP:
+            body = memoryview(gzip.decompress(body))
+        header_length = struct.unpack("<I", body[:4])[0]
+        header = json.loads(bytes(body[4:4 + header_length]).decode("utf-8"))
+        position = 4 + header_length
+
+        def column(typecode, length):
+            nonlocal position
+            values = array(typecode)
+            size = values.itemsize * length
+            values.frombytes(body[position:position + size])
+            if sys.byteorder == "big":
+                values.byteswap()
+            position += size
+            return values
+
+        lines, words = header["lines"], header["words"]
+        return cls(
+            line_text=header["line_text"],
+            line_boxes=column("d", lines * 4),
+            line_confidence=column("d", lines),
+            line_offsets=column("I", lines + 1),
+            word_text=header["word_text"],
+            word_boxes=column("d", words * 4),
+            word_confidence=column("d", words),
+            word_spaced=column("B", words),
+            metadata=header["metadata"],
+        )
+
+    def save(self, file_path: str, compress: bool = False) -> None:
+        """Writes the page to a file, through a temporary file so a partly written page is never read."""
+        with atomic_write(file_path, "wb") as f:
+            f.write(self.to_bytes(compress))
+
+    @classmethod
+    def load(cls, file_path: str) -> "CompactPage":
+        """Reads a page written by save."""
+        with open(file_path, "rb") as f:
+            return cls.from_bytes(f.read())
@@ -36,6 +36,19 @@ class CoreConfig:
             - low_confidence_threshold: Integer threshold for low confidence.
             - output_extension_json: File extension for output files.
             - image_extensions: Tuple of supported image file extensions.
+            - ocr_max_workers: Number of images sent to Textract concurrently.
+            - copy_max_workers / copy_retries / copy_timeout: Parallel, retried copies from LibNas input.
+            - delta_sync / delta_sync_hash: Copy only new or changed images from LibNas input.
+            - delivery_max_workers / delivery_retries: Parallel, verified delivery to LibNas output.
+            - direct_read / direct_read_copy_masters: Read images in place on LibNas instead of copying them to the input folder.
+            - packed_output / packed_output_compression: Deliver each processed subfolder as one archive, see utils/archive.py.
+            - stream_queue_size: Copied images waiting for OCR in streaming mode, bounds the local disk use.
+            - watch_mode / watch_settle_seconds / watch_scan_interval: How the daemon watches LibNas input.
+            - textract_max_tps / textract_min_tps: Bounds of the adaptive Textract rate limiter.
+            - compact_ocr_output / raw_json_output: Which OCR output files are saved for each page.
+            - manifest_enabled: Keep a manifest of each page's stage so re-runs skip completed pages.
+            - log_buffer_size / log_flush_interval: When the background log writer writes the queued lines.
+            - fused_alto: Render ALTO pages from the in-memory Textract response instead of re-reading the JSON.
 
         Returns:
             dict: Dictionary with configuration settings.
@@ -49,14 +62,87 @@ class CoreConfig:
             "rename_failed_text" : "txt",
             "output_extension_json" : ".json",
             "output_extension_text" : ".txt",
+            "output_extension_alto" : ".alto", # Page fragments rendered at OCR time
+            "output_extension_compact" : ".ocr", # Compact OCR pages, see utils/compact.py
             "overwrite_files" : True, # False to skip file overwrite 
             "image_extensions": ('.TIF', '.png', '.jpg', '.jpeg'),
 
+            # Concurrent OCR, 1 processes the images one at a time
+            "ocr_max_workers" : 8, # Number of Textract requests in flight
+            "textract_max_tps" : 10, # Match the account's Textract DetectDocumentText quota
+            "textract_min_tps" : 0.5, # Lowest rate the limiter backs off to when throttled
+            "throttle_max_requeues" : 20, # Throttled images are retried this many times before failing
+
+            # Copying from LibNas, several files are copied at a time so one slow file does not stall the batch
+            "copy_max_workers" : 4,
+            "copy_buffer_size" : 8 * 1024 ** 2, # Bytes read and written at a time
+            "copy_retries" : 3, # Attempts per file before it is logged as failed
+            "copy_retry_delay" : 5, # Seconds, multiplied by the attempt number
+            "copy_timeout" : 600, # Seconds a copy attempt may take, an attempt stuck in a read is abandoned and retried
+            "copy_checksum" : True, # SHA-256 the file while it is copied, recorded in the manifest
+            "delta_sync" : True, # Only copy new or changed images, compared with the manifest (or the input folder copy) by size and modification time
+            "delta_sync_hash" : True, # When only the modification time changed, compare the content hash before copying
+            "direct_read" : False, # OCR images straight from LibNas input, only a small stub is written to the input folder
+            "direct_read_copy_masters" : True, # Copy the images to the delivered output in direct-read mode, False to deliver OCR output and ALTO only
+
+            # Delivery to LibNas, each folder is copied to a temporary name, verified and renamed into place
+            "delivery_max_workers" : 4, # Folders delivered at the same time
+            "delivery_retries" : 3, # Attempts per folder before it is left in the processed folder
+            "delivery_retry_delay" : 10, # Seconds, multiplied by the attempt number
+            "packed_output" : False, # True packs each processed subfolder (ALTO XML, json, jpg, txt) into one tar file with an index
+            "packed_output_compression" : "none", # "none" or "zstd" (needs the zstandard package)
+            "packed_output_zstd_level" : 3,
+
+            # Streaming mode (python main.py --stream), copied images wait here for OCR, copying pauses when it is full
+            "stream_queue_size" : 64,
+
+            # Daemon mode (python main.py --daemon), LibNas input is watched for new folders
+            "watch_mode" : "auto", # "inotify", "scan", or "auto" to scan only on network mounts
+            "watch_settle_seconds" : 60, # A folder is processed once it has not changed for this long
+            "watch_scan_interval" : 30, # Seconds between scans when inotify is not used
+
+            # Local cache of Textract responses keyed by image hash, skips paying Textract twice for a page
+            "ocr_cache_enabled" : True,
+            "ocr_cache_max_bytes" : 2 * 1024 ** 3, # Least recently used responses are evicted above this size
+
+            # Images are transcoded / downscaled in memory only when needed to fit the Textract limits
+            "textract_max_bytes" : 10 * 1024 ** 2, # Synchronous Textract limit on document bytes
+            "textract_max_side" : 10000, # Maximum width or height in pixels
+            "preprocess_max_pixels" : 40_000_000, # Larger images are downscaled before upload
+            "preprocess_format" : "JPEG", # Format TIFF masters are transcoded to, "JPEG" or "PNG"
+            "preprocess_jpeg_quality" : 90,
+            "source_max_pixels" : 1_000_000_000, # Pillow's decompression bomb limit is raised to this for archival masters
+
+            # Tiled OCR for scans that would otherwise be downscaled (newspapers, maps)
+            "ocr_tiling_enabled" : False,
+            "tile_size" : 4000, # Tile side in pixels of the original image
+            "tile_overlap" : 200, # Pixels shared by neighbouring tiles, larger than a text line
+
+            # ALTO XML output
+            "alto_pretty_print" : True, # False writes the ALTO XML without indentation
+            "alto_max_workers" : 1, # Processes rendering ALTO pages, 1 renders in the main process, 0 uses every CPU core
+            "fused_alto" : False, # True renders the ALTO page during OCR and writes the JSON in the background
+
+            # OCR output files, ALTO is generated from the compact page when there is one
+            "compact_ocr_output" : True, # Save the text, confidence and geometry ALTO needs in the compact format
+            "compact_ocr_gzip" : True, # Gzip the compact pages
+            "raw_json_output" : True, # Also archive the full Textract response as JSON
+            "pretty_json" : False, # True indents the JSON output for debugging, about twice the size
+
+            # Manifest of the pages already processed, re-runs only touch new or changed pages
+            "manifest_enabled" : True,
+            "manifest_file_name" : "manifest.sqlite3", # Created in the logs folder
+
+            # Log files are written in batches by a background thread
+            "log_buffer_size" : 64 * 1024, # Bytes of queued lines that are written straight away
+            "log_flush_interval" : 1, # Seconds a line may wait before it is written
+
 
             # Error messages for logging
             "low_confidence_error_message": "Low confidence score error",
             "exception_save_error_message": "Error saving file",
             "ocr_processing_error_message": "OCR processing error",
+            "alto_page_error_message": "Page missing its image or OCR output",
             
         }
 
@@ -69,6 +155,7 @@ class CoreConfig:
             - input_folder: Path for input files, the entry point to the pipeline.
             - core_folders: Base path for core folders, all folders below this exists within the core folder.
             - logs_folder: Path for log files.
+            - ocr_cache_folder: Path for cached Textract responses, kept between runs.
             - json_folder: Path for JSON files.
             - images_folder: Path for image files.
             - json_sorter: Path for sorted JSON files.
@@ -90,6 +177,7 @@ class CoreConfig:
             # core folders below
             "core_folders": root_folder,
             "logs_folder": f"logs",
+            "ocr_cache_folder": "ocr_cache",
             "json_log_path" : f"failed_jobs",
             "text_folder": f"{root_folder}/txt",
             "json_folder": f"{root_folder}/json",
@@ -0,0 +1,91 @@
+import signal
+import traceback
+from datetime import datetime
+from utils.config import CoreConfig
+from utils.log import LogActivities
+from utils.stream import StreamingPipeline
+from utils.watch import InputWatcher
+
+
+class PipelineDaemon:
+    """
+    Keeps the pipeline running: watches LibNas input and streams each new or changed folder through
+    the pipeline once it has stopped changing.
+
+    The stage workers, the Textract client, the rate limiter, the OCR cache, the manifest and the
+    ALTO generator are created once and stay warm between batches. A batch that fails is logged and
+    tried again once its folders have settled again.
+    """
+
+    def __init__(self):
+        """
+        Initialises the PipelineDaemon class with required folder paths and parameters from the config file.
+        """
+        self.core_config = CoreConfig()
+        self.folders = self.core_config.requiredFolders()
+        self.parameters = self.core_config.requiredValues()
+
+        self.logs_folder = self.folders["logs_folder"]
+        self.libnas_input = self.folders["libnas_input"]
+
+        # Logging initailisation has to come after logs folder name
+        self.log_activity = LogActivities(self.logs_folder)
+
+        self.pipeline = StreamingPipeline()
+        self.watcher = InputWatcher(self.libnas_input,
+                    self.parameters["watch_settle_seconds"],
+                    self.parameters["watch_scan_interval"],
+                    self.parameters["watch_mode"])
+        self.running = False
+        self.batches = 0
+        self.failed_batches = 0
+
+    def stop(self, *_) -> None:
+        """Stops the daemon once the current batch is done."""
+        self.running = False
+
+    def run(self, max_batches: int = None) -> None:
+        """
+        Processes folders as they settle until stopped (SIGINT or SIGTERM).
+
+        Args:
+            max_batches (int): Stop after this many batches, runs until stopped if None.
+        """
+        self.running = True
+        if max_batches is None:
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+
+        print(f"Watching {self.libnas_input} ({self.watcher.mode}) ... {datetime.now()}")
+        self.log_activity.processing(f"Watching {self.libnas_input} ({self.watcher.mode}) ... {datetime.now()}")
+
+        try:
+            while self.running:
+                folders = self.watcher.poll()
+                if not folders:
+                    self.watcher.wait()
+                    continue
+
+                print(f"New batch: {folders} ... {datetime.now()}")
+                self.log_activity.processing(f"New batch: {folders} ... {datetime.now()}")
+
+                # A batch that fails is logged and tried again once its folders have settled, the daemon carries on
+                try:
+                    # The clean up of the previous batch may have removed empty working folders
+                    self.core_config.verifyFolders()
+                    self.pipeline.run(folders)
+                    self.watcher.mark_processed(folders)
+                except Exception as e:
+                    self.failed_batches += 1
+                    print(f"Batch {folders} failed, it will be tried again: {e}")
+                    self.log_activity.error(f"Batch {folders} failed, it will be tried again: {e}\n{traceback.format_exc()}")
+                    self.watcher.retry_later(folders)
+
+                self.batches += 1
+                if max_batches is not None and self.batches >= max_batches:
+                    break
+        finally:
+            self.pipeline.close()
+            self.watcher.close()
+            print(f"Daemon stopped after {self.batches} batches, {self.failed_batches} failed ... {datetime.now()}")
+            self.log_activity.processing(f"Daemon stopped after {self.batches} batches, {self.failed_batches} failed ... {datetime.now()}")
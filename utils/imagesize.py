@@ -0,0 +1,131 @@
+import os
+import struct
+import threading
+from PIL import Image
+
+
+class ImageSizeProbe:
+    """
+    Reads image dimensions from the PNG, JPEG and TIFF headers without decoding the image, falling
+    back to Pillow for anything else. Results are cached in memory keyed by (path, size, mtime, frame)
+    so regenerating ALTO for the same images never reads them twice.
+    """
+
+    PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+    # JPEG start of frame markers, they hold the image size
+    JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+    # TIFF ImageWidth and ImageLength tags
+    TIFF_WIDTH_TAG = 256
+    TIFF_HEIGHT_TAG = 257
+
+    _cache = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_size(cls, image_path: str, frame_index: int = None) -> tuple:
+        """
+        Returns the width and height of an image.
+
+        Args:
+            image_path (str): Path to the image.
+            frame_index (int): Frame of a multi-page TIFF, None for the first frame.
+        Returns:
+            tuple: (width, height) in pixels.
+        """
+        stat = os.stat(image_path)
+        key = (os.path.abspath(image_path), stat.st_size, stat.st_mtime_ns, frame_index or 0)
+        with cls._lock:
+            if key in cls._cache:
+                return cls._cache[key]
+
+        size = cls.probe(image_path, frame_index or 0)
+        if size is None:
+            with Image.open(image_path) as img:
+                if frame_index:
+                    img.seek(frame_index)
+                size = img.size
+
+        with cls._lock:
+            cls._cache[key] = size
+        return size
+
+    @classmethod
+    def probe(cls, image_path: str, frame_index: int = 0):
+        """
+        Reads the image size from the file header.
+
+        Args:
+            image_path (str): Path to the image.
+            frame_index (int): Zero-based TIFF frame.
+        Returns:
+            tuple | None: (width, height), or None if the format is not recognised or the header is unusual.
+        """
+        try:
+            with open(image_path, "rb") as f:
+                head = f.read(26)
+                if head.startswith(cls.PNG_SIGNATURE) and head[12:16] == b"IHDR":
+                    return struct.unpack(">II", head[16:24])
+                if head.startswith(b"\xff\xd8"):
+                    return cls._probe_jpeg(f)
+                if head[:4] in (b"II*\x00", b"MM\x00*"):
+                    return cls._probe_tiff(f, "<" if head[:2] == b"II" else ">", frame_index)
+        except (OSError, struct.error):
+            pass
+        return None
+
+    @classmethod
+    def _probe_jpeg(cls, f):
+        f.seek(2)
+        while True:
+            byte = f.read(1)
+            if not byte:
+                return None
+            if byte != b"\xff":
+                continue
+            marker = f.read(1)
+            # Fill bytes before a marker
+            while marker == b"\xff":
+                marker = f.read(1)
+            if not marker:
+                return None
+            marker = marker[0]
+            # Markers without a length field
+            if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+                continue
+            length = struct.unpack(">H", f.read(2))[0]
+            if marker in cls.JPEG_SOF_MARKERS:
+                _, height, width = struct.unpack(">BHH", f.read(5))
+                return width, height
+            f.seek(length - 2, os.SEEK_CUR)
+
+    @classmethod
+    def _probe_tiff(cls, f, byte_order, frame_index):
+        f.seek(4)
+        ifd_offset = struct.unpack(byte_order + "I", f.read(4))[0]
+
+        # Follow the IFD chain to the requested frame
+        for _ in range(frame_index):
+            f.seek(ifd_offset)
+            entry_count = struct.unpack(byte_order + "H", f.read(2))[0]
+            f.seek(ifd_offset + 2 + entry_count * 12)
+            ifd_offset = struct.unpack(byte_order + "I", f.read(4))[0]
+            if not ifd_offset:
+                return None
+
+        f.seek(ifd_offset)
+        entry_count = struct.unpack(byte_order + "H", f.read(2))[0]
+        entries = f.read(entry_count * 12)
+        size = {}
+        for index in range(entry_count):
+            tag, field_type, _, value = struct.unpack(byte_order + "HHI4s", entries[index * 12:index * 12 + 12])
+            if tag in (cls.TIFF_WIDTH_TAG, cls.TIFF_HEIGHT_TAG):
+                # SHORT values sit in the first two bytes of the value field
+                if field_type == 3:
+                    size[tag] = struct.unpack(byte_order + "H", value[:2])[0]
+                elif field_type == 4:
+                    size[tag] = struct.unpack(byte_order + "I", value)[0]
+        if len(size) != 2:
+            return None
+        return size[cls.TIFF_WIDTH_TAG], size[cls.TIFF_HEIGHT_TAG]
@@ -1,11 +1,15 @@
 import os
 import json
 import shutil
+import threading
 from datetime import datetime
 from utils.config import CoreConfig
 
 
 class JsonLogger():
+
+    # The log file is read, updated and rewritten, so concurrent OCR workers take turns
+    _lock = threading.Lock()
    
     def __init__(self):
         """
@@ -21,6 +25,12 @@ class JsonLogger():
     def log_error_as_json(self, error_message: str, split_file_name: str) -> None:
         json_log_file = os.path.join(self.json_log_path, "failed_jobs_log.json")
         current_date = datetime.now().strftime("%Y-%m-%d")
+
+        with self._lock:
+            self._update_log(json_log_file, current_date, error_message, split_file_name)
+
+    @staticmethod
+    def _update_log(json_log_file: str, current_date: str, error_message: str, split_file_name: str) -> None:
         log_data = {}
 
         # Check if the log file exists; if yes, load the existing data
@@ -1,8 +1,17 @@
 import os 
+import time
 import shutil
+import hashlib
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from utils.config import CoreConfig
 from utils.log import LogActivities
+from utils.atomic import atomic_write, TEMP_SUFFIX
+from utils.manifest import ProcessingManifest
+from utils.reference import ImageReference
+from utils.archive import PackedArchive
+from utils.check import CheckEmptyFolder
 
 class LibNas:
     """
@@ -23,11 +32,21 @@ class LibNas:
     Methods:
         move_and_override(dst_dir):
             Removes the destination directory if it exists.
-        copy_from_libnas() -> None:
-            Copies directories from LibNas input to the local destination folder.
-        send_to_libnas() -> None:
-            Moves processed directories from local processed folder to LibNas output.
+        copy_from_libnas() -> dict:
+            Copies directories from LibNas input to the local destination folder, copy_max_workers files at a time.
+        copy_image(root, filename) -> str:
+            Copies one image from LibNas input to the local input folder.
+        copy_file(src_file, dest_file) -> tuple:
+            Copies a file with large buffers, retrying on errors and timeouts.
+        send_to_libnas() -> dict:
+            Delivers processed directories to LibNas output, delivery_max_workers folders at a time.
+        deliver_folder(src_dir) -> dict:
+            Copies one processed directory to a temporary name in LibNas output, verifies it and renames it into place.
     """
+
+
+    # Suffix of the hidden folders deliveries are copied to before they are renamed into place
+    DELIVERY_SUFFIX = ".delivering"
      
     def __init__(self):
         core_config = CoreConfig()
@@ -43,8 +62,33 @@ class LibNas:
         self.processed_folder = self.folders['processed_folder']
         self.overwrite_files = self.parameters['overwrite_files']
         self.image_extensions = self.parameters['image_extensions']
+        self.copy_max_workers = max(1, self.parameters['copy_max_workers'])
+        self.copy_buffer_size = self.parameters['copy_buffer_size']
+        self.copy_retries = max(1, self.parameters['copy_retries'])
+        self.copy_retry_delay = self.parameters['copy_retry_delay']
+        self.copy_timeout = self.parameters['copy_timeout']
+        self.copy_checksum = self.parameters['copy_checksum']
+        self.delta_sync = self.parameters['delta_sync']
+        self.delta_sync_hash = self.parameters['delta_sync_hash']
+        self.direct_read = self.parameters['direct_read']
+        self.direct_read_copy_masters = self.parameters['direct_read_copy_masters']
+        self.delivery_max_workers = max(1, self.parameters['delivery_max_workers'])
+        self.delivery_retries = max(1, self.parameters['delivery_retries'])
+        self.delivery_retry_delay = self.parameters['delivery_retry_delay']
+        # The abandoned flag of the copy attempt running on the current thread
+        self.copy_attempt = threading.local()
+
         self.log_activity = LogActivities(self.logs_folder)
 
+        # Files and bytes copied by the current batch, updated by every copy thread
+        self.copy_stats_lock = threading.Lock()
+        self.copy_stats = {}
+
+        # Pages already copied are not copied again unless they changed on LibNas
+        self.manifest = None
+        if self.parameters['manifest_enabled']:
+            self.manifest = ProcessingManifest(os.path.join(self.logs_folder, self.parameters['manifest_file_name']))
+
     @staticmethod
     def move_and_override(dest_file) -> None:
         """
@@ -60,75 +104,466 @@ class LibNas:
                 os.remove(dest_file)  # Remove the file
 
 
-    def copy_from_libnas(self) -> None:
+    def libnas_images(self, folders: list = None) -> list:
         """
-        Copies directories from LibNas input to the local destination folder.
-        Handles potential conflicts by removing existing directories at the destination.
+        Lists the images in LibNas input.
+
+        Args:
+            folders (list): Only list the images in these folders of LibNas input, all of it if None.
+        Returns:
+            list: (root, filename) of every image, in walk order.
         """
-        entry_folder = self.libnas_input
-        exit_folder = self.destination_root
-        try:
+        roots = [self.libnas_input] if folders is None else [os.path.join(self.libnas_input, folder) for folder in folders]
+        images = []
+        for entry_folder in roots:
             for root, _, files in os.walk(entry_folder):
-                    for filename in files:
-                        _, extension = os.path.splitext(filename)
-                        if extension in self.image_extensions:
-                            src_file = os.path.join(root, filename)
-                            parent_dir = os.path.basename(root)
-                            dest_dir = os.path.join(exit_folder, parent_dir)
-                            
-                            # Avoid creating root directory for individual images without directories
-                            if os.path.basename(dest_dir) != os.path.basename(entry_folder):
-                                # Create the destination directory if it does not already exist
-                                os.makedirs(dest_dir, exist_ok=True)
-                                dest_file = os.path.join(dest_dir, filename)
-                            else:
-                                dest_dir = exit_folder
-                                dest_file = os.path.join(dest_dir, filename)
-
-                            if os.path.exists(dest_file):
-                                if self.overwrite_files:
-                                    shutil.copy(src_file, dest_dir)
-                                    self.log_activity.overwrite(f"File {filename} was overwritten input folder: {dest_dir}")    
-                                else:
-                                    # raise FileExistsError(f"File {dest_file} already exists. Aborting copy, overwrite turned off.")
-                                    self.log_activity.overwrite(f"File {filename} already exist in pipeline input folder, (overwrite turned off): {dest_dir}")   
-                            else:
-                                shutil.copy(src_file, dest_dir)
+                for filename in files:
+                    _, extension = os.path.splitext(filename)
+                    if extension in self.image_extensions:
+                        images.append((root, filename))
+        return images
+
+    def input_destination(self, root: str) -> str:
+        """Returns the input folder an image found in a LibNas input directory is copied to."""
+        dest_dir = os.path.join(self.destination_root, os.path.basename(root))
+
+        # Avoid creating root directory for individual images without directories
+        if os.path.basename(dest_dir) == os.path.basename(self.libnas_input):
+            return self.destination_root
+        return dest_dir
 
+    def copy_image(self, root: str, filename: str) -> str:
+        """
+        Copies one image from LibNas input to the local input folder. In direct-read mode a stub
+        referring to the image is written instead.
+
+        Args:
+            root (str): The LibNas input directory containing the image.
+            filename (str): The image file name.
+        Returns:
+            str: The path of the image in the input folder.
+        """
+        src_file = os.path.join(root, filename)
+        dest_dir = self.input_destination(root)
+
+        # Create the destination directory if it does not already exist
+        os.makedirs(dest_dir, exist_ok=True)
+        dest_file = os.path.join(dest_dir, filename)
+
+        if self.is_already_copied(src_file, dest_file):
+            self.log_activity.processing(f"File {filename} unchanged since the last run, skipped")
+            self.count_copy("skipped", os.stat(src_file).st_size)
+            return dest_file
+
+        if os.path.exists(dest_file):
+            # With delta sync a page that changed on LibNas replaces its old copy even with overwrite turned off
+            if self.overwrite_files or self.is_changed(src_file, dest_file):
+                self.copy_and_record(src_file, dest_file)
+                self.log_activity.overwrite(f"File {filename} was overwritten input folder: {dest_dir}")    
+            else:
+                # raise FileExistsError(f"File {dest_file} already exists. Aborting copy, overwrite turned off.")
+                self.log_activity.overwrite(f"File {filename} already exist in pipeline input folder, (overwrite turned off): {dest_dir}")   
+        else:
+            self.copy_and_record(src_file, dest_file)
+        return dest_file
+
+    def try_copy_image(self, root: str, filename: str):
+        """
+        Copies one image, logging a failure instead of raising so the rest of the batch carries on.
+
+        Returns:
+            str | None: The path of the image in the input folder, None if the copy failed.
+        """
+        try:
+            return self.copy_image(root, filename)
         except Exception as e:
-            self.log_activity.error(f"File {filename} failed -  {e}")   
+            self.count_copy("failed")
+            self.log_activity.error(f"File {filename} failed -  {e}")
+            return None
+
+    def copy_and_record(self, src_file: str, dest_file: str) -> None:
+        """Copies an image, records it in the manifest and adds it to the batch's statistics."""
+        if self.direct_read:
+            # Only a stub is written, OCR reads the image from LibNas
+            ImageReference.write(dest_file, src_file)
+            if self.manifest is not None:
+                self.manifest.record(src_file, "copied", location=dest_file)
+            self.count_copy("referenced")
+            return
+
+        size, sha256 = self.copy_file(src_file, dest_file)
+        self.record_copy(src_file, dest_file, sha256)
+        self.count_copy("copied", size)
+
+    def copy_file(self, src_file: str, dest_file: str) -> tuple:
+        """
+        Copies a file through a temporary file, so an interrupted copy never leaves a partial image
+        in the input folder. A failed or timed out copy is tried again, copy_retries times in total.
+
+        Args:
+            src_file (str): The file on LibNas.
+            dest_file (str): The path of the copy.
+        Returns:
+            tuple: (bytes copied, SHA-256 of the copy or None if copy_checksum is off)
+        Raises:
+            OSError: If the last attempt failed.
+        """
+        for attempt in range(1, self.copy_retries + 1):
+            try:
+                return self.copy_with_timeout(src_file, dest_file)
+            except OSError as e:
+                if attempt == self.copy_retries:
+                    raise
+                self.log_activity.error(f"Copying {src_file} failed ({attempt}/{self.copy_retries}), retrying: {e}")
+                time.sleep(self.copy_retry_delay * attempt)
+
+    def copy_with_timeout(self, src_file: str, dest_file: str) -> tuple:
+        """
+        Runs one copy attempt on its own thread and gives up on it after copy_timeout seconds, so
+        a read that hangs on the network share fails the attempt instead of blocking forever. The
+        abandoned attempt stops at its next read and never replaces the file.
+
+        Raises:
+            TimeoutError: If the attempt took longer than copy_timeout.
+        """
+        abandoned = threading.Event()
+        result = {}
+
+        def attempt():
+            self.copy_attempt.abandoned = abandoned
+            try:
+                result["copy"] = self.copy_file_once(src_file, dest_file)
+            except BaseException as e:
+                result["error"] = e
+
+        # A daemon thread, a read that never returns does not keep the pipeline from exiting
+        thread = threading.Thread(target=attempt, name="libnas-copy-attempt", daemon=True)
+        thread.start()
+        thread.join(self.copy_timeout)
+        if thread.is_alive():
+            abandoned.set()
+            raise TimeoutError(f"Copying {src_file} took longer than {self.copy_timeout} seconds")
+        if "error" in result:
+            raise result["error"]
+        return result["copy"]
+
+    def copy_file_once(self, src_file: str, dest_file: str) -> tuple:
+        """
+        Copies a file in copy_buffer_size chunks, hashing each chunk as it goes so the content is
+        only read once. The copy fails if it comes up short or its attempt was abandoned.
+        """
+        digest = hashlib.sha256() if self.copy_checksum else None
+        buffer = bytearray(self.copy_buffer_size)
+        view = memoryview(buffer)
+        abandoned = getattr(self.copy_attempt, "abandoned", None)
+        copied = 0
+
+        # Each attempt writes its own temporary file, an abandoned attempt may still be writing its own
+        with open(src_file, "rb", buffering=0) as src, atomic_write(dest_file, "wb", suffix=f".{threading.get_ident()}{TEMP_SUFFIX}") as dest:
+            src_stat = os.fstat(src.fileno())
+            expected = src_stat.st_size
+            while True:
+                length = src.readinto(buffer)
+                if abandoned is not None and abandoned.is_set():
+                    raise TimeoutError(f"Copying {src_file} took longer than {self.copy_timeout} seconds")
+                if not length:
+                    break
+                dest.write(view[:length])
+                if digest is not None:
+                    digest.update(view[:length])
+                copied += length
+            if copied != expected:
+                raise OSError(f"Copied {copied} of {expected} bytes of {src_file}")
+
+        # The copy keeps the modification time of its source, so the two can be compared without reading them
+        os.utime(dest_file, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+        return copied, digest.hexdigest() if digest is not None else None
+
+    def count_copy(self, outcome: str, size: int = 0) -> None:
+        """Adds a file to the statistics of the current batch, the bytes of copied files are counted as bytes."""
+        bytes_key = "bytes" if outcome == "copied" else f"{outcome}_bytes"
+        with self.copy_stats_lock:
+            self.copy_stats[outcome] = self.copy_stats.get(outcome, 0) + 1
+            self.copy_stats[bytes_key] = self.copy_stats.get(bytes_key, 0) + size
+
+    def copy_from_libnas(self) -> dict:
+        """
+        Copies directories from LibNas input to the local destination folder.
+        Handles potential conflicts by removing existing directories at the destination.
+        Up to copy_max_workers files are copied at the same time, so one slow file does not hold up
+        the others, and a file that fails is logged without stopping the rest of the batch.
+
+        Returns:
+            dict: Number of files copied, skipped and failed, bytes copied and skipped, seconds and throughput in MB/s.
+        """
+        self.copy_stats = {}
+        start = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=self.copy_max_workers, thread_name_prefix="libnas-copy") as executor:
+            list(executor.map(lambda image: self.try_copy_image(*image), self.libnas_images()))
+
+        seconds = time.monotonic() - start
+        stats = dict(self.copy_stats, seconds=round(seconds, 1),
+                     mb_per_second=round(self.copy_stats.get("bytes", 0) / 1024 ** 2 / seconds, 1) if seconds else 0.0)
+        print(f"LibNas copy: {stats}")
+        self.log_activity.processing(f"LibNas copy: {stats}")
+        return stats
            
                     
             
-    def send_to_libnas(self) -> None:
+    def is_already_copied(self, src_file: str, dest_file: str) -> bool:
         """
-        Moves processed directories from the local folder to LibNas output.
-        Handles potential conflicts by removing existing directories at the LibNas output.
+        Delta sync: checks whether a page was copied before and has not changed on LibNas since.
+        The size and modification time are compared first, the content hash only decides when the
+        modification time moved but the size did not (and delta_sync_hash is on), so an unchanged
+        page is skipped without reading it.
+
+        The manifest is the snapshot of the last sync. A page that only reached the copied stage is
+        copied again if it is no longer in the input folder. Without the manifest the page is
+        compared with its copy in the input folder.
+
+        Args:
+            src_file (str): The image on LibNas.
+            dest_file (str): The image in the input folder.
+        Returns:
+            bool: True if the copy can be skipped.
         """
+        if not self.delta_sync:
+            return False
 
-        # entry_folder = self.processed_folder
-        # exit_folder = self.destination_root
-        # self.walk_through_folders(entry_folder, exit_folder)
+        if self.manifest is not None:
+            if not self.manifest.is_unchanged(src_file, "copied", self.delta_sync_hash):
+                return False
+            return self.manifest.lookup(src_file)["stage"] != "copied" or os.path.exists(dest_file)
 
-        try:
-            for root, dirs, _ in os.walk(self.processed_folder):
-                for dirname in dirs:
-                    src_dir = os.path.join(root, dirname)
-                   
-                    # THIS MIGHT BE THE LINE CAUSE THE DUPLICATE FILES ERRORS 
-                    # THE SUGGESTION WILL BE TO PASS IT THROUGH A SET 
-                    # AND GET JUST THE UNIQUE VALUES THEN RETURN IT TO A PATH 
+        if not os.path.exists(dest_file):
+            return False
+        reference = ImageReference.read(dest_file)
+        if reference is not None:
+            src_stat = os.stat(src_file)
+            return reference["source"] == os.path.abspath(src_file) and (src_stat.st_size, src_stat.st_mtime_ns) == (reference["size"], reference["mtime_ns"])
+        src_stat, dest_stat = os.stat(src_file), os.stat(dest_file)
+        if src_stat.st_size != dest_stat.st_size:
+            return False
+        if src_stat.st_mtime_ns == dest_stat.st_mtime_ns:
+            return True
+        if self.delta_sync_hash and ProcessingManifest.file_hash(src_file) == ProcessingManifest.file_hash(dest_file):
+            # Touched but not modified, give the copy the new time so the file is not hashed again
+            os.utime(dest_file, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+            return True
+        return False
 
-                    self.move_and_override(self.libnas_output)
-                    shutil.move(src_dir, self.libnas_output)
+    def is_changed(self, src_file: str, dest_file: str) -> bool:
+        """
+        Checks whether a page that delta sync did not skip changed since the last sync: the manifest
+        has a snapshot of it, or without the manifest its copy in the input folder differs.
+        """
+        if not self.delta_sync:
+            return False
+        if self.manifest is not None:
+            return self.manifest.lookup(src_file) is not None
+        return os.path.exists(dest_file)
 
-                    
-        except FileExistsError:
-            print(f"Folder already exist on LibNas or Output destination: {self.libnas_output}")
-            self.log_activity.processing(f"Folder already exist on LibNas or Output destination: {self.libnas_output}")
-        except Exception as e:
-            self.log_activity.error(f"An error occurred while moving to LibNas: {str(e)}")
+    def record_copy(self, src_file: str, dest_file: str, sha256: str = None) -> None:
+        """Records a copied page in the manifest with the hash of the copy, hashing the copy if the hash is not given."""
+        if self.manifest is not None:
+            self.manifest.record(src_file, "copied", sha256=sha256 or ProcessingManifest.file_hash(dest_file), location=dest_file)
+
+    def image_paths(self, folder: str) -> dict:
+        """
+        Returns the images anywhere below a folder, grouped by the folder they are in. The images of a
+        packed archive are listed at the location they would have had in the folder, as the manifest
+        records them.
+        """
+        images = {}
+        for root, _, files in os.walk(folder):
+            for filename in files:
+                if filename.endswith(self.image_extensions):
+                    images.setdefault(root, []).append(os.path.join(root, filename))
+                elif filename.endswith(PackedArchive.INDEX_SUFFIX):
+                    archive = PackedArchive(os.path.join(root, filename[:-len(PackedArchive.INDEX_SUFFIX)]))
+                    for name in archive.names():
+                        if name.endswith(self.image_extensions):
+                            path = os.path.join(root, *name.split("/"))
+                            images.setdefault(os.path.dirname(path), []).append(path)
+        return images
+
+    def send_to_libnas(self) -> dict:
+        """
+        Delivers the processed directories to LibNas output, delivery_max_workers folders at a time.
+        A folder that fails is logged and left in the processed folder for the next run.
 
+        Returns:
+            dict: Number of folders delivered and failed, bytes copied, seconds and throughput in MB/s.
+        """
+        if not os.path.isdir(self.processed_folder):
+            return {}
+
+        # The output root only has to be checked once, not for every folder
+        self.move_and_override(self.libnas_output)
+        os.makedirs(self.libnas_output, exist_ok=True)
+
+        src_dirs = sorted(entry.path for entry in os.scandir(self.processed_folder) if entry.is_dir())
+        start = time.monotonic()
+        results = []
 
+        def deliver(src_dir):
+            try:
+                results.append(self.deliver_folder(src_dir))
+            except Exception as e:
+                results.append({"folder": os.path.basename(src_dir), "failed": True})
+                self.log_activity.error(f"An error occurred while moving to LibNas: {str(e)}")
 
- 
\ No newline at end of file
+        with ThreadPoolExecutor(max_workers=self.delivery_max_workers, thread_name_prefix="libnas-delivery") as executor:
+            list(executor.map(deliver, src_dirs))
+
+        seconds = time.monotonic() - start
+        delivered_bytes = sum(result.get("bytes", 0) for result in results)
+        stats = {
+            "folders": sum(1 for result in results if not result.get("failed")),
+            "failed": sum(1 for result in results if result.get("failed")),
+            "bytes": delivered_bytes,
+            "seconds": round(seconds, 1),
+            "mb_per_second": round(delivered_bytes / 1024 ** 2 / seconds, 1) if seconds else 0.0,
+        }
+        if src_dirs:
+            print(f"LibNas delivery: {stats}")
+            self.log_activity.processing(f"LibNas delivery: {stats}")
+        return stats
+
+    def deliver_folder(self, src_dir: str) -> dict:
+        """
+        Delivers one processed directory to LibNas output and marks its pages delivered.
+
+        The folder is copied to a hidden temporary name next to its destination, checked against the
+        processed folder and only then renamed into place, so the output never shows a half copied
+        folder. A folder that is already in the output (an earlier delivery whose ALTO XML now has
+        more pages) keeps its files that were not delivered again, and the old folder is swapped for
+        the new one. The whole folder is tried again delivery_retries times in total.
+
+        Args:
+            src_dir (str): The directory in the processed folder.
+        Returns:
+            dict: The folder name, bytes copied and seconds taken.
+        Raises:
+            OSError: If the last attempt failed.
+        """
+        name = os.path.basename(src_dir)
+        destination = os.path.join(self.libnas_output, name)
+        staging = os.path.join(self.libnas_output, "." + name + self.DELIVERY_SUFFIX)
+        delivered = self.image_paths(src_dir) if self.manifest is not None else {}
+        start = time.monotonic()
+
+        for attempt in range(1, self.delivery_retries + 1):
+            try:
+                if os.path.exists(staging):
+                    shutil.rmtree(staging)
+                copied = self.stage_folder(src_dir, staging)
+                self.verify_folder(src_dir, staging)
+                self.swap_folder(staging, destination)
+                break
+            except OSError as e:
+                shutil.rmtree(staging, ignore_errors=True)
+                if attempt == self.delivery_retries:
+                    raise
+                self.log_activity.error(f"Delivering {name} failed ({attempt}/{self.delivery_retries}), retrying: {e}")
+                time.sleep(self.delivery_retry_delay * attempt)
+
+        shutil.rmtree(src_dir)
+        # Pages are recorded where they are once clean up has flattened the output
+        for folder, paths in delivered.items():
+            self.manifest.advance(paths, "delivered", CheckEmptyFolder.flattened_path(self.libnas_output, name, os.path.relpath(folder, src_dir)))
+
+        seconds = time.monotonic() - start
+        self.log_activity.processing(f"Delivered {name} to LibNas: {copied} bytes in {seconds:.1f}s")
+        return {"folder": name, "bytes": copied, "seconds": round(seconds, 1)}
+
+    def stage_files(self, src_dir: str):
+        """
+        Yields the files of a processed directory with what has to be copied for each of them. In
+        direct-read mode a stub stands for its image on LibNas input, which is copied from there
+        straight to the output, or left out when direct_read_copy_masters is off.
+
+        Yields:
+            tuple: (relative path, file to copy, expected size)
+        """
+        for root, _, files in os.walk(src_dir):
+            for filename in files:
+                path = os.path.join(root, filename)
+                relative = os.path.relpath(path, src_dir)
+                reference = ImageReference.read(path)
+                if reference is None:
+                    yield relative, path, os.path.getsize(path)
+                elif self.direct_read_copy_masters:
+                    yield relative, reference["source"], reference["size"]
+
+    def stage_folder(self, src_dir: str, staging: str) -> int:
+        """Copies a processed directory to its temporary name in the output, returns the bytes copied."""
+        copied = 0
+        for relative, source, _ in self.stage_files(src_dir):
+            target = os.path.join(staging, relative)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            size, _ = self.copy_file(source, target)
+            copied += size
+        return copied
+
+    def verify_folder(self, src_dir: str, staging: str) -> None:
+        """
+        Checks that every file of a processed directory is in the staged copy with the right size.
+
+        Raises:
+            OSError: If a file is missing or has the wrong size.
+        """
+        for relative, _, size in self.stage_files(src_dir):
+            target = os.path.join(staging, relative)
+            if not os.path.isfile(target) or os.path.getsize(target) != size:
+                raise OSError(f"Delivered copy of {relative} is missing or incomplete in {staging}")
+
+    def swap_folder(self, staging: str, destination: str) -> None:
+        """Renames a staged folder into place, keeping the files of an earlier delivery that were not delivered again."""
+        if not os.path.exists(destination):
+            os.rename(staging, destination)
+            return
+
+        for root, _, files in os.walk(destination):
+            for filename in files:
+                existing = os.path.join(root, filename)
+                target = os.path.join(staging, os.path.relpath(existing, destination))
+                if not os.path.exists(target):
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    try:
+                        os.link(existing, target)
+                    except OSError:
+                        # File systems without hard links get a copy
+                        self.copy_file(existing, target)
+
+        replaced = staging + ".replaced"
+        os.rename(destination, replaced)
+        os.rename(staging, destination)
+        shutil.rmtree(replaced)
+
+    def recover_deliveries(self) -> int:
+        """
+        Cleans up deliveries that were interrupted. A staged folder whose old folder was already
+        swapped out is renamed into place; any other staged folder is removed, its processed folder
+        is still there and is delivered again.
+
+        Returns:
+            int: Number of interrupted deliveries cleaned up.
+        """
+        if not os.path.isdir(self.libnas_output):
+            return 0
+        recovered = 0
+        for entry in os.scandir(self.libnas_output):
+            if not (entry.is_dir() and entry.name.startswith(".") and entry.name.endswith(self.DELIVERY_SUFFIX)):
+                continue
+            destination = os.path.join(self.libnas_output, entry.name[1:-len(self.DELIVERY_SUFFIX)])
+            replaced = entry.path + ".replaced"
+            if os.path.exists(replaced) and not os.path.exists(destination):
+                os.rename(entry.path, destination)
+            else:
+                shutil.rmtree(entry.path)
+            shutil.rmtree(replaced, ignore_errors=True)
+            recovered += 1
+            self.log_activity.processing(f"Resume: cleaned up the interrupted delivery of {destination}")
+        return recovered
@@ -1,8 +1,125 @@
+import os
+import sys
+import time
+import queue
+import atexit
+import threading
+import multiprocessing.util
 from datetime import datetime
+from utils.config import CoreConfig
+
+
+class LogWriter:
+    """
+    The process-wide writer behind every LogActivities. Log lines are queued by the calling thread
+    and appended by one background thread, which batches them per log file and writes each batch
+    with a single append, so lines from concurrent threads and processes are never interleaved.
+
+    The queued lines are written once log_buffer_size bytes are waiting, every log_flush_interval
+    seconds, on flush() and when the process exits. A forked worker process gets its own writer.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        """Returns the writer of the current process, started on first use."""
+        with cls._instance_lock:
+            if cls._instance is None or cls._instance.pid != os.getpid():
+                parameters = CoreConfig().requiredValues()
+                cls._instance = cls(parameters["log_buffer_size"], parameters["log_flush_interval"])
+            return cls._instance
+
+    def __init__(self, buffer_size: int, flush_interval: float):
+        """
+        Starts the background writer thread.
+
+        Args:
+            buffer_size (int): Bytes of queued lines that trigger a write.
+            flush_interval (float): Seconds a line may wait before it is written.
+        """
+        self.pid = os.getpid()
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        # Items are (log file, line), an Event to flush and signal, or None to stop
+        self.queue = queue.SimpleQueue()
+        self.closed = False
+
+        self.thread = threading.Thread(target=self.run, name="log-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+        # Worker processes skip atexit, multiprocessing runs its finalizers instead
+        multiprocessing.util.Finalize(self, self.close, exitpriority=10)
+
+    def write(self, log_file_path: str, line: str) -> None:
+        """Queues a line to be appended to a log file."""
+        self.queue.put((log_file_path, line))
+
+    def flush(self) -> None:
+        """Writes every line queued so far and waits until they are on disk."""
+        if self.closed or self.pid != os.getpid():
+            return
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait()
+
+    def close(self) -> None:
+        """Writes the queued lines and stops the writer thread."""
+        if self.closed or self.pid != os.getpid():
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+
+    def run(self) -> None:
+        """Collects queued lines per log file and appends them in batches."""
+        pending = {}
+        pending_bytes = 0
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+
+            if isinstance(item, tuple):
+                log_file_path, line = item
+                pending.setdefault(log_file_path, []).append(line)
+                pending_bytes += len(line)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if pending_bytes < self.buffer_size:
+                    continue
+
+            self.write_pending(pending)
+            pending, pending_bytes, deadline = {}, 0, None
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                return
+
+    @staticmethod
+    def write_pending(pending: dict) -> None:
+        """Appends the lines of each log file with one write."""
+        for log_file_path, lines in pending.items():
+            try:
+                fd = os.open(log_file_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, "".join(lines).encode("UTF-8"))
+                finally:
+                    os.close(fd)
+            except Exception as e:
+                print(f"{datetime.now()} - Error logging {len(lines)} lines to {log_file_path}: {e}", file=sys.stderr)
+
 
 class LogActivities:
     """
     A class to handle logging of activities related to file processing.
+
+    Lines are written by the process-wide LogWriter in the background, call flush() to have them
+    on disk straight away.
     """    
 
     def __init__(self, logs_folder: str):
@@ -11,6 +128,11 @@ class LogActivities:
         """
         self.logs_folder = logs_folder.rstrip('/')  # Ensure no trailing slash
 
+    @staticmethod
+    def flush() -> None:
+        """Writes every log line queued so far."""
+        LogWriter.instance().flush()
+
     def confidence(self, input_file: str, average_confidence: float) -> None:
         """
         Logs the average confidence score
@@ -22,11 +144,7 @@ class LogActivities:
             None
         """
         log_file_path = f"{self.logs_folder}/avg_confidence_score.log"
-        try:
-            with open(log_file_path, "a", encoding="UTF-8") as f:
-                f.write(f"{datetime.now()} - {input_file}: {average_confidence}\n")
-        except Exception as e:
-            self.error(f"{datetime.now()} - Error logging confidence score: {e}")
+        LogWriter.instance().write(log_file_path, f"{datetime.now()} - {input_file}: {average_confidence}\n")
 
 
     def sorting(self, message: str) -> None:
@@ -39,11 +157,7 @@ class LogActivities:
             None
         """
         log_file_path = f"{self.logs_folder}/sorting.log"
-        try:
-            with open(log_file_path, "a", encoding="UTF-8") as f:
-                f.write(f"{datetime.now()} - {message} \n")
-        except Exception as e:
-            self.error(f"{datetime.now()} - Error logging sorting activities: {e}")
+        self.messageLogging(log_file_path, message)
 
 
     def error(self, message: str) -> None:
@@ -84,9 +198,5 @@ class LogActivities:
     
     @staticmethod
     def messageLogging(log_file_path, message):
-        try:
-            with open(log_file_path, "a", encoding="UTF-8") as f:
-                f.write(f"{datetime.now()} - {message} \n")
-        except Exception as e:
-            with open(log_file_path, "a", encoding="UTF-8") as f:
-                f.write(f"{datetime.now()} - Error logging error message: {e} \n")
\ No newline at end of file
+        # The time is taken now, the line is written by the background writer
+        LogWriter.instance().write(log_file_path, f"{datetime.now()} - {message} \n")
@@ -0,0 +1,202 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+
+
+class ProcessingManifest:
+    """
+    A persistent record of every page that went through the pipeline, kept in SQLite.
+
+    A page is keyed by its source path and remembers the source's size, modification time and
+    SHA-256, so a re-run can tell new or changed pages from pages already done. The later stages
+    only see the image in the working folders, so each page also records where its image is now
+    (its location); stages are advanced by location and the location follows every move. Images
+    with the same file name in different folders therefore never share a stage.
+
+    Stages, in order: copied, ocr, sorted, alto, delivered. A page moved to failed_jobs is marked
+    failed and is picked up again by the next run.
+    """
+
+    STAGES = ("failed", "copied", "ocr", "sorted", "alto", "delivered")
+
+    # Bytes read at a time when hashing
+    HASH_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, manifest_file: str):
+        """
+        Opens the manifest, creating it if needed.
+
+        Args:
+            manifest_file (str): Path to the SQLite database.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(manifest_file)), exist_ok=True)
+        self.manifest_file = manifest_file
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(manifest_file, timeout=30, check_same_thread=False, isolation_level=None)
+        self._connection.row_factory = sqlite3.Row
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    source TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    size INTEGER,
+                    mtime_ns INTEGER,
+                    sha256 TEXT,
+                    stage TEXT NOT NULL,
+                    updated TEXT NOT NULL
+                )""")
+            # Manifests written before locations were recorded get the column, their pages are found again once re-copied
+            columns = [row["name"] for row in self._connection.execute("PRAGMA table_info(pages)")]
+            if "location" not in columns:
+                self._connection.execute("ALTER TABLE pages ADD COLUMN location TEXT")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS pages_name ON pages (name)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS pages_location ON pages (location)")
+
+    @classmethod
+    def file_hash(cls, file_path: str) -> str:
+        """Returns the SHA-256 hex digest of a file, read in chunks."""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(cls.HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @classmethod
+    def stage_rank(cls, stage: str) -> int:
+        """Returns the position of a stage, failed ranks below every other stage."""
+        return cls.STAGES.index(stage) if stage in cls.STAGES else -1
+
+    def lookup(self, source: str):
+        """
+        Returns the record of a source path.
+
+        Args:
+            source (str): The source path of the page.
+        Returns:
+            dict | None: The record, None if the page was never seen.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT * FROM pages WHERE source = ?", (os.path.abspath(source),)).fetchone()
+        return dict(row) if row else None
+
+    def lookup_location(self, path: str):
+        """Returns the most recently updated record of the image at a path in the working folders, None if there is none."""
+        with self._lock:
+            row = self._connection.execute("SELECT * FROM pages WHERE location = ? ORDER BY updated DESC LIMIT 1",
+                                           (os.path.abspath(path),)).fetchone()
+        return dict(row) if row else None
+
+    def is_unchanged(self, source: str, minimum_stage: str = "copied", use_hash: bool = True) -> bool:
+        """
+        Checks whether a source reached a stage and has not changed since. The size and modification
+        time are compared first; if only the modification time moved the content hash decides.
+
+        Args:
+            source (str): The source path of the page.
+            minimum_stage (str): The stage the page must have reached.
+            use_hash (bool): False to treat any change of modification time as a change.
+        Returns:
+            bool: True if the page can be skipped.
+        """
+        record = self.lookup(source)
+        if record is None or self.stage_rank(record["stage"]) < self.stage_rank(minimum_stage):
+            return False
+
+        stat = os.stat(source)
+        if stat.st_size != record["size"]:
+            return False
+        if stat.st_mtime_ns == record["mtime_ns"]:
+            return True
+
+        if use_hash and record["sha256"] and self.file_hash(source) == record["sha256"]:
+            # Touched but not modified, remember the new time so the file is not hashed again
+            self.record(source, record["stage"], sha256=record["sha256"])
+            return True
+        return False
+
+    def record(self, source: str, stage: str, name: str = None, sha256: str = None, location: str = None) -> None:
+        """
+        Records the stage of a page, with the current size and modification time of its source.
+
+        Args:
+            source (str): The source path of the page.
+            stage (str): The stage the page reached.
+            name (str): The image file name used by the later stages, defaults to the source's file name.
+            sha256 (str): The content hash, kept from the previous record if not given.
+            location (str): Where the image is in the working folders, kept from the previous record if not given.
+        """
+        source = os.path.abspath(source)
+        location = os.path.abspath(location) if location else None
+        stat = os.stat(source)
+        with self._lock:
+            self._connection.execute("""
+                INSERT INTO pages (source, name, size, mtime_ns, sha256, stage, updated, location) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (source) DO UPDATE SET name = excluded.name, size = excluded.size, mtime_ns = excluded.mtime_ns,
+                    sha256 = COALESCE(excluded.sha256, pages.sha256), stage = excluded.stage, updated = excluded.updated,
+                    location = COALESCE(excluded.location, pages.location)
+                """, (source, name or os.path.basename(source), stat.st_size, stat.st_mtime_ns, sha256, stage, datetime.now().isoformat(), location))
+
+    def advance(self, paths, stage: str, destination: str = None) -> None:
+        """
+        Moves pages to a later stage by the path of their image in the working folders. Pages never
+        seen before are not added.
+
+        Args:
+            paths (iterable): The images' paths before they were moved.
+            stage (str): The stage the pages reached, or failed.
+            destination (str): The folder the images were moved to, None if they stay where they are.
+        """
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._connection.executemany("UPDATE pages SET stage = ?, updated = ?, location = ? WHERE location = ?",
+                                         [(stage, now, self.moved_location(path, destination), os.path.abspath(path)) for path in paths])
+
+    def move(self, paths, destination: str) -> None:
+        """Records that images moved to another folder without reaching a new stage."""
+        with self._lock:
+            self._connection.executemany("UPDATE pages SET location = ? WHERE location = ?",
+                                         [(self.moved_location(path, destination), os.path.abspath(path)) for path in paths])
+
+    @staticmethod
+    def moved_location(path: str, destination: str = None) -> str:
+        """Returns the location of an image after it was moved into destination."""
+        if destination is None:
+            return os.path.abspath(path)
+        return os.path.abspath(os.path.join(destination, os.path.basename(path)))
+
+    def reconcile(self, paths, stage: str) -> None:
+        """
+        Sets the stage of images found on disk. An image whose move was interrupted before its new
+        location was recorded is matched by file name, but only if exactly one record of that name
+        points at a file that is no longer there.
+
+        Args:
+            paths (iterable): The images found in a working folder.
+            stage (str): The stage of that folder.
+        """
+        now = datetime.now().isoformat()
+        with self._lock:
+            for path in paths:
+                path = os.path.abspath(path)
+                cursor = self._connection.execute("UPDATE pages SET stage = ?, updated = ? WHERE location = ?", (stage, now, path))
+                if cursor.rowcount:
+                    continue
+                lost = [row["source"] for row in self._connection.execute("SELECT source, location FROM pages WHERE name = ?",
+                                                                          (os.path.basename(path),))
+                        if row["location"] and not os.path.exists(row["location"])]
+                if len(lost) == 1:
+                    self._connection.execute("UPDATE pages SET stage = ?, updated = ?, location = ? WHERE source = ?", (stage, now, path, lost[0]))
+
+    def stats(self) -> dict:
+        """Returns the number of pages at each stage."""
+        with self._lock:
+            rows = self._connection.execute("SELECT stage, COUNT(*) FROM pages GROUP BY stage").fetchall()
+        return {stage: count for stage, count in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,32 @@
+import re
+
+# Output files of a multi-page TIFF frame are named <image name>_p0001, <image name>_p0002, ...
+PAGE_STEM_PATTERN = re.compile(r"^(?P<base>.+)_p(?P<page>\d{4,})$")
+
+
+def page_stem(stem: str, frame_index: int) -> str:
+    """
+    Returns the output file name (without extension) of a TIFF frame.
+
+    Args:
+        stem (str): The image file name without extension.
+        frame_index (int): Zero-based frame index.
+    Returns:
+        str: The stem with the one-based page number appended, e.g. name_p0001.
+    """
+    return f"{stem}_p{frame_index + 1:04d}"
+
+
+def split_page_stem(stem: str) -> tuple:
+    """
+    Splits an output file name (without extension) into the image name and frame index.
+
+    Args:
+        stem (str): The output file name without extension.
+    Returns:
+        tuple: (image name, zero-based frame index), the frame index is None for single page images.
+    """
+    match = PAGE_STEM_PATTERN.match(stem)
+    if not match:
+        return stem, None
+    return match.group("base"), int(match.group("page")) - 1
@@ -0,0 +1,166 @@
+import io
+import math
+from PIL import Image
+
+
+def allow_pixels(max_pixels: int):
+    """
+    Raises Pillow's decompression bomb limit to max_pixels, archival masters regularly exceed the
+    default. The limit is never lowered, and Pillow still refuses images over twice the limit.
+
+    Args:
+        max_pixels (int): Pixel count of the largest image the pipeline opens.
+    """
+    if Image.MAX_IMAGE_PIXELS is not None and Image.MAX_IMAGE_PIXELS < max_pixels:
+        Image.MAX_IMAGE_PIXELS = max_pixels
+
+
+class PreparedImage:
+    """
+    The bytes sent to Textract for one image, with the geometry needed to map results back
+    to the original image.
+
+    Attributes:
+        data (bytes): The bytes to upload.
+        width (int): Width of the original image in pixels.
+        height (int): Height of the original image in pixels.
+        upload_width (int): Width of the uploaded image in pixels.
+        upload_height (int): Height of the uploaded image in pixels.
+        upload_format (str): Pillow format name of the uploaded image.
+    """
+
+    def __init__(self, data: bytes, width: int, height: int, upload_width: int, upload_height: int, upload_format: str):
+        self.data = data
+        self.width = width
+        self.height = height
+        self.upload_width = upload_width
+        self.upload_height = upload_height
+        self.upload_format = upload_format
+
+    @property
+    def scale(self) -> float:
+        """Scale factor between the uploaded and the original image."""
+        return self.upload_width / self.width if self.width else 1.0
+
+    def metadata(self) -> dict:
+        """
+        Returns the geometry recorded alongside the Textract response.
+
+        Returns:
+            dict: Original and uploaded dimensions, scale factor and upload format.
+        """
+        return {
+            "OriginalWidth": self.width,
+            "OriginalHeight": self.height,
+            "UploadWidth": self.upload_width,
+            "UploadHeight": self.upload_height,
+            "ScaleFactor": round(self.scale, 6),
+            "UploadFormat": self.upload_format,
+        }
+
+
+class ImagePreprocessor:
+    """
+    Prepares images in memory before they are sent to Textract.
+
+    JPEG and PNG images within the service limits are uploaded untouched. Anything else (TIFF
+    masters, oversized scans) is transcoded to a compressed JPEG or PNG, and downscaled only when
+    it would not otherwise fit the byte, pixel count and side length limits.
+    """
+
+    # Formats Textract accepts as raw bytes for synchronous calls
+    PASSTHROUGH_FORMATS = ("JPEG", "PNG")
+
+    def __init__(self, max_bytes: int, max_pixels: int, max_side: int, upload_format: str = "JPEG", jpeg_quality: int = 90,
+                 max_source_pixels: int = None):
+        """
+        Initialises the preprocessor with the service limits.
+
+        Args:
+            max_bytes (int): Maximum size of the uploaded bytes.
+            max_pixels (int): Maximum pixel count of the uploaded image.
+            max_side (int): Maximum width or height of the uploaded image.
+            upload_format (str): "JPEG" or "PNG", the format transcoded images are uploaded as.
+            jpeg_quality (int): Starting JPEG quality, lowered before the image is downscaled further.
+            max_source_pixels (int): Pixel count of the largest image opened, None keeps Pillow's limit.
+        """
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.max_side = max_side
+        self.upload_format = upload_format.upper()
+        self.jpeg_quality = jpeg_quality
+        if max_source_pixels is not None:
+            allow_pixels(max_source_pixels)
+
+    def limit_scale(self, width: int, height: int) -> float:
+        """
+        Returns the largest scale factor (at most 1) that fits the pixel count and side length limits.
+
+        Args:
+            width (int): Image width in pixels.
+            height (int): Image height in pixels.
+        Returns:
+            float: Scale factor to apply to both sides.
+        """
+        scale = min(1.0, self.max_side / max(width, height), math.sqrt(self.max_pixels / (width * height)))
+        return scale
+
+    def prepare(self, image_bytes: bytes) -> PreparedImage:
+        """
+        Returns the bytes to send to Textract for an image file.
+
+        Args:
+            image_bytes (bytes): The image file content.
+        Returns:
+            PreparedImage: The upload bytes and the original and uploaded geometry.
+        """
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            return self.prepare_image(img, image_bytes)
+
+    def prepare_image(self, img: Image.Image, image_bytes: bytes = None) -> PreparedImage:
+        """
+        Returns the bytes to send to Textract for an opened image or a single TIFF frame.
+
+        Args:
+            img (Image.Image): The opened image.
+            image_bytes (bytes): The original file content, uploaded as is when it already fits the limits.
+        Returns:
+            PreparedImage: The upload bytes and the original and uploaded geometry.
+        """
+        width, height = img.size
+        scale = self.limit_scale(width, height)
+
+        if (image_bytes is not None and img.format in self.PASSTHROUGH_FORMATS
+                and scale == 1.0 and len(image_bytes) <= self.max_bytes):
+            return PreparedImage(image_bytes, width, height, width, height, img.format)
+
+        # JPEG can be decoded straight at a reduced size, which saves most of the decode time
+        if img.format == "JPEG" and scale < 1.0:
+            img.draft("RGB", (math.ceil(width * scale), math.ceil(height * scale)))
+
+        if img.mode.startswith("I;16") or img.mode in ("I", "F"):
+            # 16 bit greyscale is scaled down to 8 bit, converting it straight to L clips every value above 255 to white
+            img = (img if img.mode in ("I", "F") else img.convert("I")).point(lambda v: v / 256).convert("L")
+        elif img.mode not in ("L", "RGB"):
+            img = img.convert("L" if img.mode == "1" else "RGB")
+
+        quality = self.jpeg_quality
+        while True:
+            target = (max(1, int(width * scale)), max(1, int(height * scale)))
+            resized = img if img.size == target else img.resize(target, Image.Resampling.LANCZOS)
+
+            buffer = io.BytesIO()
+            if self.upload_format == "PNG":
+                resized.save(buffer, format="PNG", compress_level=6)
+            else:
+                resized.save(buffer, format="JPEG", quality=quality, optimize=True)
+            data = buffer.getvalue()
+
+            if len(data) <= self.max_bytes:
+                return PreparedImage(data, width, height, target[0], target[1], self.upload_format)
+
+            # Give up some JPEG quality before giving up resolution
+            if self.upload_format != "PNG" and quality > 70:
+                quality -= 10
+            else:
+                scale *= max(0.5, min(0.9, math.sqrt(self.max_bytes / len(data))))
@@ -0,0 +1,121 @@
+import time
+import threading
+
+
+class ThrottledError(Exception):
+    """
+    Raised when Textract rejects a request because the account's TPS quota was exceeded.
+    The page is still in the input folder and can be sent again.
+    """
+
+
+class AdaptiveRateLimiter:
+    """
+    A token bucket shared by every thread in the process that calls Textract.
+
+    The refill rate adapts with AIMD (additive increase, multiplicative decrease): every throttled
+    call cuts the rate by decrease_factor, every successful call raises it by increase_step, and the
+    rate always stays between min_rate and max_rate requests per second.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_rate: float, min_rate: float = 0.5, increase_step: float = 0.05, decrease_factor: float = 0.5):
+        """
+        Initialises the limiter at max_rate requests per second.
+
+        Args:
+            max_rate (float): Highest rate the limiter recovers to, normally the Textract TPS quota.
+            min_rate (float): Lowest rate the limiter backs off to.
+            increase_step (float): Requests per second added after each successful call.
+            decrease_factor (float): Multiplier applied to the rate after each throttled call.
+        """
+        self.max_rate = float(max_rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+
+        self.rate = self.max_rate
+        self.tokens = 1.0
+        self.last_refill = time.monotonic()
+
+        self.successes = 0
+        self.throttles = 0
+        self.requeues = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, max_rate: float, min_rate: float = 0.5) -> "AdaptiveRateLimiter":
+        """
+        Returns the process-wide limiter, creating it on first use.
+
+        Args:
+            max_rate (float): Highest rate in requests per second, only used when the limiter is created.
+            min_rate (float): Lowest rate in requests per second, only used when the limiter is created.
+        Returns:
+            AdaptiveRateLimiter: The limiter shared by every TextractOCR instance.
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(max_rate, min_rate)
+            return cls._shared
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        # Allow a burst of up to one second's worth of requests
+        self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire(self) -> None:
+        """
+        Blocks until a request may be sent.
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def record_success(self) -> None:
+        """
+        Slowly raises the rate after a successful call.
+        """
+        with self._lock:
+            self.successes += 1
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def record_throttle(self) -> None:
+        """
+        Cuts the rate after a throttled call and drops any saved up burst.
+        """
+        with self._lock:
+            self.throttles += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self.tokens = 0.0
+
+    def record_requeue(self) -> None:
+        """
+        Counts a throttled page that was put back in the queue.
+        """
+        with self._lock:
+            self.requeues += 1
+
+    def stats(self) -> dict:
+        """
+        Returns the current rate and counters, used to tune the Textract quota.
+
+        Returns:
+            dict: Current rate in requests per second and the success, throttle and requeue counts.
+        """
+        with self._lock:
+            return {
+                "rate": round(self.rate, 2),
+                "max_rate": self.max_rate,
+                "successes": self.successes,
+                "throttles": self.throttles,
+                "requeues": self.requeues,
+            }
@@ -0,0 +1,163 @@
+import os
+import shutil
+from utils.config import CoreConfig
+from utils.log import LogActivities
+from utils.sort import SortOCR
+from utils.libnas import LibNas
+from utils.pages import split_page_stem
+from utils.atomic import TEMP_SUFFIX
+from utils.manifest import ProcessingManifest
+
+
+class PipelineRecovery:
+    """
+    Brings the working folders back to a consistent state after the pipeline was stopped part way,
+    so a resumed run continues from the last completed stage of each page instead of moving half
+    processed folders to failed_jobs.
+
+    Every file the pipeline writes is written to a temporary file and renamed, and every page's
+    stage is recorded in the manifest after the files of that stage are in place. Resuming removes
+    the temporary files, finishes the folder moves that were interrupted and reconciles the
+    manifest with what is on disk.
+    """
+
+    def __init__(self):
+        """
+        Initialises the PipelineRecovery class with required folder paths and parameters from the config file.
+        """
+        core_config = CoreConfig()
+        self.folders = core_config.requiredFolders()
+        self.parameters = core_config.requiredValues()
+
+        self.logs_folder = self.folders["logs_folder"]
+        self.input_folder = self.folders["input_folder"]
+        self.json_folder = self.folders["json_folder"]
+        self.text_folder = self.folders["text_folder"]
+        self.images_folder = self.folders["images_folder"]
+        self.json_sorter = self.folders["json_sorter"]
+        self.text_sorter = self.folders["text_sorter"]
+        self.images_sorter = self.folders["images_sorter"]
+        self.processed_folder = self.folders["processed_folder"]
+        self.ocr_cache_folder = self.folders["ocr_cache_folder"]
+
+        self.image_extensions = self.parameters["image_extensions"]
+        self.output_extension_json = self.parameters["output_extension_json"]
+        self.output_extension_compact = self.parameters["output_extension_compact"]
+        self.rename_failed_json = self.parameters["rename_failed_json"]
+        self.rename_failed_image = self.parameters["rename_failed_image"]
+        self.rename_failed_text = self.parameters["rename_failed_text"]
+
+        self.log_activity = LogActivities(self.logs_folder)
+
+        self.manifest = None
+        if self.parameters["manifest_enabled"]:
+            self.manifest = ProcessingManifest(os.path.join(self.logs_folder, self.parameters["manifest_file_name"]))
+
+    def resume(self) -> dict:
+        """
+        Reconciles the working folders and the manifest before a resumed run.
+
+        Returns:
+            dict: Number of temporary files removed, interrupted moves and deliveries finished and images sent back to OCR.
+        """
+        summary = {
+            "temp_files_removed": self.remove_temp_files(),
+            "moves_finished": self.finish_processed_moves(),
+            "deliveries_recovered": LibNas().recover_deliveries(),
+        }
+
+        # Files left in the sorting folders are moved to where the next stage expects them
+        SortOCR().start_sorting()
+
+        summary["images_requeued"] = self.requeue_orphan_images()
+        self.reconcile_manifest()
+
+        print(f"Resume: {summary}")
+        self.log_activity.processing(f"Resume: {summary}")
+        return summary
+
+    def remove_temp_files(self) -> int:
+        """Deletes the temporary files of writes that never completed."""
+        removed = 0
+        for folder in (self.input_folder, self.json_sorter, self.text_sorter, self.images_sorter, self.json_folder,
+                       self.text_folder, self.images_folder, self.processed_folder, self.ocr_cache_folder):
+            for root, _, files in os.walk(folder):
+                for filename in files:
+                    if filename.endswith(TEMP_SUFFIX):
+                        os.remove(os.path.join(root, filename))
+                        removed += 1
+        return removed
+
+    def finish_processed_moves(self) -> int:
+        """
+        Finishes moving the JSON, image and text folders of subfolders whose ALTO XML was written but
+        whose folders were only partly moved to the processed folder.
+        """
+        finished = 0
+        for top_folder in self.subfolders(self.processed_folder):
+            for subfolder in self.subfolders(os.path.join(self.processed_folder, top_folder)):
+                processed_path = os.path.join(self.processed_folder, top_folder, subfolder)
+                moves = [(os.path.join(self.json_folder, top_folder, subfolder), os.path.join(processed_path, self.rename_failed_json)),
+                         (os.path.join(self.images_folder, top_folder, subfolder), os.path.join(processed_path, self.rename_failed_image)),
+                         (os.path.join(self.text_folder, top_folder, subfolder), os.path.join(processed_path, self.rename_failed_text))]
+
+                # Only a move that had started is finished, otherwise the ALTO XML is generated again
+                has_alto = any(f.endswith(".xml") for f in os.listdir(processed_path))
+                if not has_alto or not any(os.path.exists(destination) for _, destination in moves):
+                    continue
+
+                for source, destination in moves:
+                    if os.path.exists(source) and not os.path.exists(destination):
+                        os.rename(source, destination)
+                        finished += 1
+                        self.log_activity.processing(f"Resume: moved {source} to {destination}")
+        return finished
+
+    def requeue_orphan_images(self) -> int:
+        """
+        Sends images that reached the images folder without their OCR output back to the input
+        folder, the OCR cache makes the second OCR free.
+        """
+        requeued = 0
+        for top_folder in self.subfolders(self.images_folder):
+            for subfolder in self.subfolders(os.path.join(self.images_folder, top_folder)):
+                image_subfolder_path = os.path.join(self.images_folder, top_folder, subfolder)
+                json_subfolder_path = os.path.join(self.json_folder, top_folder, subfolder)
+
+                pages = set()
+                if os.path.isdir(json_subfolder_path):
+                    for f in os.listdir(json_subfolder_path):
+                        if f.endswith((self.output_extension_json, self.output_extension_compact)):
+                            stem = os.path.splitext(f)[0]
+                            pages.add(stem)
+                            pages.add(split_page_stem(stem)[0])
+
+                for filename in os.listdir(image_subfolder_path):
+                    if filename.endswith(self.image_extensions) and os.path.splitext(filename)[0] not in pages:
+                        destination = os.path.join(self.input_folder, top_folder)
+                        os.makedirs(destination, exist_ok=True)
+                        shutil.move(os.path.join(image_subfolder_path, filename), os.path.join(destination, filename))
+                        if self.manifest is not None:
+                            self.manifest.advance([os.path.join(image_subfolder_path, filename)], "copied", destination)
+                        requeued += 1
+                        self.log_activity.processing(f"Resume: {filename} has no OCR output, sent back to {destination}")
+
+                if not os.listdir(image_subfolder_path):
+                    os.rmdir(image_subfolder_path)
+        return requeued
+
+    def reconcile_manifest(self) -> None:
+        """Sets the stage of the images found in each folder, the folders are the source of truth."""
+        if self.manifest is None:
+            return
+        for folder, stage in ((self.images_sorter, "ocr"), (self.images_folder, "sorted"), (self.processed_folder, "alto")):
+            paths = [os.path.join(root, filename) for root, _, files in os.walk(folder) for filename in files if filename.endswith(self.image_extensions)]
+            if paths:
+                self.manifest.reconcile(paths, stage)
+
+    @staticmethod
+    def subfolders(folder: str) -> list:
+        """Returns the names of the folders directly inside a folder."""
+        if not os.path.isdir(folder):
+            return []
+        return sorted(entry.name for entry in os.scandir(folder) if entry.is_dir())
@@ -0,0 +1,83 @@
+import os
+import json
+import mmap
+from contextlib import contextmanager
+from utils.atomic import atomic_write
+
+
+class ImageReference:
+    """
+    A small stub file that stands in for an image left on LibNas, used in direct-read mode.
+
+    The stub has the image's file name, so it moves through input, images_sorter, the images folder
+    and the processed folder like the image would, but only the OCR output and the ALTO XML are
+    written locally. Whatever needs the image's content resolves the stub to its source first.
+
+    File layout: MAGIC followed by a JSON object with the source path and the source's size and
+    modification time when the stub was written.
+    """
+
+    MAGIC = b"OCRPIPELINE-REF1\n"
+
+    # A stub is never larger than this, larger files are not read to check
+    MAX_SIZE = 64 * 1024
+
+    @classmethod
+    def write(cls, stub_path: str, source_path: str) -> None:
+        """
+        Writes a stub for an image.
+
+        Args:
+            stub_path (str): The path of the stub, where the image would have been copied.
+            source_path (str): The image on LibNas.
+        """
+        stat = os.stat(source_path)
+        reference = {"source": os.path.abspath(source_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        with atomic_write(stub_path, "wb") as f:
+            f.write(cls.MAGIC + json.dumps(reference).encode("utf-8"))
+
+    @classmethod
+    def read(cls, path: str):
+        """
+        Reads a stub.
+
+        Args:
+            path (str): Any file.
+        Returns:
+            dict | None: The reference, None if the file is not a stub.
+        """
+        try:
+            if os.path.getsize(path) > cls.MAX_SIZE:
+                return None
+            with open(path, "rb") as f:
+                if f.read(len(cls.MAGIC)) != cls.MAGIC:
+                    return None
+                data = f.read()
+        except OSError:
+            return None
+        return json.loads(data.decode("utf-8"))
+
+    @classmethod
+    def resolve(cls, path: str) -> str:
+        """Returns the source of a stub, or the path itself if it is a real file."""
+        reference = cls.read(path)
+        return reference["source"] if reference else path
+
+    @classmethod
+    @contextmanager
+    def open_bytes(cls, path: str):
+        """
+        Maps an image, or the source of a stub, into memory read only, so it is hashed and decoded
+        without reading it into a second buffer first.
+
+        Args:
+            path (str): The image or stub.
+        Yields:
+            mmap.mmap | bytes: The image content, bytes for an empty file.
+        """
+        with open(cls.resolve(path), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield b""
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                yield content
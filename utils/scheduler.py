@@ -0,0 +1,116 @@
+import os
+from datetime import datetime
+from utils.config import CoreConfig
+from utils.log import LogActivities
+from utils.sort import SortOCR
+from utils.libnas import LibNas
+from utils.client import TextractOCR
+from utils.alto import AltoGenerator
+from utils.check import CheckEmptyFolder
+
+
+class PipelineScheduler:
+    """
+    Runs the pipeline stages one after the other: copy from LibNas, OCR, sorting, ALTO XML generation,
+    delivery to LibNas and clean up.
+
+    Once sorting is done every folder in the json folder is ready, so all of them are dispatched for
+    ALTO generation straight away. A folder that fails is reported in the results and the other
+    folders carry on.
+    """
+
+    def __init__(self):
+        """
+        Initialises the PipelineScheduler class with required folder paths from the config file.
+        """
+        core_config = CoreConfig()
+        self.folders = core_config.requiredFolders()
+
+        self.logs_folder = self.folders["logs_folder"]
+        self.input_folder = self.folders["input_folder"]
+        self.json_folder = self.folders["json_folder"]
+
+        # Logging initailisation has to come after logs folder name
+        self.log_activity = LogActivities(self.logs_folder)
+
+    def ready_folders(self) -> list:
+        """
+        Returns the top folders in the json folder, each of them is ready for ALTO generation.
+
+        Returns:
+            list: Folder names in the order AltoGenerator used to pick them.
+        """
+        if not os.path.isdir(self.json_folder):
+            return []
+        return sorted((entry.name for entry in os.scandir(self.json_folder) if entry.is_dir() and entry.name != '.keep'), reverse=True)
+
+    def generate_alto(self, alto_generator: AltoGenerator = None) -> list:
+        """
+        Generates the ALTO XML of every ready folder.
+
+        Args:
+            alto_generator (AltoGenerator): The generator to use, a new one if None.
+        Returns:
+            list: The result of each folder, as returned by AltoGenerator.generate_folder.
+        """
+        folders = self.ready_folders()
+        if not folders:
+            self.log_activity.error(f'The Pipeline failed to run, because the JSON / Images folder is empty ... {datetime.now()} ')
+            return []
+
+        print(f"Generating ALTO XML for {len(folders)} folders ... {datetime.now()}")
+        self.log_activity.processing(f"Generating ALTO XML for {len(folders)} folders ... {datetime.now()}")
+
+        if alto_generator is None:
+            alto_generator = AltoGenerator(run=False)
+        results = []
+        for folder in folders:
+            result = alto_generator.generate_folder(folder)
+            results.append(result)
+            if result["status"] == "failed":
+                print(f"ALTO generation failed for {folder}: {result['error']}")
+            if result["quarantined"]:
+                self.log_activity.processing(f"{folder}: {len(result['quarantined'])} pages quarantined")
+
+        failed = [result["folder"] for result in results if result["status"] == "failed"]
+        print(f"ALTO XML generated for {len(results) - len(failed)} of {len(results)} folders")
+        self.log_activity.processing(f"ALTO XML generated for {len(results) - len(failed)} of {len(results)} folders, failed: {failed}")
+        return results
+
+    def run(self) -> list:
+        """
+        Runs every stage of the pipeline once.
+
+        Returns:
+            list: The ALTO generation result of each folder.
+        """
+        # Get required folders and files from libnas
+        LibNas().copy_from_libnas()
+        return self.process_input()
+
+    def process_input(self) -> list:
+        """
+        Runs OCR, sorting, ALTO XML generation, delivery and clean up on the images in the input folder.
+
+        Returns:
+            list: The ALTO generation result of each folder.
+        """
+        TextractOCR().select_image(self.input_folder)
+        SortOCR().start_sorting()
+
+        results = self.generate_alto()
+
+        # Return processed files to libNas
+        LibNas().send_to_libnas()
+        self.clean_up()
+        return results
+
+    @staticmethod
+    def clean_up() -> None:
+        """Removes the empty folders left in the core, input and output folders."""
+        check = CheckEmptyFolder()
+
+        # Clean up core folders & input folder and output folder along with their respective empty sub directories
+        check.is_core_folder_empty()
+        check.is_input_folder_empty()
+        check.is_output_folder_structured()
@@ -3,6 +3,8 @@ import shutil
 from datetime import datetime
 from utils.config import CoreConfig
 from utils.log import LogActivities
+from utils.manifest import ProcessingManifest
+from utils.pages import split_page_stem
 
 class SortOCR:
     """
@@ -27,10 +29,16 @@ class SortOCR:
         self.image_extensions = self.parameters["image_extensions"]
         self.output_extension_text = self.parameters["output_extension_text"]
         self.output_extension_json = self.parameters["output_extension_json"]
+        self.output_extension_alto = self.parameters["output_extension_alto"]
+        self.output_extension_compact = self.parameters["output_extension_compact"]
 
         # Logging initailisation has to come after logs folder name
         self.log_activity = LogActivities(self.logs_folder)
 
+        self.manifest = None
+        if self.parameters["manifest_enabled"]:
+            self.manifest = ProcessingManifest(os.path.join(self.logs_folder, self.parameters["manifest_file_name"]))
+
     @staticmethod
     def contains_subfolders(folder_path: str) -> bool:
         """
@@ -47,20 +55,23 @@ class SortOCR:
                 return True
         return False
 
-    @staticmethod
-    def regroup_single_Files(extension, directory):
+    def regroup_single_Files(self, extension, directory):
         for entry in os.listdir(directory):
             # Construct the full path
             full_path = os.path.join(directory, entry)
             
             # Check if the entry is a file and ends with .txt
             if os.path.isfile(full_path) and entry.endswith(extension):
-               split_file = entry.rsplit('_') 
+               # Pages of a multi-page TIFF are grouped with the TIFF they came from
+               stem, frame_index = split_page_stem(os.path.splitext(entry)[0])
+               split_file = (stem if frame_index is not None else entry).rsplit('_') 
                folder_name = '_'.join(split_file[:-1])  
                new_full_path = os.path.join(directory, folder_name)
 
                os.makedirs(new_full_path, exist_ok=True)
                shutil.move(full_path, new_full_path)
+               if self.manifest is not None and entry.endswith(self.image_extensions):
+                   self.manifest.move([full_path], new_full_path)
 
 
 
@@ -83,12 +94,29 @@ class SortOCR:
         
         # Get the files under each sub folders    
         for subfolder in subfolders:
-            for file_name in os.listdir(os.path.join(parent_folder_path, subfolder)):
-                if file_name.endswith(file_extention):
-                    self.split_files( parent_folder_path,file_name,subfolder,destination)
-                    
-            # Delete the parent folder from the sorting forlder after processing
-            shutil.rmtree(os.path.join(parent_folder_path,subfolder))
+            self.process_sub_folder(parent_folder_path, subfolder, file_extention, destination)
+
+    def process_sub_folder(self, parent_folder_path: str, subfolder: str, file_extention: str, destination: str) -> None:
+        """
+        Moves the files with a specified extension from one subfolder to a destination, then deletes the subfolder.
+
+        Args:
+            parent_folder_path (str): Path to the parent folder containing the subfolder.
+            subfolder (str): The subfolder to process.
+            file_extension (str): File extension to filter files that should be moved.
+            destination (str): Destination folder where the filtered files will be moved.
+        """
+        for file_name in os.listdir(os.path.join(parent_folder_path, subfolder)):
+            if file_name.endswith(file_extention):
+                self.split_files( parent_folder_path,file_name,subfolder,destination)
+                
+        # Delete the parent folder from the sorting forlder after processing
+        shutil.rmtree(os.path.join(parent_folder_path,subfolder))
+
+    @staticmethod
+    def top_folder_name(subfolder: str) -> str:
+        """Returns the folder in the json, text and images folders that a sorting subfolder is sorted into."""
+        return subfolder.split('-',1)[0].replace(' ','')
     
     def split_files(self, parent_folder_path: str,filename: str,subfolder: str,destination: str) -> None:
         """
@@ -105,7 +133,7 @@ class SortOCR:
         
         original_file_path  = os.path.join(parent_folder_path,subfolder,filename)
         project_folder_name = filename.rsplit('-')[0]  # Split at '-'
-        new_file_folder_path = os.path.join(destination,subfolder.split('-',1)[0].replace(' ',''), project_folder_name) # Split folders name from the left side
+        new_file_folder_path = os.path.join(destination,self.top_folder_name(subfolder), project_folder_name) # Split folders name from the left side
             
         # Create the sub folder in the new destination
         if not os.path.exists(new_file_folder_path):
@@ -128,6 +156,10 @@ class SortOCR:
             
             shutil.move(original_file_path, new_file_folder_path)
 
+            # Images stand for their page in the manifest
+            if self.manifest is not None and filename.endswith(self.image_extensions):
+                self.manifest.advance([original_file_path], "sorted", new_file_folder_path)
+
         except Exception as e:
             self.log_activity.error(f"Error moving file: {e}")
 
@@ -139,9 +171,10 @@ class SortOCR:
         Returns:
             None
         """
+        json_extensions = self.json_extensions()
         if self.contains_subfolders(self.json_sorter_folder):
-            self.regroup_single_Files(self.output_extension_json, self.json_sorter_folder)
-            self.process_sub_folders(self.json_sorter_folder, self.output_extension_json, self.json_folder)
+            self.regroup_single_Files(json_extensions, self.json_sorter_folder)
+            self.process_sub_folders(self.json_sorter_folder, json_extensions, self.json_folder)
 
         if self.contains_subfolders(self.text_sorter_folder):
             self.regroup_single_Files(self.output_extension_text, self.text_sorter_folder)
@@ -149,4 +182,26 @@ class SortOCR:
 
         if self.contains_subfolders(self.images_sorter_folder):
             self.regroup_single_Files(self.image_extensions, self.images_sorter_folder)
-            self.process_sub_folders(self.images_sorter_folder, self.image_extensions, self.images_folder)
\ No newline at end of file
+            self.process_sub_folders(self.images_sorter_folder, self.image_extensions, self.images_folder)
+
+    def json_extensions(self) -> tuple:
+        """Returns the extensions sorted with the JSON files."""
+        # Compact pages and the page fragments of the fused OCR path travel with their JSON files
+        return (self.output_extension_json, self.output_extension_compact, self.output_extension_alto)
+
+    def sort_subfolder(self, subfolder: str) -> str:
+        """
+        Sorts the OCR output, text and images of a single subfolder of the sorting folders, so a
+        folder can move on as soon as its OCR is done while other folders are still in OCR.
+
+        Args:
+            subfolder (str): The subfolder name, the input folder the images were OCR'd from.
+        Returns:
+            str: The folder the files were sorted into.
+        """
+        for sorter_folder, extensions, destination in ((self.json_sorter_folder, self.json_extensions(), self.json_folder),
+                                                       (self.text_sorter_folder, self.output_extension_text, self.text_folder),
+                                                       (self.images_sorter_folder, self.image_extensions, self.images_folder)):
+            if os.path.isdir(os.path.join(sorter_folder, subfolder)):
+                self.process_sub_folder(sorter_folder, subfolder, extensions, destination)
+        return self.top_folder_name(subfolder)
@@ -0,0 +1,303 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from utils.config import CoreConfig
+from utils.log import LogActivities
+from utils.sort import SortOCR
+from utils.libnas import LibNas
+from utils.client import TextractOCR
+from utils.alto import AltoGenerator
+from utils.rate_limit import ThrottledError
+from utils.scheduler import PipelineScheduler
+
+
+class StreamingPipeline:
+    """
+    Runs the pipeline as a stream instead of one stage after the other: images are OCR'd while
+    LibNas is still being copied, each folder is sorted as soon as its last image is OCR'd, and each
+    top folder gets its ALTO XML and is delivered to LibNas as soon as all of its folders are sorted.
+
+    The stages are connected by bounded queues:
+        copy (calling thread) -> OCR workers (ocr_max_workers threads) -> sorting and ALTO (one thread) -> delivery (one thread)
+
+    The stage workers are started by the first run and stay up for the next runs, each run waits for
+    its queues to drain. close() stops them.
+
+    Images are copied copy_max_workers at a time. Copying pauses while stream_queue_size images are
+    waiting for OCR, so the number of images on local disk stays bounded however large the LibNas
+    input is.
+
+    Images at the top of LibNas input (outside any folder) and files left over from an earlier run
+    are picked up by a normal pass over the input folder once the stream is done.
+    """
+
+    def __init__(self):
+        """
+        Initialises the StreamingPipeline class with required folder paths and parameters from the config file.
+        """
+        core_config = CoreConfig()
+        self.folders = core_config.requiredFolders()
+        self.parameters = core_config.requiredValues()
+
+        self.logs_folder = self.folders["logs_folder"]
+        self.input_folder = self.folders["input_folder"]
+        self.json_folder = self.folders["json_folder"]
+        self.processed_folder = self.folders["processed_folder"]
+
+        self.ocr_max_workers = max(1, self.parameters["ocr_max_workers"])
+        self.stream_queue_size = max(1, self.parameters["stream_queue_size"])
+        self.copy_max_workers = max(1, self.parameters["copy_max_workers"])
+
+        # Logging initailisation has to come after logs folder name
+        self.log_activity = LogActivities(self.logs_folder)
+
+        self.libnas = LibNas()
+        self.sort_ocr = SortOCR()
+        self.textract_ocr = TextractOCR()
+        self.alto_generator = AltoGenerator(run=False)
+        self.scheduler = PipelineScheduler()
+
+        # None marks the end of a queue
+        self.ocr_queue = queue.Queue(maxsize=self.stream_queue_size)
+        self.sort_queue = queue.Queue(maxsize=self.stream_queue_size)
+        self.delivery_queue = queue.Queue(maxsize=self.stream_queue_size)
+
+        self.lock = threading.Lock()
+        self.workers = []
+        self.reset()
+
+    def reset(self) -> None:
+        """Clears the state of the previous run, the clients and caches are kept."""
+        # Images of each input subfolder still in OCR, and subfolders of each top folder still to be sorted
+        self.pending_images = {}
+        self.copied_subfolders = set()
+        self.pending_subfolders = {}
+
+        self.results = []
+        self.images_streamed = 0
+        self.folders_delivered = 0
+
+    def run(self, folders: list = None) -> list:
+        """
+        Streams LibNas input through the pipeline.
+
+        Args:
+            folders (list): Only stream these folders of LibNas input, all of it if None.
+        Returns:
+            list: The ALTO generation result of each folder.
+        """
+        self.reset()
+        start = datetime.now()
+        print(f"Streaming pipeline started ... {start}")
+        self.log_activity.processing(f"Streaming pipeline started ... {start}")
+
+        self.start_workers()
+        try:
+            self.copy_images(folders)
+        finally:
+            # Each stage finishes its queue before the next one is waited for, a stage only hands work forward
+            self.ocr_queue.join()
+            self.sort_queue.join()
+            self.delivery_queue.join()
+
+        summary = {"images": self.images_streamed, "folders_delivered": self.folders_delivered,
+                   "seconds": round((datetime.now() - start).total_seconds(), 1)}
+        print(f"Streaming pipeline: {summary}")
+        self.log_activity.processing(f"Streaming pipeline: {summary}")
+
+        # Whatever the stream did not cover goes through one normal pass
+        self.textract_ocr.select_image(self.input_folder)
+        self.sort_ocr.start_sorting()
+        if self.scheduler.ready_folders():
+            self.results.extend(self.scheduler.generate_alto(self.alto_generator))
+        self.libnas.send_to_libnas()
+        self.scheduler.clean_up()
+        return self.results
+
+    def start_workers(self) -> None:
+        """Starts the OCR, sorting and delivery workers, unless an earlier run already did."""
+        if self.workers:
+            return
+        # Daemon threads, a one-off run exits without calling close()
+        self.workers = [threading.Thread(target=self.ocr_worker, name=f"stream-ocr-{index}", daemon=True) for index in range(self.ocr_max_workers)]
+        self.workers.append(threading.Thread(target=self.sort_worker, name="stream-sort", daemon=True))
+        self.workers.append(threading.Thread(target=self.delivery_worker, name="stream-delivery", daemon=True))
+        for worker in self.workers:
+            worker.start()
+
+    def close(self) -> None:
+        """Stops the stage workers once their queues are done."""
+        if not self.workers:
+            return
+        for _ in range(self.ocr_max_workers):
+            self.ocr_queue.put(None)
+        self.sort_queue.put(None)
+        self.delivery_queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+
+    def copy_images(self, folders: list = None) -> None:
+        """
+        Copies the LibNas input one folder at a time, copy_max_workers files at once, and queues each
+        copied image for OCR. Blocks while the OCR queue is full. A file that fails to copy is logged
+        and left out, the rest of its folder carries on.
+
+        Args:
+            folders (list): Only copy these folders of LibNas input, all of it if None.
+        """
+        subfolders = {}
+        for root, filename in self.libnas.libnas_images(folders):
+            subfolders.setdefault(self.libnas.input_destination(root), []).append((root, filename))
+
+        # Every top folder waits for all of its subfolders before its ALTO XML is generated
+        for input_subfolder in subfolders:
+            if input_subfolder != self.input_folder:
+                top_folder = SortOCR.top_folder_name(os.path.basename(input_subfolder))
+                self.pending_subfolders[top_folder] = self.pending_subfolders.get(top_folder, 0) + 1
+
+        self.libnas.copy_stats = {}
+        with ThreadPoolExecutor(max_workers=self.copy_max_workers, thread_name_prefix="stream-copy") as executor:
+            for input_subfolder, images in subfolders.items():
+                # Images outside any folder are left to the pass over the input folder
+                if input_subfolder == self.input_folder:
+                    self.copy_window(executor, images, lambda input_file, filename: None)
+                    continue
+
+                subfolder = os.path.basename(input_subfolder)
+                with self.lock:
+                    self.pending_images.setdefault(subfolder, 0)
+                self.copy_window(executor, images, lambda input_file, filename: self.queue_image(input_subfolder, input_file, filename))
+
+                with self.lock:
+                    self.copied_subfolders.add(subfolder)
+                    ready = self.pending_images[subfolder] == 0
+                if ready:
+                    self.sort_queue.put(subfolder)
+
+        print(f"LibNas copy: {self.libnas.copy_stats}")
+        self.log_activity.processing(f"LibNas copy: {self.libnas.copy_stats}")
+
+    def copy_window(self, executor, images: list, copied) -> None:
+        """
+        Copies images through the pool with at most copy_max_workers copies in flight, so copying
+        still pauses while the OCR queue is full, and hands each copied image to copied as it finishes.
+
+        Args:
+            executor (ThreadPoolExecutor): The copy pool.
+            images (list): (root, filename) of each image.
+            copied (callable): Called with the image's path in the input folder and its file name.
+        """
+        in_flight = {}
+        images = iter(images)
+        while True:
+            for root, filename in images:
+                in_flight[executor.submit(self.libnas.try_copy_image, root, filename)] = filename
+                if len(in_flight) >= self.copy_max_workers:
+                    break
+            if not in_flight:
+                return
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                filename = in_flight.pop(future)
+                input_file = future.result()
+                if input_file is None:
+                    continue
+                try:
+                    copied(input_file, filename)
+                except Exception as e:
+                    self.log_activity.error(f"File {filename} failed -  {e}")
+
+    def queue_image(self, input_subfolder: str, input_file: str, filename: str) -> None:
+        """Queues a copied image for OCR, blocks while the OCR queue is full."""
+        # Pages the manifest says are further down the pipeline are not in the input folder
+        if not os.path.exists(input_file):
+            return
+        job = self.textract_ocr.prepare_ocr_job(self.input_folder, input_subfolder, filename)
+        with self.lock:
+            self.pending_images[os.path.basename(input_subfolder)] += 1
+        self.images_streamed += 1
+        self.ocr_queue.put(job)
+
+    def ocr_worker(self) -> None:
+        """Runs OCR on queued images until the end of the queue."""
+        requeue_counts = {}
+        while True:
+            job = self.ocr_queue.get()
+            if job is None:
+                self.ocr_queue.task_done()
+                return
+            try:
+                while True:
+                    try:
+                        self.textract_ocr.process_image(*job)
+                        break
+                    except ThrottledError:
+                        # The rate limiter has already slowed down, send the image again
+                        if not self.textract_ocr.requeue_throttled(job[0], requeue_counts):
+                            break
+            except Exception as e:
+                self.log_activity.error(f"Error processing OCR for file {job[0]}: {e}")
+            finally:
+                self.image_done(job[1])
+                self.ocr_queue.task_done()
+
+    def image_done(self, subfolder: str) -> None:
+        """Queues a subfolder for sorting once it is fully copied and its last image is OCR'd."""
+        with self.lock:
+            self.pending_images[subfolder] -= 1
+            ready = self.pending_images[subfolder] == 0 and subfolder in self.copied_subfolders
+        if ready:
+            self.sort_queue.put(subfolder)
+
+    def sort_worker(self) -> None:
+        """Sorts each finished subfolder and generates the ALTO XML of top folders whose subfolders are all sorted."""
+        while True:
+            subfolder = self.sort_queue.get()
+            if subfolder is None:
+                self.sort_queue.task_done()
+                return
+            try:
+                # The JSON files have to be on disk before they are sorted
+                self.textract_ocr.wait_for_json_writes()
+                top_folder = self.sort_ocr.sort_subfolder(subfolder)
+
+                with self.lock:
+                    self.pending_subfolders[top_folder] -= 1
+                    ready = self.pending_subfolders[top_folder] == 0
+                if not ready:
+                    continue
+
+                if os.path.isdir(os.path.join(self.json_folder, top_folder)):
+                    result = self.alto_generator.generate_folder(top_folder)
+                    self.results.append(result)
+                    if result["status"] == "failed":
+                        print(f"ALTO generation failed for {top_folder}: {result['error']}")
+                self.delivery_queue.put(top_folder)
+            except Exception as e:
+                self.log_activity.error(f"Error sorting {subfolder}: {e}")
+            finally:
+                self.sort_queue.task_done()
+
+    def delivery_worker(self) -> None:
+        """Delivers each top folder to LibNas output once its ALTO XML is generated."""
+        while True:
+            top_folder = self.delivery_queue.get()
+            if top_folder is None:
+                self.delivery_queue.task_done()
+                return
+            src_dir = os.path.join(self.processed_folder, top_folder)
+            if not os.path.isdir(src_dir):
+                self.delivery_queue.task_done()
+                continue
+            try:
+                self.libnas.deliver_folder(src_dir)
+                self.folders_delivered += 1
+                print(f"Delivered {top_folder} to LibNas ... {datetime.now()}")
+                self.log_activity.processing(f"Delivered {top_folder} to LibNas ... {datetime.now()}")
+            except Exception as e:
+                self.log_activity.error(f"An error occurred while moving to LibNas: {str(e)}")
+            finally:
+                self.delivery_queue.task_done()
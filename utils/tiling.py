@@ -0,0 +1,179 @@
+import math
+import heapq
+
+
+class PageTiler:
+    """
+    Splits oversized pages into overlapping tiles and merges the per-tile Textract responses back
+    into a single page response.
+
+    The merged response uses page-level normalised geometry, so it is consumed by
+    AltoGenerator.calculate_positions exactly like the response of an untiled page.
+    """
+
+    def __init__(self, tile_size: int, overlap: int):
+        """
+        Initialises the tiler.
+
+        Args:
+            tile_size (int): Width and height of a tile in pixels of the original image.
+            overlap (int): Number of pixels shared by neighbouring tiles, should exceed the height of a text line.
+        """
+        self.tile_size = tile_size
+        self.overlap = min(overlap, tile_size // 2)
+
+    def _spans(self, length: int) -> list:
+        """Returns (start, end, core_start, core_end) spans covering one side of the page."""
+        if length <= self.tile_size:
+            return [(0, length, 0, length)]
+
+        count = math.ceil((length - self.overlap) / (self.tile_size - self.overlap))
+        starts = [round(i * (length - self.tile_size) / (count - 1)) for i in range(count)]
+        ends = [start + self.tile_size for start in starts]
+
+        spans = []
+        for i, (start, end) in enumerate(zip(starts, ends)):
+            # Each overlap zone is split in the middle between the two tiles sharing it
+            core_start = 0 if i == 0 else (start + ends[i - 1]) / 2
+            core_end = length if i == count - 1 else (end + starts[i + 1]) / 2
+            spans.append((start, end, core_start, core_end))
+        return spans
+
+    def plan(self, width: int, height: int) -> list:
+        """
+        Returns the tiles covering a page.
+
+        Args:
+            width (int): Page width in pixels.
+            height (int): Page height in pixels.
+        Returns:
+            list: Dictionaries with the tile "box" (left, top, right, bottom) used to crop the image
+                and the "core" box owning the text found in the overlap zones.
+        """
+        tiles = []
+        for top, bottom, core_top, core_bottom in self._spans(height):
+            for left, right, core_left, core_right in self._spans(width):
+                tiles.append({
+                    "box": (left, top, right, bottom),
+                    "core": (core_left, core_top, core_right, core_bottom),
+                })
+        return tiles
+
+    @staticmethod
+    def _to_page_geometry(geometry: dict, box: tuple, width: int, height: int) -> dict:
+        left, top, right, bottom = box
+        tile_width, tile_height = right - left, bottom - top
+        bounding_box = geometry["BoundingBox"]
+        page_geometry = {
+            "BoundingBox": {
+                "Left": (left + bounding_box["Left"] * tile_width) / width,
+                "Top": (top + bounding_box["Top"] * tile_height) / height,
+                "Width": bounding_box["Width"] * tile_width / width,
+                "Height": bounding_box["Height"] * tile_height / height,
+            }
+        }
+        if "Polygon" in geometry:
+            page_geometry["Polygon"] = [
+                {"X": (left + point["X"] * tile_width) / width, "Y": (top + point["Y"] * tile_height) / height}
+                for point in geometry["Polygon"]
+            ]
+        return page_geometry
+
+    @staticmethod
+    def _centre(block: dict, width: int, height: int) -> tuple:
+        bounding_box = block["Geometry"]["BoundingBox"]
+        return ((bounding_box["Left"] + bounding_box["Width"] / 2) * width,
+                (bounding_box["Top"] + bounding_box["Height"] / 2) * height)
+
+    @staticmethod
+    def _overlap_ratio(first: dict, second: dict) -> float:
+        a, b = first["Geometry"]["BoundingBox"], second["Geometry"]["BoundingBox"]
+        overlap_width = min(a["Left"] + a["Width"], b["Left"] + b["Width"]) - max(a["Left"], b["Left"])
+        overlap_height = min(a["Top"] + a["Height"], b["Top"] + b["Height"]) - max(a["Top"], b["Top"])
+        if overlap_width <= 0 or overlap_height <= 0:
+            return 0.0
+        smallest = min(a["Width"] * a["Height"], b["Width"] * b["Height"])
+        return overlap_width * overlap_height / smallest if smallest else 0.0
+
+    def merge(self, tiles: list, responses: list, width: int, height: int) -> dict:
+        """
+        Merges the Textract responses of the tiles into a single page response.
+
+        A LINE is kept by the tile whose core box contains its centre. Words read twice because
+        a line was cut by a tile edge are removed from the later tile.
+
+        Args:
+            tiles (list): The tiles returned by plan.
+            responses (list): The Textract response of each tile, in the same order.
+            width (int): Page width in pixels.
+            height (int): Page height in pixels.
+        Returns:
+            dict: A Textract-style response with LINE and WORD blocks in page-level geometry.
+        """
+        # Lines kept from each tile, in the tile's Textract reading order
+        tile_lines, words = [[] for _ in tiles], {}
+        # Words kept so far, bucketed by the grid cell of their centre
+        cell_size = max(self.overlap, 1)
+        buckets = {}
+
+        for index, (tile, response) in enumerate(zip(tiles, responses)):
+            blocks = {block["Id"]: block for block in response.get("Blocks", [])}
+            core_left, core_top, core_right, core_bottom = tile["core"]
+
+            for block in response.get("Blocks", []):
+                if block["BlockType"] != "LINE":
+                    continue
+
+                line = dict(block, Id=f"t{index}-{block['Id']}",
+                            Geometry=self._to_page_geometry(block["Geometry"], tile["box"], width, height))
+                centre_x, centre_y = self._centre(line, width, height)
+                if not (core_left <= centre_x <= core_right and core_top <= centre_y <= core_bottom):
+                    continue
+
+                word_ids = []
+                for relationship in block.get("Relationships", []):
+                    for word_id in relationship.get("Ids", []):
+                        word = blocks.get(word_id)
+                        if word is None or word["BlockType"] != "WORD":
+                            continue
+                        word = dict(word, Id=f"t{index}-{word_id}",
+                                    Geometry=self._to_page_geometry(word["Geometry"], tile["box"], width, height))
+
+                        # Drop the word if a neighbouring tile already produced it
+                        centre_x, centre_y = self._centre(word, width, height)
+                        cell = (int(centre_x // cell_size), int(centre_y // cell_size))
+                        neighbours = [kept for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                                      for kept in buckets.get((cell[0] + dx, cell[1] + dy), [])]
+                        if any(kept["Id"].split("-", 1)[0] != f"t{index}" and kept["Text"] == word["Text"]
+                               and self._overlap_ratio(kept, word) > 0.5 for kept in neighbours):
+                            continue
+
+                        buckets.setdefault(cell, []).append(word)
+                        words[word["Id"]] = word
+                        word_ids.append(word["Id"])
+
+                if word_ids:
+                    line["Relationships"] = [{"Type": "CHILD", "Ids": word_ids}]
+                    line["Text"] = " ".join(words[word_id]["Text"] for word_id in word_ids)
+                    tile_lines[index].append(line)
+
+        # Reading order: tile rows top to bottom. Within a row each tile keeps Textract's order, and
+        # the tiles side by side are interleaved by the top of their lines
+        lines = []
+        for row_top in sorted({tile["box"][1] for tile in tiles}):
+            row = [tile_lines[index] for index, tile in enumerate(tiles) if tile["box"][1] == row_top]
+            lines.extend(heapq.merge(*row, key=lambda line: (line["Geometry"]["BoundingBox"]["Top"],
+                                                             line["Geometry"]["BoundingBox"]["Left"])))
+
+        page = {
+            "BlockType": "PAGE",
+            "Id": "page",
+            "Geometry": {"BoundingBox": {"Left": 0.0, "Top": 0.0, "Width": 1.0, "Height": 1.0}},
+            "Relationships": [{"Type": "CHILD", "Ids": [line["Id"] for line in lines]}],
+        }
+        blocks = [page]
+        for line in lines:
+            blocks.append(line)
+            blocks.extend(words[word_id] for word_id in line["Relationships"][0]["Ids"])
+
+        return {"DocumentMetadata": {"Pages": 1}, "Blocks": blocks}
@@ -0,0 +1,246 @@
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+
+class InputWatcher:
+    """
+    Watches the folders of LibNas input and reports a folder once it has stopped changing for
+    settle_seconds, so a batch that is still being written is never picked up half way.
+
+    On a local file system the changes come from inotify. Network mounts (NFS, SMB, ...) do not
+    report changes made by other machines through inotify, so there the folders are scanned every
+    scan_interval seconds instead. A processed folder only costs a scan of its directories: files
+    added or removed change their directory's modification time, and only a folder that changed is
+    scanned file by file. A file rewritten in place in a processed folder is not noticed by the scan.
+    """
+
+    # inotify event flags, see inotify(7)
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    IN_CLOEXEC = 0o2000000
+    WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT_HEADER = struct.Struct("iIII")
+
+    # File system types where inotify does not see changes made by other machines
+    NETWORK_FILE_SYSTEMS = ("nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "fuse.sshfs", "afs", "glusterfs", "ceph")
+
+    def __init__(self, folder: str, settle_seconds: float, scan_interval: float, mode: str = "auto"):
+        """
+        Starts watching a folder. The folders already in it are reported once they have settled.
+
+        Args:
+            folder (str): The folder to watch, LibNas input.
+            settle_seconds (float): How long a folder must be unchanged before it is reported.
+            scan_interval (float): Seconds between scans when inotify is not used.
+            mode (str): "inotify", "scan", or "auto" to use inotify unless the folder is on a network mount.
+        """
+        self.folder = os.path.abspath(folder)
+        self.settle_seconds = settle_seconds
+        self.scan_interval = scan_interval
+
+        # Folder name -> time of its last change, for folders waiting to settle
+        self.pending = {}
+        # Folder name -> file signature at the last scan, and directory signature when it was processed
+        self.signatures = {}
+        self.processed = {}
+
+        self.inotify_fd = None
+        self.watches = {}
+        if mode == "inotify" or (mode == "auto" and not self.is_network_mount(self.folder)):
+            self.start_inotify()
+        self.mode = "inotify" if self.inotify_fd is not None else "scan"
+
+        now = time.monotonic()
+        for name in self.folder_names():
+            self.pending[name] = now
+
+    @classmethod
+    def is_network_mount(cls, folder: str) -> bool:
+        """Checks /proc/mounts for the file system type of the mount a folder is on."""
+        try:
+            with open("/proc/mounts", encoding="utf-8") as f:
+                mounts = [line.split()[1:3] for line in f if len(line.split()) > 2]
+        except OSError:
+            return False
+        folder = os.path.realpath(folder)
+        matches = [(mount_point, fs_type) for mount_point, fs_type in mounts
+                   if folder == mount_point or folder.startswith(mount_point.rstrip("/") + "/")]
+        if not matches:
+            return False
+        return max(matches, key=lambda match: len(match[0]))[1] in cls.NETWORK_FILE_SYSTEMS
+
+    def start_inotify(self) -> None:
+        """Watches the folder and every directory below it, leaves the watcher in scan mode if inotify is not available."""
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            self.libc = libc
+            fd = libc.inotify_init1(os.O_NONBLOCK | self.IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return
+        if fd < 0:
+            return
+        self.inotify_fd = fd
+        self.add_watches(self.folder)
+
+    def add_watches(self, directory: str) -> None:
+        """Adds an inotify watch on a directory and the directories below it."""
+        for root, _, _ in os.walk(directory):
+            wd = self.libc.inotify_add_watch(self.inotify_fd, os.fsencode(root), self.WATCH_MASK)
+            if wd < 0:
+                if ctypes.get_errno() == errno.ENOSPC:
+                    # Out of watches (fs.inotify.max_user_watches), scanning still works
+                    self.close()
+                    return
+                continue
+            self.watches[wd] = root
+
+    def folder_names(self) -> list:
+        """Returns the names of the folders directly inside the watched folder."""
+        try:
+            return sorted(entry.name for entry in os.scandir(self.folder) if entry.is_dir())
+        except FileNotFoundError:
+            return []
+
+    @staticmethod
+    def directory_signature(path: str) -> tuple:
+        """Returns the number of directories below a folder and their latest modification time, no file is stat'ed."""
+        count, latest = 0, 0
+        for root, _, _ in os.walk(path):
+            try:
+                latest = max(latest, os.stat(root).st_mtime_ns)
+            except FileNotFoundError:
+                continue
+            count += 1
+        return count, latest
+
+    @staticmethod
+    def file_signature(path: str) -> tuple:
+        """Returns the number, total size and latest modification time of the files below a folder."""
+        count, size, latest = 0, 0, 0
+        for root, _, files in os.walk(path):
+            for filename in files:
+                try:
+                    stat = os.stat(os.path.join(root, filename))
+                except FileNotFoundError:
+                    continue
+                count += 1
+                size += stat.st_size
+                latest = max(latest, stat.st_mtime_ns)
+        return count, size, latest
+
+    def read_events(self) -> None:
+        """Reads the pending inotify events and marks the folders they happened in as changed."""
+        now = time.monotonic()
+        while True:
+            try:
+                data = os.read(self.inotify_fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + self.EVENT_HEADER.size:offset + self.EVENT_HEADER.size + length].rstrip(b"\0")
+                offset += self.EVENT_HEADER.size + length
+
+                if mask & self.IN_Q_OVERFLOW:
+                    # Events were lost, every folder is treated as changed
+                    for folder_name in self.folder_names():
+                        self.pending[folder_name] = now
+                    continue
+                if mask & self.IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    continue
+
+                directory = self.watches.get(wd)
+                if directory is None:
+                    continue
+                path = os.path.join(directory, os.fsdecode(name))
+                if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    self.add_watches(path)
+                    if self.inotify_fd is None:
+                        return
+
+                relative = os.path.relpath(path, self.folder)
+                top_folder = relative.split(os.sep, 1)[0]
+                # Files at the top of the watched folder are not a batch
+                if os.sep in relative or mask & self.IN_ISDIR:
+                    self.pending[top_folder] = now
+
+    def scan(self) -> None:
+        """Scans the folders and marks the ones whose files changed since the last scan."""
+        now = time.monotonic()
+        names = self.folder_names()
+        for name in names:
+            path = os.path.join(self.folder, name)
+            if name not in self.pending and self.processed.get(name) == self.directory_signature(path):
+                continue
+            signature = self.file_signature(path)
+            if self.signatures.get(name) != signature:
+                self.signatures[name] = signature
+                self.pending[name] = now
+
+        for name in set(self.pending) - set(names):
+            self.pending.pop(name)
+            self.signatures.pop(name, None)
+
+    def poll(self) -> list:
+        """
+        Checks for changes.
+
+        Returns:
+            list: The folders that changed and have not changed for settle_seconds since.
+        """
+        if self.inotify_fd is not None:
+            self.read_events()
+        if self.inotify_fd is None:
+            self.scan()
+
+        now = time.monotonic()
+        return sorted(name for name, changed in self.pending.items()
+                      if now - changed >= self.settle_seconds and os.path.isdir(os.path.join(self.folder, name)))
+
+    def wait(self) -> None:
+        """Waits for the next change, a folder to settle or the next scan, whichever comes first."""
+        timeout = self.scan_interval
+        if self.pending:
+            timeout = min(timeout, max(0, min(self.pending.values()) + self.settle_seconds - time.monotonic()))
+        if self.inotify_fd is not None:
+            select.select([self.inotify_fd], [], [], timeout)
+        else:
+            time.sleep(timeout)
+
+    def mark_processed(self, folders: list) -> None:
+        """Records that folders went through the pipeline, they are reported again only if they change."""
+        for name in folders:
+            self.pending.pop(name, None)
+            path = os.path.join(self.folder, name)
+            if self.inotify_fd is None:
+                self.processed[name] = self.directory_signature(path)
+                self.signatures[name] = self.file_signature(path)
+
+    def retry_later(self, folders: list) -> None:
+        """Reports folders again once settle_seconds have passed, for a batch that failed."""
+        now = time.monotonic()
+        for name in folders:
+            self.pending[name] = now
+
+    def close(self) -> None:
+        """Stops watching, the watcher carries on by scanning."""
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
+            self.watches = {}
+            self.mode = "scan"